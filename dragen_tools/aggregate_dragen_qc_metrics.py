@@ -5,6 +5,10 @@ import glob
 import os.path
 import sys
 
+# profile_tools lives with the TSS scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tss"))
+import profile_tools  # noqa: E402  pylint: disable=wrong-import-position
+
 ##########################################
 # Author: LeAnne Lovato
 # GitHub: https://github.com/LeAnneLovato
@@ -12,6 +16,9 @@ import sys
 
 
 if __name__ == "__main__":
+    # --profile <prefix>/ --trace-malloc
+    profile_tools.start_from_argv()
+
     # list metric files in the current path
     file_list = glob.glob("*/*_metrics.csv")
 
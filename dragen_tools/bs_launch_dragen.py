@@ -8,9 +8,14 @@
 
 import subprocess
 import argparse
+import os
 import pathlib
 import sys
 
+# profile_tools lives with the TSS scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tss"))
+import profile_tools  # noqa: E402  pylint: disable=wrong-import-position
+
 
 # launch  app
 def launch_app(command_line):
@@ -69,6 +74,7 @@ def get_args():
         type=str,
         required=True,
     )
+    profile_tools.add_profile_args(parser)
 
     args = parser.parse_args()
     return args
@@ -78,6 +84,7 @@ if __name__ == "__main__":
 
     # get args from cmd line
     cmd_args = get_args()
+    profile_tools.set_profiling(cmd_args)
 
     # read samples file
     with open(cmd_args.sample_list, 'r', encoding='utf-8') as file:
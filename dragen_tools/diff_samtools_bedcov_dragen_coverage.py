@@ -1,5 +1,13 @@
+import os
 import sys
 
+# profile_tools lives with the TSS scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tss"))
+import profile_tools  # noqa: E402  pylint: disable=wrong-import-position
+
+# --profile <prefix>/ --trace-malloc
+profile_tools.start_from_argv()
+
 file = sys.argv[1]
 threshold = float(sys.argv[2])
 
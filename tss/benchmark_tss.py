@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""Benchmark the TSS bulk operations against the local mock server"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Benchmark suite for the bulk TSS paths
+# 1. Inputs: workload sizes, mock server options, [optional] a stored baseline JSON
+# 2. Outputs: benchmark JSON (throughput, p50/p99 latency, peak RSS per benchmark),
+#    a summary table and the regressions against the baseline (exit code 1 when found)
+# Notes: local CPU benchmarks (read_case_csv, get_payload, filter predicates) and the
+#        cold start of tss_cli.py commands (fresh interpreter, <command> -h, with the time
+#        the lazy requests import saves and any command that still loads it) run first,
+#        then the HTTP benchmarks run in order against mock_tss_server.py in a subprocess:
+#        ingest (CSV -> post -> process), filter, monitor, download, delete.
+#        Operation latency is timed per call; request latency is every api_request.
+#        Peak RSS is per benchmark: on Linux the high-water mark is reset before each one
+#        (/proc/self/clear_refs); elsewhere it is the growth of the process peak during it.
+##################################################################
+
+import os
+import sys
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import threading
+import contextlib
+from datetime import datetime
+import method_tools
+import profile_tools
+import case_mgt_v2
+import case_model
+import filter_case_list
+import monitor_progress
+import download_reports
+import search
+import mock_tss_server
+import generate_workload
+
+CPU_BENCHMARKS = ["read_case_csv", "get_payload", "filter_predicates", "cold_start"]
+HTTP_BENCHMARKS = ["ingest", "filter", "monitor", "download", "delete"]
+COLD_START_COMMANDS = ["case", "search", "filter", "reports", "monitor", "biosample", "delete", "generate"]
+# modules method_tools only imports on the first request
+LAZY_MODULES = ("requests", "urllib3")
+TSS_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tss_cli.py")
+FILTER_CRITERIA = {"include_status": "Complete,In Progress", "exclude_tags": "On Hold"}
+FILTER_EXPRESSION = 'dates:2022-01-01,2023-06-30 OR NOT creators:"June Salazar"'
+COMPARED = {
+    "throughput_per_s": "lower",
+    "op_p99_ms": "higher",
+    "request_p99_ms": "higher",
+    "peak_rss_mb": "higher",
+}
+
+
+class LatencyRecorder:
+    """Stands in for method_tools.HTTP_METRICS during a benchmark and keeps every latency"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.seconds = []
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, method, url, status, seconds, sent=0, received=0):
+        """Same signature as HttpMetrics.record"""
+        self.metrics.record(method, url, status, seconds, sent, received)
+        with self.lock:
+            self.seconds.append(seconds)
+            if isinstance(status, str) or status >= 400:
+                self.errors += 1
+
+
+# percentile of a list of seconds, in ms
+def percentile_ms(values, fraction):
+    """Nearest-rank percentile in milliseconds, or None for an empty list"""
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1000, 3)
+
+
+# process high-water mark
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (since the last reset_peak_rss)"""
+
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# start a new high-water mark window
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS (Linux); False where it cannot be reset"""
+
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+# time one call, counting sys.exit() as an error
+def timed(function, *args):
+    """Return (seconds, result or None, ok)"""
+
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+    except SystemExit:
+        return time.perf_counter() - start, None, False
+    return time.perf_counter() - start, result, True
+
+
+# CPU benchmarks
+def bench_read_case_csv(context):
+    """Parse and validate the manifest (repeat times)"""
+    timings = []
+    for _ in range(context["options"]["repeat"]):
+        seconds, families, ok = timed(case_mgt_v2.read_case_csv, context["case_csv"])
+        timings.append(seconds)
+        if ok:
+            context["families"] = families
+    rows = sum(len(subjects) for subjects in context["families"].values())
+    return {"items": rows * len(timings), "op_seconds": timings, "errors": 0}
+
+
+def bench_get_payload(context):
+    """Build one case payload per family"""
+    timings = []
+    payloads = []
+    for subjects in context["families"].values():
+        seconds, payload, _ = timed(case_mgt_v2.get_payload, subjects)
+        timings.append(seconds)
+        payloads.append(payload)
+    context["payloads"] = payloads
+    return {"items": len(payloads), "op_seconds": timings, "errors": 0}
+
+
+def bench_filter_predicates(context):
+    """Compile the filter criteria once and evaluate them over CaseRecords"""
+    store = mock_tss_server.CaseStore(context["options"]["seed"])
+    records = [
+        case_model.CaseRecord.from_json(store.make_case(index + 1))
+        for index in range(context["options"]["cases"])
+    ]
+    predicate = filter_case_list.compile_criteria(
+        FILTER_CRITERIA, store.users, FILTER_EXPRESSION
+    )
+    timings = []
+    for _ in range(context["options"]["repeat"]):
+        start = time.perf_counter()
+        matches = sum(1 for record in records if predicate(record))
+        timings.append(time.perf_counter() - start)
+    context["predicate_matches"] = matches
+    # throughput excludes building the records
+    return {
+        "items": len(records) * len(timings),
+        "op_seconds": timings,
+        "errors": 0,
+        "seconds": sum(timings),
+    }
+
+
+def bench_cold_start(context):
+    """Start a fresh interpreter for tss_cli.py <command> -h (imports + parser, repeat times)
+
+    Also records what the lazy requests import saves: its import time in a fresh
+    interpreter, and the commands whose -h still loads it (should be none).
+    """
+    timings = []
+    errors = 0
+    for _ in range(context["options"]["repeat"]):
+        for command in COLD_START_COMMANDS:
+            start = time.perf_counter()
+            returncode = subprocess.call(
+                [sys.executable, TSS_CLI, command, "-h"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            timings.append(time.perf_counter() - start)
+            errors += returncode != 0
+
+    # -X importtime lines end in "| <module>"
+    loaded_by = []
+    for command in COLD_START_COMMANDS:
+        imports = subprocess.run(
+            [sys.executable, "-X", "importtime", TSS_CLI, command, "-h"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=False,
+        ).stderr
+        if any(line.rsplit("|", 1)[-1].strip() in LAZY_MODULES for line in imports.splitlines()):
+            loaded_by.append(command)
+    saved = []
+    for _ in range(context["options"]["repeat"]):
+        start = time.perf_counter()
+        subprocess.call([sys.executable, "-c", "pass"])
+        bare = time.perf_counter() - start
+        start = time.perf_counter()
+        subprocess.call([sys.executable, "-c", "import requests"])
+        saved.append(time.perf_counter() - start - bare)
+    return {
+        "items": len(timings),
+        "op_seconds": timings,
+        "errors": errors,
+        "details": {
+            "lazy_import_saved_ms": percentile_ms(saved, 0.5),
+            "requests_loaded_by": loaded_by,
+        },
+    }
+
+
+# HTTP benchmarks
+def bench_ingest(context):
+    """Read the manifest, then post and process every family concurrently"""
+    config = context["config"]
+    directory = context["work_dir"]
+
+    def ingest(payload):
+        seconds, result, ok = timed(case_mgt_v2.post_case, payload, config, directory)
+        if ok:
+            process_seconds, _, ok = timed(
+                case_mgt_v2.process_case, result["id"], config, directory
+            )
+            seconds += process_seconds
+        return seconds, result["id"] if result else None, ok
+
+    families = case_mgt_v2.read_case_csv(context["case_csv"])
+    payloads = [case_mgt_v2.get_payload(subjects) for subjects in families.values()]
+    results = method_tools.run_concurrently(ingest, payloads, context["options"]["max_workers"])
+    context["ingested"] = [case_id for _, case_id, ok in results if ok]
+    return {
+        "items": len(results),
+        "op_seconds": [seconds for seconds, _, _ in results],
+        "errors": sum(1 for _, _, ok in results if not ok),
+    }
+
+
+def bench_filter(context):
+    """filter_case_list over the seeded cases (one get_case per case)"""
+    case_ids = [
+        case["id"] for case in search.search_pages({}, context["config"])
+    ][: context["options"]["cases"]]
+    with method_tools.JsonLog(context["work_dir"] + "filter_case_list.log") as log:
+        seconds, _, ok = timed(
+            filter_case_list.filter_case_list,
+            case_ids,
+            dict(FILTER_CRITERIA),
+            context["config"],
+            log,
+            FILTER_EXPRESSION,
+        )
+    return {"items": len(case_ids), "op_seconds": [seconds], "errors": 0 if ok else 1}
+
+
+def bench_monitor(context):
+    """monitor_cases over the ingested (processing) cases"""
+    cases = [(context["config"], case_id) for case_id in context["ingested"]]
+    interval_min = context["options"]["processing_seconds"] / 60 / 4
+    seconds, statuses, ok = timed(
+        monitor_progress.monitor_cases,
+        cases,
+        interval_min * 400,
+        interval_min,
+        context["work_dir"],
+    )
+    unfinished = sum(1 for status in (statuses or {}).values() if status is None)
+    return {"items": len(cases), "op_seconds": [seconds], "errors": unfinished + (0 if ok else 1)}
+
+
+def bench_download(context):
+    """Download the PDF and JSON reports of the ingested cases"""
+    config_file = context["config_file"]
+    directory = context["work_dir"]
+
+    def download(case_id):
+        start = time.perf_counter()
+        try:
+            with method_tools.JsonLog(directory + "download_reports.log") as log:
+                record = case_model.CaseRecord.from_json(
+                    download_reports.get_case(config_file, case_id, log)
+                )
+                for subject in record.subjects:
+                    for report_id in subject.report_type_ids:
+                        response = download_reports.get_pdf_report(
+                            config_file, case_id, report_id, log
+                        )
+                        with open(f"{directory}{subject.id}.pdf", "wb") as pdf:
+                            pdf.write(response.content)
+                download_reports.get_json_report(config_file, case_id, log)
+        except (SystemExit, AttributeError, TypeError):
+            return time.perf_counter() - start, False
+        return time.perf_counter() - start, True
+
+    results = method_tools.run_concurrently(
+        download, context["ingested"], context["options"]["max_workers"]
+    )
+    return {
+        "items": len(results),
+        "op_seconds": [seconds for seconds, _ in results],
+        "errors": sum(1 for _, ok in results if not ok),
+    }
+
+
+def bench_delete(context):
+    """Delete the ingested cases concurrently (as delete_cases.py does)"""
+    config = context["config"]
+    results = method_tools.run_concurrently(
+        lambda case_id: timed(case_mgt_v2.delete_case, case_id, config),
+        context["ingested"],
+        context["options"]["max_workers"],
+    )
+    return {
+        "items": len(results),
+        "op_seconds": [seconds for seconds, _, _ in results],
+        "errors": sum(1 for _, _, ok in results if not ok),
+    }
+
+
+BENCHMARKS = {
+    "read_case_csv": bench_read_case_csv,
+    "get_payload": bench_get_payload,
+    "filter_predicates": bench_filter_predicates,
+    "cold_start": bench_cold_start,
+    "ingest": bench_ingest,
+    "filter": bench_filter,
+    "monitor": bench_monitor,
+    "download": bench_download,
+    "delete": bench_delete,
+}
+
+
+# run one benchmark quietly and summarize it
+def run_benchmark(name, context):
+    """Return the result dict for one benchmark"""
+
+    recorder = LatencyRecorder(method_tools.HTTP_METRICS)
+    method_tools.HTTP_METRICS = recorder
+    peak_reset = reset_peak_rss()
+    peak_before = peak_rss_mb()
+    try:
+        with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            outcome = BENCHMARKS[name](context)
+            wall = outcome.get("seconds", time.perf_counter() - start)
+    finally:
+        method_tools.HTTP_METRICS = recorder.metrics
+
+    return {
+        "items": outcome["items"],
+        "seconds": round(wall, 4),
+        "throughput_per_s": round(outcome["items"] / wall, 2) if wall else None,
+        "op_p50_ms": percentile_ms(outcome["op_seconds"], 0.5),
+        "op_p99_ms": percentile_ms(outcome["op_seconds"], 0.99),
+        "requests": len(recorder.seconds),
+        "request_p50_ms": percentile_ms(recorder.seconds, 0.5),
+        "request_p99_ms": percentile_ms(recorder.seconds, 0.99),
+        "errors": outcome["errors"] + recorder.errors,
+        "peak_rss_mb": peak_rss_mb() if peak_reset else round(peak_rss_mb() - peak_before, 1),
+        **outcome.get("details", {}),
+    }
+
+
+# run the selected benchmarks
+def run_suite(selected, options, work_dir):
+    """Run CPU benchmarks locally and HTTP benchmarks against a mock server subprocess"""
+
+    context = {"options": options, "work_dir": method_tools.format_path(work_dir)}
+    # measure the direct path even when a local tss_agent.py is running
+    method_tools.AGENT_SOCKET = ""
+    results = {}
+
+    # the manifest needs a test definition; a local store gives the same IDs as the server
+    store = mock_tss_server.CaseStore(options["seed"])
+    test = store.tests[0]
+    context["case_csv"] = context["work_dir"] + "benchmark_cases.csv"
+    generate_workload.write_case_csv(
+        context["case_csv"], options["families"], options["seed"], test["id"], test["reports"][0]["id"]
+    )
+    context["families"] = case_mgt_v2.read_case_csv(context["case_csv"])
+
+    for name in selected:
+        if name in CPU_BENCHMARKS:
+            print(f"Running {name} ...", file=sys.stderr)
+            results[name] = run_benchmark(name, context)
+
+    http_selected = [name for name in selected if name in HTTP_BENCHMARKS]
+    if http_selected:
+        context["config_file"] = context["work_dir"] + "mock_tss.json"
+        process, base_url = mock_tss_server.start_subprocess(
+            options["cases"],
+            config_out=context["config_file"],
+            seed=options["seed"],
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            processing_seconds=options["processing_seconds"],
+        )
+        try:
+            print(f"Mock TSS server:\t{base_url}", file=sys.stderr)
+            with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+                context["config"] = method_tools.parse_config(context["config_file"])
+            context["config"]["requests_per_second"] = options["client_rps"]
+            context["ingested"] = []
+            for name in http_selected:
+                print(f"Running {name} ...", file=sys.stderr)
+                results[name] = run_benchmark(name, context)
+        finally:
+            process.terminate()
+            process.wait()
+    return results
+
+
+# compare against a stored baseline
+def compare(results, baseline, tolerance):
+    """Return regression messages: throughput down, p99/ RSS up by more than tolerance"""
+
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        for metric, worse in COMPARED.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (worse == "lower" and change < -tolerance) or (worse == "higher" and change > tolerance):
+                regressions.append(f"{name} {metric}: {old} -> {new} ({change:+.1%})")
+        # a command that loads requests again for -h loses the lazy import
+        for command in result.get("requests_loaded_by") or []:
+            if command not in before.get("requests_loaded_by", COLD_START_COMMANDS):
+                regressions.append(f"{name}: {command} -h imports requests again")
+        if result["errors"] > before.get("errors", 0):
+            regressions.append(f"{name} errors: {before.get('errors', 0)} -> {result['errors']}")
+    return regressions
+
+
+# summary table
+def format_results(results):
+    """Fixed-width table of the results"""
+
+    header = f"{'benchmark':<18}{'items':>9}{'items/s':>12}{'op p50':>10}{'op p99':>10}" \
+             f"{'req p50':>10}{'req p99':>10}{'errors':>8}{'RSS MB':>9}"
+    lines = [header]
+    for name, result in results.items():
+        cells = [
+            result["op_p50_ms"],
+            result["op_p99_ms"],
+            result["request_p50_ms"],
+            result["request_p99_ms"],
+        ]
+        lines.append(
+            f"{name:<18}{result['items']:>9}{result['throughput_per_s'] or 0:>12.1f}"
+            + "".join(f"{'-' if cell is None else f'{cell:.2f}':>10}" for cell in cells)
+            + f"{result['errors']:>8}{result['peak_rss_mb']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+# get args
+def get_args():
+    """Get command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark TSS bulk operations against a mock server")
+    parser.add_argument("-o", "--output", help="Path for the benchmark JSON", type=str, required=True)
+    parser.add_argument("-b", "--baseline", help="Stored benchmark JSON to compare against", type=str)
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        help="Allowed change before a regression is flagged (default: 0.2 = 20%%)",
+        type=float,
+        default=0.2,
+    )
+    parser.add_argument(
+        "-s",
+        "--benchmarks",
+        help=f"Comma separated benchmarks (default: all): {','.join(BENCHMARKS)}",
+        type=str,
+        default=",".join(BENCHMARKS),
+    )
+    parser.add_argument("-f", "--families", help="Families in the manifest (default: 200)", type=int, default=200)
+    parser.add_argument(
+        "-n", "--cases", help="Seeded server cases/ filtered cases (default: 1000)", type=int, default=1000
+    )
+    parser.add_argument("-r", "--repeat", help="Repeats of the CPU benchmarks (default: 5)", type=int, default=5)
+    parser.add_argument("--seed", help="Random seed (default: 1)", type=int, default=1)
+    parser.add_argument(
+        "-w",
+        "--max_workers",
+        help=f"Concurrent requests (default: {method_tools.MAX_WORKERS})",
+        type=int,
+        default=method_tools.MAX_WORKERS,
+    )
+    parser.add_argument(
+        "--client_rps",
+        help="Client rate limit in requests per second (default: 1000)",
+        type=float,
+        default=1000,
+    )
+    parser.add_argument("--latency_ms", help="Mock server latency", type=float, default=0.0)
+    parser.add_argument("--jitter_ms", help="Mock server latency jitter", type=float, default=0.0)
+    parser.add_argument("--error_rate", help="Mock server error rate (0-1)", type=float, default=0.0)
+    parser.add_argument(
+        "--processing_seconds",
+        help="Seconds processed cases stay PROCESSING on the mock server (default: 1)",
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument("--work_dir", help="Directory for inputs and logs (default: a temp dir)", type=str)
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+
+    benchmarks = [name.strip() for name in arguments.benchmarks.split(",") if name.strip()]
+    unknown = [name for name in benchmarks if name not in BENCHMARKS]
+    if unknown:
+        print(f"[ERROR] Unknown benchmark(s): {', '.join(unknown)}")
+        sys.exit()
+    # monitor, download and delete work on the ingested cases
+    if any(name in ("monitor", "download", "delete") for name in benchmarks) and "ingest" not in benchmarks:
+        benchmarks.insert(0, "ingest")
+    benchmarks = [name for name in BENCHMARKS if name in benchmarks]
+
+    suite_options = {
+        "families": arguments.families,
+        "cases": arguments.cases,
+        "repeat": arguments.repeat,
+        "seed": arguments.seed,
+        "max_workers": arguments.max_workers,
+        "client_rps": arguments.client_rps,
+        "latency_ms": arguments.latency_ms,
+        "jitter_ms": arguments.jitter_ms,
+        "error_rate": arguments.error_rate,
+        "processing_seconds": arguments.processing_seconds,
+    }
+
+    with contextlib.ExitStack() as stack:
+        work_directory = arguments.work_dir or stack.enter_context(
+            tempfile.TemporaryDirectory(prefix="tss_benchmark_")
+        )
+        os.makedirs(work_directory, exist_ok=True)
+        suite_results = run_suite(benchmarks, suite_options, work_directory)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "json_codec": "orjson" if method_tools.orjson is not None else "json",
+        "options": suite_options,
+        "results": suite_results,
+    }
+    with open(arguments.output, "w", encoding="utf-8") as output_file:
+        method_tools.json_dump(report, output_file, indent=True)
+
+    print(format_results(suite_results))
+    print(f"\nBenchmark File:\t{os.path.abspath(arguments.output)}")
+
+    if arguments.baseline:
+        with open(arguments.baseline, "r", encoding="utf-8") as baseline_file:
+            stored = method_tools.json_load(baseline_file)
+        found = compare(suite_results, stored, arguments.tolerance)
+        print(f"Baseline:\t{os.path.abspath(arguments.baseline)}")
+        if found:
+            print(f"[WARNING] {len(found)} regression(s) beyond {arguments.tolerance:.0%}:")
+            for message in found:
+                print(f"  {message}")
+            sys.exit(1)
+        print("No regressions found.")
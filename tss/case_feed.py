@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Case change feed built on periodic search snapshots"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Emit case status transitions for downstream automation
+# 1. Inputs: config, output dir, polling interval, [optional] hook commands
+# 2. Outputs: case_feed.jsonl (one event per line), case_feed_snapshot.json
+# Notes: one paged search per poll (id, displayId, status, subState, modifiedDate) is
+#        diffed against the previous snapshot; only changes are emitted, so many
+#        consumers can share one polling loop instead of re-polling every case. A failed poll
+#        (HTTP or connection error) is reported and the previous snapshot kept, so the
+#        next poll emits whatever changed meanwhile
+##################################################################
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from datetime import datetime
+import method_tools
+import profile_tools
+import search
+
+HOME = os.environ["HOME"]
+SNAPSHOT_FILE = "case_feed_snapshot.json"
+FEED_FILE = "case_feed.jsonl"
+
+
+# get args
+def get_args():
+    """Get input arguments"""
+    parser = argparse.ArgumentParser(description="Emit TSS case status transitions")
+    parser.add_argument(
+        "-c",
+        "--config_file",
+        help="Provide a TSS CLI config file. Default ~/.illumina/uploader-config.json",
+        type=str,
+        default=f"{HOME}/.illumina/uploader-config.json",
+    )
+    parser.add_argument(
+        "-o", "--output_dir", help="Path for the feed and snapshot", type=str, required=True
+    )
+    parser.add_argument(
+        "-m",
+        "--interval_min",
+        help="Minutes between snapshots (default: 5)",
+        type=float,
+        default=5,
+    )
+    parser.add_argument(
+        "--hook",
+        help="Command run for each event, with the event JSON on stdin and CASE_ID, "
+        "DISPLAY_ID, FROM_STATUS, TO_STATUS in the environment. Prefix with a status to "
+        "only run on that transition (e.g. 'IN PROGRESS - READY FOR INTERPRETATION=./notify.sh'). "
+        "Can be repeated.",
+        type=str,
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--once",
+        help="Take a single snapshot, emit the changes and exit",
+        action="store_true",
+    )
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+# status label shared with monitor_progress
+def format_status(status, sub_state):
+    """e.g. IN PROGRESS - READY FOR INTERPRETATION"""
+
+    return f"{(status or '').upper()} - {(sub_state or '').upper().replace('_', ' ')}"
+
+
+# take a snapshot
+def take_snapshot(config_dict, params=None):
+    """{case id: [displayId, status label, modifiedDate]} from one paged search"""
+
+    snapshot = {}
+    for case in search.search_pages(params or {}, config_dict):
+        snapshot[case["id"]] = [
+            case.get("displayId"),
+            format_status(case.get("status"), case.get("subState")),
+            case.get("modifiedDate"),
+        ]
+    return snapshot
+
+
+# diff two snapshots
+def diff_snapshots(previous, current):
+    """Return transition events between two snapshots"""
+
+    events = []
+    now = datetime.now().isoformat()
+    for case_id, (display_id, status, modified) in current.items():
+        before = previous.get(case_id)
+        if before is None:
+            events.append(
+                {
+                    "time": now,
+                    "event": "created",
+                    "caseId": case_id,
+                    "displayId": display_id,
+                    "from": None,
+                    "to": status,
+                    "modifiedDate": modified,
+                }
+            )
+        elif before[1] != status:
+            events.append(
+                {
+                    "time": now,
+                    "event": "transition",
+                    "caseId": case_id,
+                    "displayId": display_id,
+                    "from": before[1],
+                    "to": status,
+                    "modifiedDate": modified,
+                }
+            )
+    for case_id, (display_id, status, modified) in previous.items():
+        if case_id not in current:
+            events.append(
+                {
+                    "time": now,
+                    "event": "removed",
+                    "caseId": case_id,
+                    "displayId": display_id,
+                    "from": status,
+                    "to": None,
+                    "modifiedDate": modified,
+                }
+            )
+    return events
+
+
+# parse hook arguments
+def parse_hooks(hooks):
+    """[STATUS=]command -> [(status or None, command)]"""
+
+    parsed = []
+    for hook in hooks:
+        status, separator, command = hook.partition("=")
+        # status labels always contain " - "; shell assignments (FOO=1 cmd) do not
+        if separator and " - " in status:
+            parsed.append((status.strip(), command.strip()))
+        else:
+            parsed.append((None, hook))
+    return parsed
+
+
+# run hooks for an event
+def run_hooks(event, hooks):
+    """Run every matching hook command for an event"""
+
+    for status, command in hooks:
+        if status and event["to"] != status:
+            continue
+        environment = {
+            **os.environ,
+            "CASE_ID": event["caseId"] or "",
+            "DISPLAY_ID": event["displayId"] or "",
+            "FROM_STATUS": event["from"] or "",
+            "TO_STATUS": event["to"] or "",
+        }
+        result = subprocess.run(
+            command,
+            shell=True,
+            input=method_tools.json_dumps(event),
+            text=True,
+            env=environment,
+            check=False,
+        )
+        if result.returncode:
+            print(f"[WARNING] Hook exited with {result.returncode}:\t{command}")
+
+
+# snapshot persistence
+def load_snapshot(directory):
+    """Previous snapshot, or None on the first run"""
+
+    path = directory + SNAPSHOT_FILE
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as snapshot:
+            return method_tools.json_load(snapshot)
+    return None
+
+
+def save_snapshot(directory, snapshot):
+    """Atomically save the snapshot"""
+
+    path = directory + SNAPSHOT_FILE
+    with open(path + ".tmp", "w", encoding="utf-8") as output:
+        method_tools.json_dump(snapshot, output)
+    os.replace(path + ".tmp", path)
+
+
+# one polling cycle
+def poll(config_dict, directory, previous, hooks):
+    """Snapshot, diff, emit; returns the new snapshot"""
+
+    current = take_snapshot(config_dict)
+
+    # the first snapshot is a baseline, not a burst of "created" events
+    events = diff_snapshots(previous, current) if previous is not None else []
+    if events:
+        with open(directory + FEED_FILE, "a", encoding="utf-8") as feed:
+            for event in events:
+                feed.write(method_tools.json_dumps(event) + "\n")
+        for event in events:
+            run_hooks(event, hooks)
+
+    save_snapshot(directory, current)
+    print(f"{datetime.now()}\tCases:\t{len(current)}\tEvents:\t{len(events)}")
+    return current
+
+
+# main runs automatically
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
+
+    # check and format the output dir
+    output_directory = method_tools.format_path(os.path.abspath(arguments.output_dir))
+    config = method_tools.parse_config(arguments.config_file)
+    hook_commands = parse_hooks(arguments.hook)
+
+    # logging
+    print(f"{datetime.now()}\tStarting case feed.")
+    print(f"{datetime.now()}\tFeed:\t{output_directory + FEED_FILE}")
+
+    last_snapshot = load_snapshot(output_directory)
+    while True:
+        try:
+            last_snapshot = poll(config, output_directory, last_snapshot, hook_commands)
+        # keep the daemon running on a failed poll
+        except method_tools.RequestException as err:
+            print(f"{datetime.now()}\t[ERROR] Poll failed, keeping the previous snapshot: {type(err).__name__} {err}")
+            if arguments.once:
+                sys.exit(1)
+        if arguments.once:
+            break
+        time.sleep(arguments.interval_min * 60)
@@ -7,9 +7,9 @@
 # Get indications from a case
 ##################################################################
 
-import json
 import argparse
 import method_tools
+import profile_tools
 import case_mgt_v2
 
 
@@ -23,6 +23,8 @@ def get_args():
     )
     parser.add_argument("-i", "--id", help="Enter a case GUID", type=str, required=True)
 
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
     args = parser.parse_args()
     return args
 
@@ -30,6 +32,8 @@ def get_args():
 if __name__ == "__main__":
     # Get user input
     arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
     case_id = arguments.id
     config_file = arguments.config_file
 
@@ -46,4 +50,4 @@ if __name__ == "__main__":
         indications = subject["phenotypes"]
         print(f"\n{relationship} indication(s):")
 
-        print(json.dumps(indications))
+        print(method_tools.json_dumps(indications))
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""Stream and validate a TSS case manifest (CSV)"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Case manifest reader
+# 1. Inputs: case CSV with one row per case subject
+# 2. Outputs: CaseSubject records grouped by FamilyID
+# Notes: every row is validated in one pass; errors are collected and reported together
+##################################################################
+
+import csv
+import sys
+from dataclasses import dataclass
+import method_tools
+
+REQUIRED_COLUMNS = [
+    "FamilyID",
+    "SampleID",
+    "RelationshipToProband",
+    "Affected",
+    "Sex",
+    "TestID",
+]
+OPTIONAL_COLUMNS = [
+    "FirstName",
+    "MiddleName",
+    "LastName",
+    "DOB",
+    "MRN",
+    "ReportID",
+    "Indications",
+    "Tags",
+]
+DISPLAY_ID_LENGTH = 12
+
+
+@dataclass
+class CaseSubject:
+    """One case subject (manifest row)"""
+
+    __slots__ = (
+        "line_number",
+        "family_id",
+        "sample_id",
+        "relationship",
+        "affected",
+        "sex",
+        "test_id",
+        "first_name",
+        "middle_name",
+        "last_name",
+        "dob",
+        "mrn",
+        "report_ids",
+        "indications",
+        "tags",
+    )
+
+    line_number: int
+    family_id: str
+    sample_id: str
+    relationship: str
+    affected: str
+    sex: str
+    test_id: str
+    first_name: str
+    middle_name: str
+    last_name: str
+    dob: str
+    mrn: str
+    report_ids: list
+    indications: list
+    tags: list
+
+    @property
+    def display_id(self):
+        """Case display ID: the first 12 characters of the family ID"""
+        return self.family_id[0:DISPLAY_ID_LENGTH]
+
+
+@dataclass
+class ManifestError:
+    """A row level validation error"""
+
+    __slots__ = ("line_number", "message")
+
+    line_number: int
+    message: str
+
+    def __str__(self):
+        return f"Line {self.line_number}:\t{self.message}"
+
+
+# map header names to column positions
+def index_header(header):
+    """Return {column: position} and the missing required columns"""
+
+    header = [column.strip() for column in header]
+    if header:
+        header[0] = header[0].lstrip("#").strip()
+    positions = {column: position for position, column in enumerate(header)}
+    missing = [column for column in REQUIRED_COLUMNS if column not in positions]
+    return positions, missing
+
+
+# convert one row into a record
+def parse_row(row, positions, line_number, hpo=None):
+    """Return (CaseSubject or None, [error messages])"""
+
+    errors = []
+    if len(row) > len(positions):
+        errors.append(
+            f"expected {len(positions)} fields, found {len(row)} (quote fields containing commas)"
+        )
+
+    def field(column):
+        position = positions.get(column)
+        if position is None or position >= len(row):
+            return ""
+        return row[position].strip()
+
+    for column in REQUIRED_COLUMNS:
+        if not field(column):
+            errors.append(f"{column} is required")
+
+    # "Other" relationships carry the detail after a semicolon (e.g. Other;Cousin)
+    relationship = field("RelationshipToProband").upper()
+    if relationship.startswith("O") and not relationship.partition(";")[2].strip():
+        errors.append(
+            f"RelationshipToProband {field('RelationshipToProband')} requires a description "
+            "(e.g. Other;Cousin)"
+        )
+    # check indications against the local HPO index
+    indications = method_tools.indications_to_json("code", field("Indications"))
+    if hpo is not None:
+        for indication in indications:
+            code = hpo.normalize(indication["code"].strip())
+            if code is None:
+                errors.append(f"Indication {indication['code']} is not a current HPO ID or term")
+            else:
+                indication["code"] = code
+    if errors:
+        return None, errors
+
+    report_id = field("ReportID")
+    record = CaseSubject(
+        line_number=line_number,
+        family_id=field("FamilyID"),
+        sample_id=field("SampleID"),
+        relationship=relationship,
+        affected=field("Affected"),
+        sex=field("Sex"),
+        test_id=field("TestID"),
+        first_name=field("FirstName"),
+        middle_name=field("MiddleName"),
+        last_name=field("LastName"),
+        dob=field("DOB"),
+        mrn=field("MRN"),
+        report_ids=[report_id] if report_id else [],
+        indications=indications,
+        tags=[tag.strip() for tag in field("Tags").split(";") if tag.strip()],
+    )
+    return record, errors
+
+
+# stream the manifest
+def iter_case_subjects(input_csv, errors, hpo=None):
+    """Yield CaseSubject records; validation errors are appended to errors"""
+
+    with open(input_csv, "r", encoding="utf-8", newline="") as input_file:
+        reader = csv.reader(input_file)
+        positions, missing = index_header(next(reader, []))
+        if missing:
+            errors.append(ManifestError(1, f"missing required column(s): {', '.join(missing)}"))
+            return
+
+        for row in reader:
+            # skip blank rows; a row without a FamilyID is reported by parse_row
+            if all(not value.strip() for value in row):
+                continue
+            record, messages = parse_row(row, positions, reader.line_num, hpo)
+            errors.extend(ManifestError(reader.line_num, message) for message in messages)
+            if record:
+                yield record
+
+
+# group subjects into families
+def read_case_manifest(input_csv, hpo=None):
+    """Return ({family_id: [CaseSubject]}, [ManifestError]) after one pass over the file
+
+    When an HpoIndex is given, indications are validated and mapped to current HPO IDs.
+    """
+
+    families = {}
+    errors = []
+    seen_samples = {}
+    for record in iter_case_subjects(input_csv, errors, hpo):
+        key = (record.family_id, record.sample_id)
+        if key in seen_samples:
+            errors.append(
+                ManifestError(
+                    record.line_number,
+                    f"SampleID {record.sample_id} is repeated in family {record.family_id} "
+                    f"(first seen on line {seen_samples[key]})",
+                )
+            )
+            continue
+        seen_samples[key] = record.line_number
+        families.setdefault(record.family_id, []).append(record)
+    return families, errors
+
+
+# print the collected error report
+def report_errors(errors, input_csv):
+    """Print all manifest errors"""
+
+    print(f"[ERROR] {len(errors)} problem(s) found in {input_csv}:")
+    for error in errors:
+        print(f"  {error}")
+
+
+# load or exit
+def load_case_manifest(input_csv, hpo=None):
+    """Load a validated manifest; exit with the full error report when invalid"""
+
+    families, errors = read_case_manifest(input_csv, hpo)
+    if errors:
+        report_errors(errors, input_csv)
+        print(
+            "Please provide an input csv with proper header and values. "
+            "See resources/case folder for an example."
+        )
+        sys.exit()
+    return families
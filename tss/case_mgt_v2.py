@@ -16,145 +16,66 @@
 
 import os
 import sys
-import json
+import logging
 import argparse
-import requests
-from requests.exceptions import HTTPError
 import method_tools
+import profile_tools
+import case_manifest
+import case_validation
+import hpo_index
 
 HOME = os.environ["HOME"]
 CASE_SEARCH_URL = "/crs/api/v2/cases/search"
+CASE_POST_URL = "/crs/api/v1/cases?forceOverwrite=false"
+# subject fields bulk_update_cases compares with the server copy (same names in both)
+COMPARED_SUBJECT_FIELDS = (
+    "firstName",
+    "middleName",
+    "lastName",
+    "dateOfBirth",
+    "mrn",
+    "gender",
+    "isAffected",
+    "relationshipToProband",
+    "otherRelationshipToProband",
+)
 
 
 # Create Sample Dict
-def read_case_csv(input_csv):
-    """Read the input CSV and check the header"""
+def read_case_csv(input_csv, hpo_path=None):
+    """Read and validate the input CSV; returns {family_id: [CaseSubject]}"""
 
-    with open(input_csv, "r", encoding="utf-8") as input_file:
-        header = input_file.readline().lstrip("#").strip().split(",")  # read header
-
-        # Commenting out and using familyID as default display ID
-        # display_id_option = input("Do you want to use family_id as Case Display ID? (yes/no)")
-
-        try:
-            # Required items 0-5
-            # Optional items - add any items below 6-13
-            header_index = {
-                "FamilyID": header.index("FamilyID"),
-                "SampleID": header.index("SampleID"),
-                "RelationshipToProband": header.index("RelationshipToProband"),
-                "Affected": header.index("Affected"),
-                "Sex": header.index("Sex"),
-                "TestID": header.index("TestID"),
-                "FirstName": header.index("FirstName"),
-                "MiddleName": header.index("MiddleName"),
-                "LastName": header.index("LastName"),
-                "DOB": header.index("DOB"),
-                "MRN": header.index("MRN"),
-                "ReportID": header.index("ReportID"),
-                "Indications": header.index("Indications"),
-                "Tags": header.index("Tags"),
-            }
-        except ValueError:
-            print(
-                "Please provide an input csv with proper header. See resources/case folder for an example."
-            )
-            sys.exit()
-
-        # create samples list
-        file_lines = input_file.readlines()
-        case_subjects = []
-        for line in file_lines:
-            if line.startswith(",") or line.isspace():
-                pass
-            else:
-                case_subjects.append(line.strip())
-
-    # create dict of samples
-    sample_dict = {}
-    for individual in case_subjects:
-        subject_data = individual.split(",")
-        family_id = subject_data[header_index["FamilyID"]]
-
-        # create list for indications and tags
-        indications = method_tools.indications_to_json(
-            "code", subject_data[header_index["Indications"]]
-        )  # optional
-        tags = subject_data[header_index["Tags"]].strip().split(";")  # optional
-
-        # pass parameters for sample as dictionary. All the samples within a family will be under familyID key.
-        try:
-            sample_dict[family_id].append(
-                [
-                    subject_data[header_index["SampleID"]],
-                    subject_data[header_index["RelationshipToProband"]].upper(),
-                    subject_data[header_index["FirstName"]] or "",  # optional
-                    subject_data[header_index["MiddleName"]] or "",  # optional
-                    subject_data[header_index["LastName"]] or "",  # optional
-                    subject_data[header_index["MRN"]] or "",  # optional
-                    subject_data[header_index["Sex"]],
-                    subject_data[header_index["DOB"]] or "",  # optional
-                    [subject_data[header_index["ReportID"]].strip()]
-                    if subject_data[header_index["ReportID"]].strip()
-                    else [],
-                    indications if indications else [],
-                    subject_data[header_index["Affected"]].strip(),
-                    tags if tags else [],
-                    subject_data[header_index["TestID"]],
-                    family_id[0:12],  # take only the first 12 characters.
-                ]
-            )
-        except KeyError:
-            sample_dict[family_id] = [
-                [
-                    subject_data[header_index["SampleID"]],
-                    subject_data[header_index["RelationshipToProband"]].upper(),
-                    subject_data[header_index["FirstName"]] or "",  # optional
-                    subject_data[header_index["MiddleName"]] or "",  # optional
-                    subject_data[header_index["LastName"]] or "",  # optional
-                    subject_data[header_index["MRN"]] or "",  # optional
-                    subject_data[header_index["Sex"]],
-                    subject_data[header_index["DOB"]] or "",  # optional
-                    [subject_data[header_index["ReportID"]].strip()]
-                    if subject_data[header_index["ReportID"]].strip()
-                    else [],
-                    indications if indications else [],
-                    subject_data[header_index["Affected"]].strip(),
-                    tags if tags else [],
-                    subject_data[header_index["TestID"]],
-                    family_id[0:12],  # take only the first 12 characters.
-                ]
-            ]
-
-    return sample_dict
+    if hpo_path is None:
+        return case_manifest.load_case_manifest(input_csv)
+    with hpo_index.load_index(hpo_path) as hpo:
+        return case_manifest.load_case_manifest(input_csv, hpo)
 
 
 # Get Payload
-def get_payload(sample_dict):
-    """Create sample_dic={sample_id, firstname, lastname, mrn, sex, dob, reportid, json_indication}"""
+def get_payload(case_subjects):
+    """Create the case payload from a family's CaseSubject records"""
     test_id = None
     tags = None
     display_id = None
 
     allsubjects = []
-    for sample in enumerate(sample_dict):
-        # Convert None values to empty strings
-        test_id = sample[1][12]
-        tags = sample[1][11]
-        display_id = sample[1][13]
+    for record in case_subjects:
+        test_id = record.test_id
+        tags = record.tags
+        display_id = record.display_id
 
         subject = {
-            "dateOfBirth": sample[1][7],
-            "firstName": sample[1][2],
-            "lastName": sample[1][3],
-            "middleName": sample[1][4],
-            "gender": sample[1][6],
-            "mrn": sample[1][5],
-            "isAffected": sample[1][10],
+            "dateOfBirth": record.dob,
+            "firstName": record.first_name,
+            "lastName": record.last_name,
+            "middleName": record.middle_name,
+            "gender": record.sex,
+            "mrn": record.mrn,
+            "isAffected": record.affected,
             "relationshipToProband": None,
-            "phenotypes": sample[1][9],
-            "reportTypes": sample[1][8],
-            "samples": [{"externalSampleId": sample[1][0]}],
+            "phenotypes": record.indications,
+            "reportTypes": record.report_ids,
+            "samples": [{"externalSampleId": record.sample_id}],
             "previousTestHistory": "",
             "medicalHistory": "",
             "familyHistory": "",
@@ -166,12 +87,12 @@ def get_payload(sample_dict):
 
         # Check relationship
         # for relationship "Other", otherRelationshipToProband is mandatory, relationship provided after
-        if sample[1][1].startswith("O") or sample[1][1].startswith("o"):
-            otherinfo = sample[1][1].split(";")
+        if record.relationship.startswith("O"):
+            otherinfo = record.relationship.split(";")
             subject.update({"relationshipToProband": otherinfo[0]})
             subject.update({"otherRelationshipToProband": otherinfo[1]})
         else:
-            subject.update({"relationshipToProband": sample[1][1]})
+            subject.update({"relationshipToProband": record.relationship})
 
     # Create case payload dict
     payload = {
@@ -184,54 +105,50 @@ def get_payload(sample_dict):
     return payload
 
 
+# Change relationshipToProband to uppercase to fix Emedgene issue
+def upper_relationships(payload):
+    """Upper-case every subject's relationshipToProband (in place)"""
+
+    for subject in payload["subjects"]:
+        subject["relationshipToProband"] = subject["relationshipToProband"].upper()
+
+
 # Post Case
 def post_case(payload, config, output_dir):
     """Post a case"""
 
-    # Change relationshipToProband to uppercase to fix Emedgene issue
-    for i in range(len(payload["subjects"])):
-        payload["subjects"][i]["relationshipToProband"] = payload["subjects"][i][
-            "relationshipToProband"
-        ].upper()
+    upper_relationships(payload)
 
     directory = method_tools.format_path(os.path.abspath(output_dir))
-    with open(directory + "post_case.log", "w", encoding="utf-8") as logfile:
+    with method_tools.JsonLog(directory + "post_case.log") as logfile:
         # Request inputs
         response = None
-        url_post = f"https://{config['domain']}.{config['url']}/crs/api/v1/cases?forceOverwrite=false"
-
-        headers = method_tools.get_headers_apikey(
-            config["apikey"], config["domain"], config["wg"]
-        )
+        url_post = f"{method_tools.get_base_url(config)}{CASE_POST_URL}"
 
         print("Attempting to POST case.")
-        logfile.write("Attempting to post case...")
-
         print(f"Request URL:\t{url_post}")
-        logfile.write(f"\nRequest URL:\t{url_post}")
+        logfile.info("Attempting to post case", url=url_post)
 
-        print(f"Payload:\t{json.dumps(payload)}")
-        logfile.write(f"\nPayload:\t{json.dumps(payload)}")
+        # the full payload is only echoed at debug verbosity
+        if logfile.verbosity == "debug":
+            print(f"Payload:\t{method_tools.json_dumps(payload)}")
+        logfile.payload("post_case payload", payload)
 
         # Post case
-        logfile.write("\n\npost_case server response:\n")
         try:
-            response = requests.post(
-                url_post, headers=headers, data=json.dumps(payload), timeout=30
-            )
+            response = create_case(payload, config)
 
             # If the response was successful, no Exception will be raised
             response.raise_for_status()
 
         # Error posting case
-        except HTTPError as http_err:
+        except method_tools.HTTPError as http_err:
             print(f"HTTP error occurred: {http_err}")
-            logfile.write(f"HTTP error occurred: {http_err}\n")
 
             # calls error messaging function in method tools
+            logfile.error(f"HTTP error occurred: {http_err}", response=response.text)
             if response.text:
                 method_tools.error_messaging(response.text)
-                logfile.write(response.text)
             print(
                 "Exiting, case ingestion failed. Please check the logs for detailed error message."
             )
@@ -242,22 +159,24 @@ def post_case(payload, config, output_dir):
             if response.status_code == 201:
                 if response.text:
                     family_size = len(payload["subjects"])
-                    logfile.write(response.text)
-                    display_id = response.json()["displayId"]
-                    case_guid = response.json()["id"]
+                    results = method_tools.response_json(response)
+                    display_id = results["displayId"]
+                    case_guid = results["id"]
+                    logfile.payload("post_case server response", results, level=logging.DEBUG)
 
                     print("Case created!")
-                    logfile.write(
-                        f"\nCase created with Display ID: {display_id} and GUID: {case_guid}"
-                    )
+                    logfile.info("Case created", display_id=display_id, case_guid=case_guid)
                     print(f"Case Display ID:\t{display_id}")
                     print(f"Case GUID:\t{case_guid}")
                     print(f"Pedigree Size:\t{family_size}")
-                    return response.json()
+                    return results
 
             # Error posting case
             print("Unknown error occurred. Exiting, case ingestion failed.")
-            logfile.write("Unknown error occurred. Exiting, case ingestion failed.\n")
+            logfile.error(
+                "Unknown error occurred. Exiting, case ingestion failed.",
+                status_code=response.status_code,
+            )
             sys.exit()
 
 
@@ -265,31 +184,25 @@ def post_case(payload, config, output_dir):
 def process_case(case_guid, config, output_dir):
     """Process a case"""
     directory = method_tools.format_path(os.path.abspath(output_dir))
-    with open(directory + "process_case.log", "w", encoding="utf-8") as logfile:
-        url_post = f"https://{config['domain']}.{config['url']}/crs/api/v1/cases"
+    with method_tools.JsonLog(directory + "process_case.log") as logfile:
+        url_post = f"{method_tools.get_base_url(config)}/crs/api/v1/cases"
         url_process = url_post + "/" + case_guid + "/process"
-        headers = method_tools.get_headers_apikey(
-            config["apikey"], config["domain"], config["wg"]
-        )
 
         print(f"Attempting to  process the case, {case_guid}")
-        logfile.write(f"\nAttempting to process the case, {case_guid}")
-
         print(f"Request URL:\t{url_process}")
-        logfile.write(f"\nRequest URL:\t{url_process}")
+        logfile.info("Attempting to process the case", case_guid=case_guid, url=url_process)
 
         # Process case
-        logfile.write("\n\nprocess_case server response:\n")
         try:
-            response = requests.post(url_process, headers=headers, timeout=30)
+            response = start_processing(case_guid, config)
 
             # If the response was successful, no Exception will be raised
             response.raise_for_status()
 
         # Error processing case
-        except HTTPError as http_err:
+        except method_tools.HTTPError as http_err:
             print(f"HTTP error occurred: {http_err}")
-            logfile.write(f"HTTP error occurred: {http_err}")
+            logfile.error(f"HTTP error occurred: {http_err}", response=response.text)
             print(
                 "Exiting, case processing failed. Please check logs for detailed error message."
             )
@@ -300,29 +213,53 @@ def process_case(case_guid, config, output_dir):
             if response.status_code == 200:
                 # no server response if successful; nothing to write to logfile
                 print("Case is now processing!\n")
-                logfile.write(f"Case {case_guid} is now processing.")
+                logfile.info("Case is now processing", case_guid=case_guid)
             else:
                 # Error processing case
                 print("Unknown error occurred. Exiting, case ingestion failed.")
                 sys.exit()
 
 
+# POST a case without exiting on error
+def create_case(payload, config):
+    """POST a case payload and return the response"""
+
+    upper_relationships(payload)
+    url_post = f"{method_tools.get_base_url(config)}{CASE_POST_URL}"
+    return method_tools.api_request(
+        "POST", url_post, config, data=method_tools.json_dumps(payload).encode("utf-8")
+    )
+
+
+# Process a case without exiting on error
+def start_processing(case_guid, config):
+    """POST the process request and return the response"""
+
+    url_process = f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_guid}/process"
+    return method_tools.api_request("POST", url_process, config)
+
+
+# Get a case without exiting on error
+def fetch_case(case_guid, config):
+    """GET a case (without direct identifiers) and return the response"""
+
+    get_url = f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_guid}"
+    return method_tools.api_request("GET", get_url, config, params={"directIdentifiers": "false"})
+
+
 # Get Case
 def get_case(case_guid, config):
     """Get case"""
 
     # Get case inputs
-    headers = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
-    get_url = f"https://{config['domain']}.{config['url']}/crs/api/v1/cases/{case_guid}?directIdentifiers=false"
+    get_url = f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_guid}?directIdentifiers=false"
 
-    # Get case by GUID
+    # Get case by GUID (pooled, rate limited per workgroup)
     try:
-        response = requests.get(get_url, headers=headers, timeout=30)
+        response = method_tools.api_request("GET", get_url, config)
 
     # Error getting case
-    except HTTPError as http_err:
+    except method_tools.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")
         print("Exiting, failed to get the case.")
         sys.exit()
@@ -332,7 +269,7 @@ def get_case(case_guid, config):
         if response.status_code == 200:
             if response.text:
                 # print("Case found!")
-                return response.json()
+                return method_tools.response_json(response)
 
         # Error getting case
         print("Unknown error occurred. Exiting, failed to get the case.")
@@ -376,10 +313,10 @@ def get_case_details(case_guid, config, list_out_files=False):
     # Print output files when available
     if list_out_files:
         try:
-            ingestion = json.loads(case_json["ingestionResult"])
+            ingestion = method_tools.json_loads(case_json["ingestionResult"])
 
-        # Error getting output files
-        except TypeError:
+        # Error getting output files (orjson raises a ValueError for None)
+        except (TypeError, ValueError):
             print("Analysis results do not exist (yet)")
 
         # No errors
@@ -398,11 +335,8 @@ def get_presigned_url(filepath, config):
     """Get pre-signed URL(s) for a GDS path"""
 
     # Get presigned URLs inputs
-    headers = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
     url_request = (
-        f"https://{config['domain']}.{config['url']}/crs/api/v1/files?"
+        f"{method_tools.get_base_url(config)}/crs/api/v1/files?"
         f"includePresignedUrl=true&matchExactPath=false&path={filepath}"
     )
 
@@ -411,12 +345,12 @@ def get_presigned_url(filepath, config):
 
     # Get presigned URLs
     try:
-        response = requests.get(url_request, headers=headers, timeout=30)
+        response = method_tools.api_request("GET", url_request, config)
         # If the response was successful, no Exception will be raised
         response.raise_for_status()
 
     # Error getting presigned URLs
-    except HTTPError as http_err:
+    except method_tools.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")  # Python 3.6
         print("Exiting.")
         sys.exit()
@@ -425,11 +359,12 @@ def get_presigned_url(filepath, config):
     else:
         # If the response was successful, no Exception will be raised
         if response.status_code == 200:
-            if response.json():
+            output_files = method_tools.response_json(response)
+            if output_files:
                 # Loop over output files
-                for i in range(len(response.json())):
-                    print(f"Path:\t{response.json()[i]['path']}")
-                    print(f"Pre-signed URL:\t{response.json()[i]['preSignedUrl']}")
+                for output_file in output_files:
+                    print(f"Path:\t{output_file['path']}")
+                    print(f"Pre-signed URL:\t{output_file['preSignedUrl']}")
 
         # path may not exist in wg/ domain
         else:
@@ -445,22 +380,21 @@ def get_case_id(display_id, config):
     """Get case guid"""
     # Get caseId inputs
 
-    headers = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
-    get_url = f"https://{config['domain']}.{config['url']}{CASE_SEARCH_URL}?displayId={display_id}"
+    get_url = f"{method_tools.get_base_url(config)}{CASE_SEARCH_URL}?displayId={display_id}"
     print(f"Attempting to GET the case by display ID, {display_id}")
     print(f"Request URL:\t{get_url}")
 
     # Get case by displayId
     try:
-        response = requests.get(get_url, headers=headers, timeout=30)
+        response = method_tools.api_request(
+            "GET", get_url, config, headers=method_tools.AGENT_LOOKUP_HEADERS
+        )
 
         # If the response was successful, no Exception will be raised
         response.raise_for_status()
 
     # Error getting case
-    except HTTPError as http_err:
+    except method_tools.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")  # Python 3.6
         print("Exiting.")
         sys.exit()
@@ -468,10 +402,9 @@ def get_case_id(display_id, config):
     # No errors
     else:
         if response.status_code == 200:
-            if response.json()["content"]:
-                for i in range(len(response.json()["content"])):
-                    if response.json()["content"][i]["displayId"] == display_id:
-                        return response.json()["content"][i]["id"]
+            for entry in method_tools.response_json(response)["content"] or []:
+                if entry["displayId"] == display_id:
+                    return entry["id"]
 
         # Error getting case ID
         print(f"Case with {display_id} does not exist!!")
@@ -482,32 +415,30 @@ def get_case_id(display_id, config):
 def qc_override_case(case_guid, config):
     """QC override case"""
     # QC override inputs
-    headers = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
-    url_override = f"https://{config['domain']}.{config['url']}/crs/api/v1/cases/{case_guid}/qc-actions?action=override"
+    url_override = f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_guid}/qc-actions?action=override"
     print(f"Attempting to QC override the case, {case_guid}")
     print(f"Request URL:\t{url_override}")
 
     # QC override case
-    response = requests.post(url_override, headers=headers, timeout=30)
+    response = method_tools.api_request("POST", url_override, config)
 
     # Case QC override
     if response.status_code == 200:
         print(
             "QC warning overridden! Case status has been moved to In PROGRESS - PROCESSING"
         )
-        print(response.json()["message"])
+        print(method_tools.response_json(response)["message"])
 
     # Error overriding case
     elif response.status_code == 400:
-        print(response.json()["code"])
-        print(response.json()["message"])
+        results = method_tools.response_json(response)
+        print(results["code"])
+        print(results["message"])
         sys.exit()
 
     # Error overriding case
     else:
-        print(response.json()["message"])
+        print(method_tools.response_json(response)["message"])
         sys.exit()
 
 
@@ -515,49 +446,51 @@ def qc_override_case(case_guid, config):
 def qc_modify_case(case_guid, config):
     """QC modify case"""
     # QC modify inputs
-    headers = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
-    url_modify = f"https://{config['domain']}.{config['url']}/crs/api/v1/cases/{case_guid}/qc-actions?action=modify"
+    url_modify = f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_guid}/qc-actions?action=modify"
     print(f"Attempting to QC modify the case, {case_guid}")
     print(f"Request URL:\t{url_modify}")
 
     # QC modify case
-    response = requests.post(url_modify, headers=headers, timeout=30)
+    response = method_tools.api_request("POST", url_modify, config)
 
     # QC modify
     if response.status_code == 200:
         print("QC warning modified. Case status has been moved to HAS - ISSUE")
-        print(response.json()["message"])
+        print(method_tools.response_json(response)["message"])
 
     # Error modifying case
     elif response.status_code == 400:
-        print(response.json()["code"])
-        print(response.json()["message"])
+        results = method_tools.response_json(response)
+        print(results["code"])
+        print(results["message"])
         sys.exit()
 
     # Error modifying case
     else:
-        print(response.json()["message"])
+        print(method_tools.response_json(response)["message"])
         sys.exit()
 
 
+# QC action without exiting on error
+def post_qc_action(case_guid, action, config):
+    """POST a QC action (override or modify) and return the response"""
+
+    url_action = f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_guid}/qc-actions"
+    return method_tools.api_request("POST", url_action, config, params={"action": action})
+
+
 # DELETE Case
 def delete_case(case_guid, config):
-    """Delete case"""
+    """Delete case; returns the response"""
     # Delete case inputs
 
-    headers = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
-
-    url_delete = f"https://{config['domain']}.{config['url']}/crs/api/v1/cases/{case_guid}?force=true"
+    url_delete = f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_guid}?force=true"
 
     print(f"Attempting to delete the case, {case_guid}")
     print(f"Request URL:\t{url_delete}")
 
-    # Delete case
-    response = requests.delete(url_delete, headers=headers, timeout=30)
+    # Delete case (pooled, rate limited per workgroup)
+    response = method_tools.api_request("DELETE", url_delete, config)
 
     # Case deleted
     if response.status_code == 204:
@@ -565,12 +498,14 @@ def delete_case(case_guid, config):
 
     # Error deleting case
     elif response.status_code == 400:
-        print(response.json()["code"])
-        print(response.json()["message"])
+        results = method_tools.response_json(response)
+        print(results["code"])
+        print(results["message"])
 
     # Error deleting case
     else:
-        print(response.json()["message"])
+        print(method_tools.response_json(response)["message"])
+    return response
 
 
 # Update Case
@@ -578,16 +513,13 @@ def update_case(case_guid, data, config_dict):
     """Update case"""
 
     # Update case inputs
-    headers = method_tools.get_headers_apikey(
-        config_dict["apikey"], config_dict["domain"], config_dict["wg"]
-    )
-    url_update = f"https://{config_dict['domain']}.{config_dict['url']}/crs/api/v1/cases/{case_guid}?force=false"
+    url_update = f"{method_tools.get_base_url(config_dict)}/crs/api/v1/cases/{case_guid}?force=false"
     print(f"Attempting to update the case, {case_guid}")
     print(f"Request URL:\t{url_update}")
 
     # Update case
-    response = requests.put(
-        url_update, data=json.dumps(data), headers=headers, timeout=30
+    response = method_tools.api_request(
+        "PUT", url_update, config_dict, data=method_tools.json_encode(data)
     )
 
     # Case updated
@@ -600,56 +532,253 @@ def update_case(case_guid, data, config_dict):
         sys.exit()
 
 
-def modify_case_json(get_response, input_json):
-    """Update the case json"""
+# Check the case can be edited
+def check_case_editable(get_response):
+    """Return an error message when the case cannot be updated, otherwise None"""
     case_guid = get_response["id"]
     # Check case status - complete cases cannot be edited
     if get_response["status"] == "Complete":
-        print(
+        return (
             f"[ERROR] unable to edit a Complete case ({case_guid}). "
             "Please 'Edit Report(s)' before updating a complete case."
         )
-        sys.exit()
     if get_response["subState"] == "QC_WARNING":
-        print(
+        return (
             "[ERROR] unable to edit a QC Warning case. Please 'QC Override' or 'QC Modify' "
             f"the case ({case_guid}) before updating a QC Warning case."
         )
+    return None
+
+
+def modify_case_json(get_response, input_json):
+    """Update the case json"""
+    error = check_case_editable(get_response)
+    if error:
+        print(error)
         sys.exit()
 
+    # Index input subjects by (externalSampleId, relationshipToProband)
+    subject_index = {}
+    for position, og_subject in enumerate(input_json["subjects"]):
+        og_relationship = og_subject["relationshipToProband"]
+        for og_sample in og_subject["samples"]:
+            key = (og_sample["externalSampleId"], og_relationship)
+            subject_index.setdefault(key, []).append(position)
+
     # Loop over get case response
-    case_subjects = get_response["caseSubjects"]
-    for subject in enumerate(case_subjects):
-        # Get ids from get case response
-        subject_guid = subject[1]["id"]
-        relationship = subject[1]["relationshipToProband"]
-        active_external_sample_id = subject[1]["activeSample"]["externalSampleId"]
-        active_sample_guid = subject[1]["activeSample"]["id"]
-
-        # Loop over input subject data
-        original_subjects = input_json["subjects"]
-        for og_subject in enumerate(original_subjects):
-            # Loop over original sample data
-            og_relationship = og_subject[1]["relationshipToProband"]
-            original_sample = og_subject[1]["samples"]
-            for og_sample in enumerate(original_sample):
-                # Find the correct subject/ sample to update
-                og_external_sample_id = og_sample[1]["externalSampleId"]
-                if (
-                    og_external_sample_id == active_external_sample_id
-                    and og_relationship == relationship
-                ):
-                    # Add the ids and activeSample
-                    input_json["subjects"][og_subject[0]]["id"] = subject_guid
-                    input_json["subjects"][og_subject[0]]["samples"][0][
-                        "id"
-                    ] = active_sample_guid
-                    input_json["subjects"][og_subject[0]]["samples"][0][
-                        "status"
-                    ] = "ACTIVE"
+    for subject in get_response["caseSubjects"]:
+        key = (
+            subject["activeSample"]["externalSampleId"],
+            subject["relationshipToProband"],
+        )
+        # Add the ids and activeSample to the matching subject(s)
+        for position in subject_index.get(key, []):
+            og_subject = input_json["subjects"][position]
+            og_subject["id"] = subject["id"]
+            og_subject["samples"][0]["id"] = subject["activeSample"]["id"]
+            og_subject["samples"][0]["status"] = "ACTIVE"
     return input_json
 
 
+# Get CaseIDs for many display IDs
+def get_case_ids(display_ids, config, max_workers=method_tools.MAX_WORKERS, errors=None):
+    """Resolve display IDs to case GUIDs in one concurrent batch
+
+    Failed lookups map to None; request errors are recorded in errors (when given).
+    """
+
+    base_url = method_tools.get_base_url(config)
+
+    def lookup(display_id):
+        try:
+            response = method_tools.api_request(
+                "GET",
+                f"{base_url}{CASE_SEARCH_URL}",
+                config,
+                params={"displayId": display_id},
+                headers=method_tools.AGENT_LOOKUP_HEADERS,
+            )
+        except method_tools.RequestException as err:
+            if errors is not None:
+                errors[display_id] = f"[ERROR] {type(err).__name__}: {err}"
+            return None
+        if response.status_code == 200:
+            for entry in method_tools.response_json(response).get("content") or []:
+                if entry["displayId"] == display_id:
+                    return entry["id"]
+        return None
+
+    display_ids = list(dict.fromkeys(display_ids))
+    print(f"Attempting to GET {len(display_ids)} case(s) by display ID")
+    case_ids = method_tools.run_concurrently(lookup, display_ids, max_workers)
+    return dict(zip(display_ids, case_ids))
+
+
+# Get many cases
+def get_cases(
+    case_guids, config, max_workers=method_tools.MAX_WORKERS, errors=None, direct_identifiers=False
+):
+    """GET case JSON for many GUIDs concurrently; failed lookups map to None
+
+    Request errors are recorded in errors (when given) instead of aborting the batch.
+    PHI (names, date of birth, MRN) is only returned when direct_identifiers is set.
+    """
+
+    base_url = method_tools.get_base_url(config)
+
+    def fetch(case_guid):
+        try:
+            response = method_tools.api_request(
+                "GET",
+                f"{base_url}/crs/api/v1/cases/{case_guid}",
+                config,
+                params={"directIdentifiers": "true" if direct_identifiers else "false"},
+            )
+        except method_tools.RequestException as err:
+            if errors is not None:
+                errors[case_guid] = f"[ERROR] {type(err).__name__}: {err}"
+            return None
+        if response.status_code == 200 and response.text:
+            return method_tools.response_json(response)
+        return None
+
+    case_guids = list(case_guids)
+    return dict(zip(case_guids, method_tools.run_concurrently(fetch, case_guids, max_workers)))
+
+
+# Compare a merged payload against the server copy
+def case_has_changes(get_response, payload):
+    """Check whether PUTting the payload would change the case
+
+    Only COMPARED_SUBJECT_FIELDS, phenotype codes, report IDs and the active sample are
+    compared; a field the server copy does not echo is not counted as a change.
+    """
+
+    server_case = {
+        "testDefinitionId": (get_response.get("testDefinition") or {}).get("id"),
+        "tags": sorted(get_response.get("tags") or []),
+        "displayId": get_response.get("displayId"),
+    }
+    for key, value in server_case.items():
+        new_value = sorted(payload.get(key) or []) if key == "tags" else payload.get(key)
+        if key in payload and value is not None and new_value != value:
+            return True
+
+    server_subjects = {subject["id"]: subject for subject in get_response["caseSubjects"]}
+    if len(payload["subjects"]) != len(server_subjects):
+        return True
+
+    for subject in payload["subjects"]:
+        server_subject = server_subjects.get(subject.get("id"))
+        if server_subject is None:
+            return True
+        active = server_subject["activeSample"]
+        sample = subject["samples"][0]
+        if sample.get("id") != active["id"] or sample["externalSampleId"] != active["externalSampleId"]:
+            return True
+        for key in COMPARED_SUBJECT_FIELDS:
+            if key not in subject or key not in server_subject:
+                continue
+            value, server_value = subject[key], server_subject[key]
+            # relationships are upper-cased when a case is posted
+            if key == "relationshipToProband":
+                value, server_value = (value or "").upper(), (server_value or "").upper()
+            if value != server_value:
+                return True
+        # server phenotypes and report types are objects; the payload carries codes/ IDs
+        if "phenotypes" in server_subject and [
+            phenotype.get("code") for phenotype in subject.get("phenotypes") or []
+        ] != [phenotype.get("code") for phenotype in server_subject["phenotypes"] or []]:
+            return True
+        if "reportTypes" in server_subject and list(subject.get("reportTypes") or []) != [
+            report["id"] if isinstance(report, dict) else report
+            for report in server_subject["reportTypes"] or []
+        ]:
+            return True
+    return False
+
+
+# PUT a case without exiting on error
+def put_case(case_guid, data, config):
+    """Send the update request and return the response"""
+
+    url_update = f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_guid}"
+    return method_tools.api_request(
+        "PUT", url_update, config, params={"force": "false"}, data=method_tools.json_encode(data)
+    )
+
+
+# Bulk Update Cases
+def bulk_update_cases(sample_dict, config, output_dir, max_workers=method_tools.MAX_WORKERS):
+    """Update every family in the sample dict: batch lookups, concurrent GETs and PUTs"""
+
+    directory = method_tools.format_path(os.path.abspath(output_dir))
+
+    # Resolve all GUIDs, then GET every case with PHI so the subjects can be compared
+    display_ids = {family_id: family_id.upper() for family_id in sample_dict}
+    lookup_errors = {}
+    case_ids = get_case_ids(display_ids.values(), config, max_workers, lookup_errors)
+    cases = get_cases(
+        [case_id for case_id in case_ids.values() if case_id],
+        config,
+        max_workers,
+        lookup_errors,
+        direct_identifiers=True,
+    )
+
+    # Merge the input with the server copy
+    results = {}
+    to_update = []
+    for family_id, subjects in sample_dict.items():
+        display_id = display_ids[family_id]
+        case_id = case_ids.get(display_id)
+        get_case_response = cases.get(case_id) if case_id else None
+        if get_case_response is None:
+            results[display_id] = lookup_errors.get(
+                case_id or display_id, f"Case with {display_id} does not exist!!"
+            )
+            continue
+
+        error = check_case_editable(get_case_response)
+        if error:
+            results[display_id] = error
+            continue
+
+        modified_case_data = modify_case_json(get_case_response, get_payload(subjects))
+        if not case_has_changes(get_case_response, modified_case_data):
+            results[display_id] = "Unchanged, update skipped"
+            continue
+
+        # only the cases that are PUT get an update file
+        with open(
+            directory + f"{display_id}_update_case.json", "w", encoding="utf-8"
+        ) as output:
+            output.write(method_tools.json_dumps(modified_case_data) + "\n")
+        to_update.append((display_id, case_id, modified_case_data))
+
+    # PUT the changed cases
+    def send(item):
+        _, case_guid, data = item
+        try:
+            response = put_case(case_guid, data, config)
+        except method_tools.RequestException as err:
+            return f"[ERROR] {type(err).__name__}: {err}"
+        if response.status_code == 200:
+            return "Case updated!"
+        return f"[ERROR] {response.text}"
+
+    print(f"Attempting to update {len(to_update)} case(s)")
+    for item, result in zip(
+        to_update, method_tools.run_concurrently(send, to_update, max_workers)
+    ):
+        results[item[0]] = result
+
+    # Summary
+    for display_id, result in results.items():
+        print(f"{display_id}:\t{result}")
+    return results
+
+
 def get_args():
     """Get input arguments"""
     # Create the parser
@@ -717,6 +846,26 @@ def get_args():
         type=str,
         required=False,
     )
+    parser.add_argument(
+        "--hpo",
+        help="Path to hp.obo or a prebuilt hp.idx; validates and maps indications "
+        "in the input CSV",
+        type=str,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "-w",
+        "--max_workers",
+        help="Number of concurrent requests for batch operations (default: "
+        f"{method_tools.MAX_WORKERS})",
+        type=int,
+        default=method_tools.MAX_WORKERS,
+        required=False,
+    )
+    method_tools.add_logging_args(parser)
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
     # Parse the argument
     args = parser.parse_args()
     return args
@@ -725,6 +874,8 @@ def get_args():
 # Main
 if __name__ == "__main__":
     arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
 
     # Check whether output directory was supplied (post_case, process_case and get_pre_singed_urls)
     # Will check the validity of directory path in the functions themselves, not in main function
@@ -798,6 +949,7 @@ if __name__ == "__main__":
     configFile = arguments.configFile or HOME + "/.illumina/uploader-config.json"
     method_tools.check_path(configFile)
     configuration = method_tools.parse_config(configFile)
+    method_tools.set_logging(arguments)
 
     # Post case
     if arguments.optionName == "post_case":
@@ -807,17 +959,18 @@ if __name__ == "__main__":
 
         # Get input csv file
         if arguments.input_file:
-            sample_dictionary = read_case_csv(arguments.input_file)
+            sample_dictionary = read_case_csv(arguments.input_file, arguments.hpo)
 
             # Getting payload for each case/ family. This makes sure that a case is ingested per family
-            for case in sample_dictionary.items():
-                case_data = get_payload(case[1])
-                pedigree_size = len(case[1])
-                if pedigree_size > 5:
-                    print(
-                        f"Exiting, the family size {pedigree_size} is larger than five."
-                    )
-                    sys.exit()
+            case_payloads = {
+                family_id: get_payload(subjects)
+                for family_id, subjects in sample_dictionary.items()
+            }
+
+            # Validate every family before any network I/O
+            case_validation.check_payloads(case_payloads)
+
+            for family_id, case_data in case_payloads.items():
                 post_case_response = post_case(
                     case_data, configuration, arguments.output_dir
                 )
@@ -826,14 +979,17 @@ if __name__ == "__main__":
 
                 # Save case JSON to file
                 with open(
-                    output_directory + f"{case[0].upper()}.json", "w", encoding="utf-8"
+                    output_directory + f"{family_id.upper()}.json", "w", encoding="utf-8"
                 ) as outjson:
-                    outjson.write(json.dumps(case_data))
+                    outjson.write(method_tools.json_dumps(case_data))
 
         # Get input json file
         elif arguments.input_json:
             with open(arguments.input_json, "r", encoding="utf-8") as file:
-                case_data = json.load(file)
+                case_data = method_tools.json_load(file)
+
+            # Validate before posting
+            case_validation.check_payloads({arguments.input_json: case_data})
 
             # Post & process the case
             post_case_response = post_case(
@@ -879,36 +1035,21 @@ if __name__ == "__main__":
 
         # CSV input
         if arguments.input_file:
-            sample_dictionary = read_case_csv(arguments.input_file)
-
-            # Getting payload for each case/ family. This makes sure that a case is ingested per family
-            for case in sample_dictionary.items():
-                case_data = get_payload(case[1])
-
-                # Get the case id and get case
-                case_id = get_case_id(case[0].upper(), configuration)
-                get_case_response = get_case(case_id, configuration)
-
-                # Add sample id(s), subject id(s), and sample status to json
-                modified_case_data = modify_case_json(get_case_response, case_data)
-
-                # Update the case
-                update_case(case_id, modified_case_data, configuration)
-
-                # Write updated json to file
-                with open(
-                    output_directory + f"{case[0].upper()}_update_case.json",
-                    "w",
-                    encoding="utf-8",
-                ) as output:
-                    output.write(json.dumps(modified_case_data) + "\n")
-                    print(f"Updated Case JSON:\t{os.path.abspath(output.name)}")
+            sample_dictionary = read_case_csv(arguments.input_file, arguments.hpo)
+
+            # One case per family: batch lookups, concurrent GETs and PUTs
+            bulk_update_cases(
+                sample_dictionary,
+                configuration,
+                arguments.output_dir,
+                arguments.max_workers,
+            )
 
         # Case json input
         if arguments.input_json:
             # Open the case_json
             with open(arguments.input_json, "r", encoding="utf-8") as file:
-                case_data = json.load(file)
+                case_data = method_tools.json_load(file)
 
             # Get the case id and get case
             case_id = get_case_id(arguments.display_id.upper(), configuration)
@@ -926,5 +1067,5 @@ if __name__ == "__main__":
                 "w",
                 encoding="utf-8",
             ) as output:
-                output.write(json.dumps(modified_case_data) + "\n")
+                output.write(method_tools.json_dumps(modified_case_data) + "\n")
                 print(f"Updated Case JSON:\t{os.path.abspath(output.name)}")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Compact in-memory case records"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Compact case model for large case sets
+# 1. Inputs: get_case or search response JSON
+# 2. Outputs: CaseRecord objects holding only the fields the tools use
+# Notes: records use __slots__ and interned strings for repeated values (status,
+#        subState, creators, test IDs, tags); the full case JSON is fetched on demand
+##################################################################
+
+import sys
+from dataclasses import dataclass
+import case_mgt_v2
+
+
+# repeated values share one string object
+def _intern(value):
+    """Intern strings; keep None as None"""
+
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass
+class SubjectSummary:
+    """The case subject fields used by the tools"""
+
+    __slots__ = ("id", "relationship", "external_sample_id", "is_affected", "report_type_ids")
+
+    id: str
+    relationship: str
+    external_sample_id: str
+    is_affected: object
+    report_type_ids: tuple
+
+    @classmethod
+    def from_json(cls, subject):
+        """Build from a caseSubjects entry"""
+
+        active = subject.get("activeSample") or {}
+        for sample in subject.get("samples") or ():
+            if sample.get("status") == "ACTIVE":
+                active = sample
+        return cls(
+            id=subject.get("id"),
+            relationship=_intern(subject.get("relationshipToProband")),
+            external_sample_id=active.get("externalSampleId"),
+            is_affected=subject.get("isAffected"),
+            report_type_ids=tuple(
+                _intern(report["id"] if isinstance(report, dict) else report)
+                for report in subject.get("reportTypes") or ()
+            ),
+        )
+
+
+@dataclass
+class CaseRecord:
+    """The case fields used by filter_case_list, monitor_progress and download_reports"""
+
+    __slots__ = (
+        "id",
+        "display_id",
+        "status",
+        "sub_state",
+        "tags",
+        "created_by",
+        "created_date",
+        "test_definition_id",
+        "activation_state",
+        "subjects",
+    )
+
+    id: str
+    display_id: str
+    status: str
+    sub_state: str
+    tags: tuple
+    created_by: str
+    created_date: str
+    test_definition_id: str
+    activation_state: str
+    subjects: tuple
+
+    @classmethod
+    def from_json(cls, case_json):
+        """Build from a get_case (or search content) response; extra fields are dropped"""
+
+        test_definition_id = case_json.get("testDefinitionId")
+        if test_definition_id is None:
+            test_definition_id = (case_json.get("testDefinition") or {}).get("id")
+        return cls(
+            id=case_json.get("id"),
+            display_id=case_json.get("displayId"),
+            status=_intern(case_json.get("status")),
+            sub_state=_intern(case_json.get("subState")),
+            tags=tuple(_intern(tag) for tag in case_json.get("tags") or ()),
+            created_by=_intern(case_json.get("createdBy")),
+            created_date=case_json.get("createdDate"),
+            test_definition_id=_intern(test_definition_id),
+            activation_state=_intern(case_json.get("activationState")),
+            subjects=tuple(
+                SubjectSummary.from_json(subject)
+                for subject in case_json.get("caseSubjects") or ()
+            ),
+        )
+
+    @property
+    def status_label(self):
+        """e.g. IN PROGRESS - READY FOR INTERPRETATION"""
+
+        return f"{(self.status or '').upper()} - {(self.sub_state or '').upper().replace('_', ' ')}"
+
+    def full_json(self, config):
+        """Fetch the complete case JSON on demand (not cached)"""
+
+        return case_mgt_v2.get_case(self.id, config)
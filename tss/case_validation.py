@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Pre-flight validation of TSS case payloads"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Validate case payloads locally before any POST
+# 1. Inputs: case payloads from get_payload or an input JSON
+# 2. Outputs: a list of errors (and warnings) per case
+# Notes: all families are checked in one pass so a batch fails before any API call.
+#        RELATIONSHIPS/ GENDERS are the values this repo's tools and examples use, not the
+#        TSS schema: an unknown value, like a family without exactly one PROBAND, is only
+#        a warning and TSS decides.
+##################################################################
+
+import re
+import sys
+from datetime import datetime
+
+MAX_PEDIGREE_SIZE = 5
+RELATIONSHIPS = {
+    "PROBAND",
+    "MOTHER",
+    "FATHER",
+    "SIBLING",
+    "TWIN",
+    "MONOZYGOTIC_TWIN",
+    "HALF_SIBLING",
+    "CHILD",
+    "OTHER",
+}
+GENDERS = {"MALE", "FEMALE", "UNKNOWN"}
+DOB_FORMAT = "%Y-%m-%d"
+HPO_CODE = re.compile(r"^HP:\d{7}$")
+
+
+# validate one date of birth
+def check_dob(value):
+    """True when the DOB is empty or YYYY-MM-DD"""
+
+    if not value:
+        return True
+    try:
+        datetime.strptime(value, DOB_FORMAT)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+# validate one subject
+def validate_subject(subject, position, warnings=None):
+    """Return the errors for one case subject; warnings (when given) collects the rest"""
+
+    errors = []
+    warnings = [] if warnings is None else warnings
+    label = f"subjects[{position}]"
+
+    relationship = str(subject.get("relationshipToProband") or "").upper()
+    if not relationship:
+        errors.append(f"{label}: relationshipToProband is required")
+    elif relationship not in RELATIONSHIPS:
+        warnings.append(
+            f"{label}: relationshipToProband {subject['relationshipToProband']} is not one of "
+            f"{', '.join(sorted(RELATIONSHIPS))}"
+        )
+
+    # otherRelationshipToProband is mandatory for OTHER, and only for OTHER
+    other = subject.get("otherRelationshipToProband")
+    if relationship == "OTHER" and not str(other or "").strip():
+        errors.append(f"{label}: otherRelationshipToProband is required when relationship is OTHER")
+    elif relationship != "OTHER" and other:
+        errors.append(
+            f"{label}: otherRelationshipToProband is only allowed when relationship is OTHER"
+        )
+
+    gender = str(subject.get("gender") or "").upper()
+    if not gender:
+        errors.append(f"{label}: gender is required")
+    elif gender not in GENDERS:
+        warnings.append(
+            f"{label}: gender {subject['gender']} is not one of {', '.join(sorted(GENDERS))}"
+        )
+
+    if not check_dob(subject.get("dateOfBirth")):
+        errors.append(f"{label}: dateOfBirth {subject['dateOfBirth']} must be YYYY-MM-DD")
+
+    samples = subject.get("samples") or []
+    if not samples:
+        errors.append(f"{label}: at least one sample is required")
+    for sample in samples:
+        if not str(sample.get("externalSampleId") or "").strip():
+            errors.append(f"{label}: samples require an externalSampleId")
+
+    # phenotypes come from method_tools.indications_to_json
+    for phenotype in subject.get("phenotypes") or []:
+        code = phenotype.get("code")
+        if not HPO_CODE.match(str(code or "")):
+            errors.append(f"{label}: phenotype code {code} is not an HPO ID (HP:0000000)")
+        if phenotype.get("source") != "HPO":
+            errors.append(f"{label}: phenotype {code} source must be HPO")
+
+    return errors
+
+
+# validate one case
+def validate_payload(payload, warnings=None):
+    """Return the errors for one case payload; warnings (when given) collects the rest"""
+
+    errors = []
+    warnings = [] if warnings is None else warnings
+    if not payload.get("testDefinitionId"):
+        errors.append("testDefinitionId is required")
+
+    subjects = payload.get("subjects") or []
+    if not subjects:
+        errors.append("at least one subject is required")
+        return errors
+    if len(subjects) > MAX_PEDIGREE_SIZE:
+        errors.append(
+            f"the family size {len(subjects)} is larger than {MAX_PEDIGREE_SIZE}"
+        )
+
+    probands = 0
+    sample_ids = set()
+    for position, subject in enumerate(subjects):
+        errors.extend(validate_subject(subject, position, warnings))
+        if str(subject.get("relationshipToProband") or "").upper() == "PROBAND":
+            probands += 1
+        for sample in subject.get("samples") or []:
+            sample_id = sample.get("externalSampleId")
+            if sample_id in sample_ids:
+                errors.append(f"externalSampleId {sample_id} is used more than once")
+            sample_ids.add(sample_id)
+
+    if probands != 1:
+        warnings.append(f"expected one PROBAND, found {probands}")
+    return errors
+
+
+# validate a batch
+def validate_payloads(payloads, warnings=None):
+    """Validate {case label: payload}; returns {case label: [errors]} for invalid cases
+
+    warnings (when given) is filled with {case label: [warnings]}.
+    """
+
+    report = {}
+    for label, payload in payloads.items():
+        case_warnings = []
+        errors = validate_payload(payload, case_warnings)
+        if errors:
+            report[label] = errors
+        if case_warnings and warnings is not None:
+            warnings[label] = case_warnings
+    return report
+
+
+# readable report
+def format_report(report, total):
+    """Report lines: a summary, then one line per error"""
+
+    lines = [f"[ERROR] {len(report)} of {total} case(s) failed validation:"]
+    for label, errors in report.items():
+        lines += [f"  {label}:\t{error}" for error in errors]
+    return lines
+
+
+# validate or exit
+def check_payloads(payloads):
+    """Exit with the full report when any payload is invalid, before any network I/O"""
+
+    warnings = {}
+    report = validate_payloads(payloads, warnings)
+    for label, messages in warnings.items():
+        for message in messages:
+            print(f"[WARNING] {label}:\t{message}")
+    if report:
+        print("\n".join(format_report(report, len(payloads))))
+        print("Exiting, no cases were posted.")
+        sys.exit()
+    print(f"Validated {len(payloads)} case(s)")
@@ -6,7 +6,7 @@
 # Email: llovato@illumina.com
 # Check system requirements for TSS case pipeline
 # 1. Inputs: None
-# 2. Update/ Install pip, pandas, requests
+# 2. Install pip, requests when missing (-u/ --upgrade: always upgrade them)
 # 3. Import required modules
 # 4. Check the Java version
 # 5. Outputs: Log file
@@ -16,7 +16,9 @@
 import os
 import sys
 import argparse
+import importlib.util
 import method_tools
+import profile_tools
 
 
 # install pip
@@ -90,6 +92,13 @@ def get_args():
     parser.add_argument(
         "-o", "--outputDir", help="Path for logging", type=str, required=True
     )
+    parser.add_argument(
+        "-u",
+        "--upgrade",
+        help="pip install --upgrade pip and requests even when they are installed",
+        action="store_true",
+    )
+    profile_tools.add_profile_args(parser)
     args = parser.parse_args()
     return args
 
@@ -97,6 +106,7 @@ def get_args():
 # main function
 if __name__ == "__main__":
     arguments = get_args()
+    profile_tools.set_profiling(arguments)
     outputDir = os.path.abspath(arguments.outputDir)
     cwd = os.getcwd()
 
@@ -112,9 +122,8 @@ if __name__ == "__main__":
         logfile.write(f"Log File:\t{os.path.abspath(logfile.name)}\n")
 
         # Python modules: os and sys are called in this script
-        install_modules = ["pip", "requests", "pandas"]
+        install_modules = ["pip", "requests"]
         required_modules = [
-            "pandas",
             "requests",
             "argparse",
             "csv",
@@ -156,9 +165,12 @@ if __name__ == "__main__":
                 """
                     )
                 else:
-                    # loop over must install/ upgrade modules
+                    # install missing modules; upgrade only on request
                     for module in install_modules:
-                        install_module(module, logfile)
+                        if arguments.upgrade or importlib.util.find_spec(module) is None:
+                            install_module(module, logfile)
+                        else:
+                            logfile.write(f"Already Installed:\t{module}\n")
 
                     # loop over required modules
                     for module in required_modules:
@@ -14,7 +14,6 @@
 import os
 import re
 import sys
-import json
 import method_tools
 
 BS_CLI = "bs"
@@ -24,7 +23,7 @@ BS_CLI = "bs"
 def user_region_info(tss_config, logfile):
     """Get user region from TSS config"""
 
-    logfile.write("Extracting region information from the TSS config file\n")
+    logfile.info("Extracting region information from the TSS config file")
     print("Extracting region information from the TSS config file")
 
     # london
@@ -56,8 +55,7 @@ def user_region_info(tss_config, logfile):
             api_url = "https://api.basespace.illumina.com"
             bssh_url = f"https://{tss_config['domain']}.basespace.illumina.com"
 
-    logfile.write(f"BSSH UI URL:\t{bssh_url}\n")
-    logfile.write(f"BSSH API URL:\t{api_url}\n")
+    logfile.info("BSSH region", ui_url=bssh_url, api_url=api_url)
 
     return bssh_url, api_url
 
@@ -66,7 +64,7 @@ def user_region_info(tss_config, logfile):
 def read_sample_sheet(sample_sheet, logfile):
     """Read sample sheet"""
 
-    logfile.write(f"\nReading from the sample sheet, {sample_sheet}\n")
+    logfile.info("Reading from the sample sheet", sample_sheet=sample_sheet)
     print(f"\nReading from the sample sheet, {sample_sheet}")
 
     # read sample sheet and create dict
@@ -93,7 +91,7 @@ def read_sample_sheet(sample_sheet, logfile):
 # convert sample sheet to biosample manifest
 def extract_biosamples(sample_sheet_dict, logfile):
     """Extract biosamples from the sample sheet"""
-    logfile.write("\nExtracting BioSamples from the [Cloud_Data] section\n")
+    logfile.info("Extracting BioSamples from the [Cloud_Data] section")
     print("\nExtracting BioSamples from the [Cloud_Data] section")
 
     biosamples = None
@@ -102,8 +100,8 @@ def extract_biosamples(sample_sheet_dict, logfile):
         header = sample_sheet_dict["Header"]
         cloud_data = sample_sheet_dict["Cloud_Data"]
     except TypeError:
-        logfile.write(
-            "[ERROR] unable to locate the '[Header]' and/or [Cloud_Data] section(s) in the v2 sample sheet\n"
+        logfile.error(
+            "Unable to locate the '[Header]' and/or [Cloud_Data] section(s) in the v2 sample sheet"
         )
         print(
             "[ERROR] unable to locate the '[Header]' and/or [Cloud_Data] section(s) in the v2 sample sheet"
@@ -121,19 +119,17 @@ def extract_biosamples(sample_sheet_dict, logfile):
                 pass
 
         # sample sheet version
-        logfile.write(f"Sample Sheet Version:\t{version}\n")
+        logfile.info("Sample sheet version", version=version)
         print(f"Sample Sheet Version:\t{version}")
         if version == 1:
-            logfile.write(
-                "[ERROR] a v1 sample sheet was detected. V1 sample sheets are not supported.\n"
-            )
+            logfile.error("A v1 sample sheet was detected. V1 sample sheets are not supported.")
             print(
                 "[ERROR] a v1 sample sheet was detected. v1 sample sheets are not supported."
             )
             sys.exit()
         if version == "unknown":
-            logfile.write(
-                "[WARNING] the sample sheet version is unknown. Assuming v2 due to the presence of [Cloud_Data]\n"
+            logfile.warning(
+                "The sample sheet version is unknown. Assuming v2 due to the presence of [Cloud_Data]"
             )
             print(
                 "[WARNING] the sample sheet version is unknown. Assuming v2 due to the presence of [Cloud_Data]"
@@ -146,7 +142,7 @@ def extract_biosamples(sample_sheet_dict, logfile):
             if details[0] != "Sample_ID":
                 biosamples.append(details[0])
 
-    logfile.write(f"Identified {len(biosamples)} BioSamples:\n{biosamples}\n")
+    logfile.payload(f"Identified {len(biosamples)} BioSamples", biosamples)
     print(f"Identified {len(biosamples)} BioSamples:\n{biosamples}")
 
     return biosamples
@@ -158,7 +154,7 @@ def communicate_cli_output(output, logfile, print_too=False):
 
     for line in output:
         text = line.decode()
-        logfile.write(f"{text}\n")
+        logfile.info(text)
         if print_too:
             print(text)
 
@@ -184,7 +180,7 @@ def bssh_authorization(tss_config, bssh_config_name, logfile):
     # authorize bssh cli
     input("")
 
-    logfile.write("\nInitiating BSSH authorization\n")
+    logfile.info("Initiating BSSH authorization")
     print("\nInitiating BSSH authorization")
 
     command = (
@@ -192,7 +188,7 @@ def bssh_authorization(tss_config, bssh_config_name, logfile):
         "--scopes='CREATE GLOBAL,BROWSE GLOBAL,READ GLOBAL,WRITE GLOBAL,CREATE RUNS,CREATE PROJECTS,"
         "START APPLICATIONS'"
     )
-    logfile.write(f"Command:\t{command}\n")
+    logfile.info("Command", command=command)
     method_tools.run_shell_with_screen(command)
 
 
@@ -200,11 +196,11 @@ def bssh_authorization(tss_config, bssh_config_name, logfile):
 def bssh_whoami(bssh_config_name, logfile):
     """Run WHOAMI with BSSH CLI"""
 
-    logfile.write("\nInitiating BSSH Who Am I?\n")
+    logfile.info("Initiating BSSH Who Am I?")
     print("\nInitiating BSSH Who Am I?")
 
     command = f"{BS_CLI} whoami --config={bssh_config_name} -f json"
-    logfile.write(f"Command:\t{command}\n")
+    logfile.info("Command", command=command)
     stdout, stderr = method_tools.run_shell_with_pipe(command)
 
     # check for errors
@@ -217,20 +213,20 @@ def bssh_whoami(bssh_config_name, logfile):
     for line in stdout:
         text = line.decode()
         whoami.append(text)
-    json_text = json.loads(str(" ".join(whoami)).strip("[]"))
+    json_text = method_tools.json_loads(str(" ".join(whoami)).strip("[]"))
     workgroup = json_text["Name"]
 
     # logging
-    logfile.write(json.dumps(json_text) + "\n")
+    logfile.payload("bs whoami", json_text)
     is_workgroup = json_text["IsWorkgroup"]
     if is_workgroup is False:
-        logfile.write(
-            "[WARNING] The BSSH config is pointed to a personal workspace and not a workgroup.\n"
+        logfile.warning(
+            "The BSSH config is pointed to a personal workspace and not a workgroup.",
+            personal_space=workgroup,
         )
         print(
             "[WARNING] The BSSH config is pointed to a personal workspace and not a workgroup."
         )
-        logfile.write(f"Personal Space:\t{workgroup}\n")
         print(f"Personal Space:\t{workgroup}")
     else:
         print(f"Workgroup:\t{workgroup}")
@@ -240,7 +236,7 @@ def bssh_whoami(bssh_config_name, logfile):
 def create_manifest(biosamples, bssh_project, required_yield, directory, logfile):
     """Create the biosample manifest file"""
 
-    logfile.write("\nCreating the BioSample manifest\n")
+    logfile.info("Creating the BioSample manifest")
     print("\nCreating the BioSample manifest")
 
     with open(directory + "biosample_manifest.csv", "w", encoding="utf-8") as manifest:
@@ -254,7 +250,7 @@ def create_manifest(biosamples, bssh_project, required_yield, directory, logfile
                 f"{sample},{bssh_project},,,Unknown,{required_yield},TSS Connect v1.1,,,\n"
             )
 
-        logfile.write(f"BioSample Manifest Path:\t{os.path.abspath(manifest.name)}\n")
+        logfile.info("BioSample manifest", path=os.path.abspath(manifest.name))
         print(f"BioSample Manifest Path:\t{os.path.abspath(manifest.name)}")
         return manifest.name
 
@@ -262,11 +258,11 @@ def create_manifest(biosamples, bssh_project, required_yield, directory, logfile
 # upload bs manifest
 def post_biosample_manifest(manifest, bssh_config_name, logfile):
     """Post the biosample manifest to BSSH using the BSSH CLI"""
-    logfile.write("\nPosting the BioSample manifest\n")
+    logfile.info("Posting the BioSample manifest")
     print("\nPosting the BioSample manifest")
 
     command = f"{BS_CLI} manifest accession {manifest} --config={bssh_config_name}"
-    logfile.write(f"Command:\t{command}\n")
+    logfile.info("Command", command=command)
     stdout, stderr = method_tools.run_shell_with_pipe(command)
 
     # check for errors
@@ -281,11 +277,11 @@ def post_biosample_manifest(manifest, bssh_config_name, logfile):
 def lookup_biosamples(biosample_name, bssh_config_name, logfile):
     """Look up a biosample in BSSH using the BSSH CLI"""
 
-    logfile.write(f"\nLooking up BioSample, {biosample_name}\n")
+    logfile.info("Looking up BioSample", biosample_name=biosample_name)
     print(f"\nLooking up BioSample, {biosample_name}")
 
     command = f"{BS_CLI} biosample get --config={bssh_config_name} --name={biosample_name} -f json"
-    logfile.write(f"Command:\t{command}\n")
+    logfile.info("Command", command=command)
     stdout, stderr = method_tools.run_shell_with_pipe(command)
 
     # check for errors
@@ -298,8 +294,8 @@ def lookup_biosamples(biosample_name, bssh_config_name, logfile):
         for line in stdout:
             text = line.decode()
             lookup.append(text)
-        json_text = json.loads(str(" ".join(lookup)).strip("[]"))
-        logfile.write(json.dumps(json_text) + "\n")
+        json_text = method_tools.json_loads(str(" ".join(lookup)).strip("[]"))
+        logfile.payload("bs biosample get", json_text)
 
 
 # create biosample
@@ -319,17 +315,13 @@ def create_biosample(biosample_args):
     # update existing biosample
     if biosample_args["overwrite"]:
         command = command + " --allow-existing"
-        biosample_args["logfile"].write(
-            f"\nUpdating BioSample, {biosample_args['biosample_name']}\n"
-        )
+        biosample_args["logfile"].info("Updating BioSample", biosample_name=biosample_args["biosample_name"])
         print(f"\nUpdating BioSample, {biosample_args['biosample_name']}")
     else:
-        biosample_args["logfile"].write(
-            f"\nCreating BioSample, {biosample_args['biosample_name']}\n"
-        )
+        biosample_args["logfile"].info("Creating BioSample", biosample_name=biosample_args["biosample_name"])
         print(f"\nCreating BioSample, {biosample_args['biosample_name']}")
 
-    biosample_args["logfile"].write(f"Command:\t{command}\n")
+    biosample_args["logfile"].info("Command", command=command)
     stdout, stderr = method_tools.run_shell_with_pipe(command)
 
     # check for errors
@@ -337,24 +329,22 @@ def create_biosample(biosample_args):
         communicate_cli_output(stderr, biosample_args["logfile"], True)
     else:
         # convert stdout to json
-        biosample_args["logfile"].write("Success!\n")
         biosample_info = []
         for line in stdout:
             text = line.decode()
             biosample_info.append(text)
-        json_text = json.loads(str(" ".join(biosample_info)).strip("[]"))
-        biosample_args["logfile"].write(json.dumps(json_text) + "\n")
+        json_text = method_tools.json_loads(str(" ".join(biosample_info)).strip("[]"))
+        biosample_args["logfile"].payload("bs biosample create", json_text)
 
         # parse info from json
         biosample_name = json_text["BioSamples"][0]["BioSample"]["BioSampleName"]
-        biosample_args["logfile"].write(f"BioSample Name:\t{biosample_name}\n")
         statuses = json_text["BioSamples"][0]["Statuses"]
         for status in statuses:
             print(f"{status['Type']}: {status['StatusMessage']}")
-            biosample_args["logfile"].write(
-                f"{status['Type']}: {status['StatusMessage']}\n"
+            biosample_args["logfile"].info(
+                "BioSample status", type=status["Type"], message=status["StatusMessage"]
             )
-        biosample_args["logfile"].write(f"BioSample {biosample_name} is ready!\n")
+        biosample_args["logfile"].info("BioSample is ready", biosample_name=biosample_name)
         print(f"BioSample {biosample_name} is ready!")
 
 
@@ -366,8 +356,8 @@ def main(bssh_args):
     directory = method_tools.format_path(bssh_args["output_dir"])
 
     # logging
-    with open(directory + "create_biosamples.log", "w", encoding="utf-8") as logfile:
-        logfile.write(f"Output Directory:\t{directory}\n")
+    with method_tools.JsonLog(directory + "create_biosamples.log") as logfile:
+        logfile.info("Starting", output_directory=directory)
 
         # authorization needed
         if bssh_args["bssh_config_name"] is None:
@@ -376,34 +366,41 @@ def main(bssh_args):
             bssh_args["bssh_config_name"] = tss_config_file["domain"] + "_tss_samples"
 
             # authorize bssh cli
-            bssh_authorization(tss_config_file, bssh_args["bssh_config_name"], logfile)
+            with method_tools.TRACER.span("bssh_authorization"):
+                bssh_authorization(tss_config_file, bssh_args["bssh_config_name"], logfile)
 
         # bssh whoami
-        bssh_whoami(bssh_args["bssh_config_name"], logfile)
+        with method_tools.TRACER.span("bssh_whoami"):
+            bssh_whoami(bssh_args["bssh_config_name"], logfile)
 
         # parse sample sheet and extract samples
-        sample_sheet_dict = read_sample_sheet(bssh_args["sample_sheet"], logfile)
-        biosamples = extract_biosamples(sample_sheet_dict, logfile)
+        with method_tools.TRACER.span("read_sample_sheet", sample_sheet=str(bssh_args["sample_sheet"])) as span:
+            sample_sheet_dict = read_sample_sheet(bssh_args["sample_sheet"], logfile)
+            biosamples = extract_biosamples(sample_sheet_dict, logfile)
+            span["biosamples"] = len(biosamples or [])
 
         # create biosample manifest
         if bssh_args["biosample_workflow"] == "biosample_manifest":
             # create biosample manifest
-            manifest = create_manifest(
-                biosamples,
-                bssh_args["bssh_project"],
-                bssh_args["required_yield"],
-                directory,
-                logfile,
-            )
+            with method_tools.TRACER.span("create_manifest", biosamples=len(biosamples)):
+                manifest = create_manifest(
+                    biosamples,
+                    bssh_args["bssh_project"],
+                    bssh_args["required_yield"],
+                    directory,
+                    logfile,
+                )
 
             # post manifest to BSSH workgroup
-            post_biosample_manifest(
-                os.path.abspath(manifest), bssh_args["bssh_config_name"], logfile
-            )
+            with method_tools.TRACER.span("post_biosample_manifest"):
+                post_biosample_manifest(
+                    os.path.abspath(manifest), bssh_args["bssh_config_name"], logfile
+                )
 
             # lookup biosamples
             for entry in biosamples:
-                lookup_biosamples(entry, bssh_args["bssh_config_name"], logfile)
+                with method_tools.TRACER.span("lookup_biosample", biosample=entry):
+                    lookup_biosamples(entry, bssh_args["bssh_config_name"], logfile)
 
         # create or update biosamples
         else:
@@ -419,7 +416,8 @@ def main(bssh_args):
                         "logfile": logfile,
                         "overwrite": False,
                     }
-                    create_biosample(create_args)
+                    with method_tools.TRACER.span("create_biosample", biosample=entry):
+                        create_biosample(create_args)
 
                 # update existing biosample
                 else:
@@ -431,4 +429,5 @@ def main(bssh_args):
                         "logfile": logfile,
                         "overwrite": True,
                     }
-                    create_biosample(create_args)
+                    with method_tools.TRACER.span("update_biosample", biosample=entry):
+                        create_biosample(create_args)
@@ -11,9 +11,10 @@
 
 import os
 import sys
+import csv
 import argparse
-import pandas as pd
 import method_tools
+import profile_tools
 import case_mgt_v2
 
 HOME = os.environ["HOME"]
@@ -48,10 +49,15 @@ def get_args():
     parser.add_argument(
         "-c",
         "--config_file",
-        help="Provide a TSS CLI config file. Default ~/.illumina/uploader-config.json",
+        help="Provide a TSS CLI config file, or a comma separated list of config files/ "
+        "profile names. With several profiles the input file needs a second column naming "
+        "each case's profile (e.g. filter_case_list output). "
+        "Default ~/.illumina/uploader-config.json",
         type=str,
         default=f"{HOME}/.illumina/uploader-config.json",
     )
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
     args = parser.parse_args()
     return args
 
@@ -60,12 +66,14 @@ def get_args():
 if __name__ == "__main__":
     # get args
     arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
 
     # check and format the output dir
     directory = method_tools.format_path(arguments.output_dir)
 
-    # get the config file and create request header
-    config = method_tools.parse_config(arguments.config_file)
+    # get the config file(s)
+    profiles = method_tools.load_profiles(arguments.config_file)
 
     # logging
     print(f"Current Working Directory:\t{os.getcwd()}")
@@ -77,8 +85,7 @@ if __name__ == "__main__":
         # logging
         print("Running Single Case Mode:\n")
 
-        # create data frame
-        df = pd.DataFrame(data={"sampleId": [arguments.case_guid]})
+        rows = [[arguments.case_guid]]
 
     # batch Mode
     elif arguments.input_file and not arguments.case_guid:
@@ -86,8 +93,10 @@ if __name__ == "__main__":
         print("Running Batch Case Mode:")
         print(f"Input File:\t{os.path.abspath(arguments.input_file)}")
 
-        # create data frame
-        df = pd.read_csv(arguments.input_file)
+        # read the case GUIDs (and profiles), skipping the header
+        method_tools.check_path(arguments.input_file)
+        with open(arguments.input_file, "r", encoding="utf-8", newline="") as file:
+            rows = list(csv.reader(file))[1:]
 
     # exit when args are conflicting
     else:
@@ -97,9 +106,18 @@ if __name__ == "__main__":
         print("(2) -i/ --input")
         sys.exit()
 
-    # loop over input
-    for index, row in df.iterrows():
-        # case GUID
-        case_id = row[0]
-        print(f"Deleting Case GUID:\t{case_id}")
-        case_mgt_v2.delete_case(case_id, config)
+    # group cases by profile
+    cases_by_profile = {name: [] for name in profiles}
+    for profile_config, case_id in method_tools.assign_profiles(rows, profiles):
+        cases_by_profile[profile_config["profile"]].append(case_id)
+
+    # delete concurrently within and across profiles
+    def delete_profile_cases(config):
+        """Delete one workgroup's cases"""
+        def delete(case_id):
+            print(f"Deleting Case GUID:\t{case_id}")
+            case_mgt_v2.delete_case(case_id, config)
+
+        method_tools.run_concurrently(delete, cases_by_profile[config["profile"]])
+
+    method_tools.run_per_profile(delete_profile_cases, profiles)
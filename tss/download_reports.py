@@ -15,10 +15,9 @@
 import os
 import sys
 import argparse
-import json
-import requests
-from requests.exceptions import HTTPError
 import method_tools
+import profile_tools
+import case_model
 
 
 # get args
@@ -41,19 +40,22 @@ def get_args():
         type=str,
         required=True
     )
+    method_tools.add_logging_args(parser)
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
     args = parser.parse_args()
     return args
 
 
 # try API call (general)
-def call_api(url, header):
+def call_api(url, config):
     """Call DRS"""
 
     response = None
     try:
-        response = requests.get(url, headers=header, timeout=30)
+        response = method_tools.api_request("GET", url, config)
         response.raise_for_status()
-    except HTTPError as http_err:
+    except method_tools.HTTPError as http_err:
         print(f"[Error] HTTP error occurred: {http_err}")
     else:
         pass
@@ -64,43 +66,40 @@ def call_api(url, header):
 def get_case(config_file, case_id, logfile):
     """Get the case"""
 
-    # get request header from config_file fields
+    # config fields
     config = method_tools.parse_config(config_file)
-    header = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
-
-    logfile.write(f"\n\nget_case server response for case {case_id}:\n")
 
     # get case URL
     get_case_url = (
-        f"https://{config['domain']}.{config['url']}/crs/api/v1/cases/{case_id}?directIdentifiers=false"
+        f"{method_tools.get_base_url(config)}/crs/api/v1/cases/{case_id}?directIdentifiers=false"
     )
-    response = call_api(get_case_url, header)
+    response = call_api(get_case_url, config)
     if response:
-        logfile.write(response.text)
-    return response.json()
+        case_json = method_tools.response_json(response)
+        logfile.payload("get_case server response", case_json, case_id=case_id)
+        return case_json
+
+    logfile.error("get_case failed", case_id=case_id, response=getattr(response, "text", None))
+    return None
 
 
 # get pdf report API call
 def get_pdf_report(config_file, case_id, subject_report_id, logfile):
     """Create a PDF report"""
 
-    # get request header from config_file fields
+    # config fields
     config = method_tools.parse_config(config_file)
-    header = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
-    logfile.write(
-        f"\n\nget_pdf_report server response for case {case_id}, report ID {subject_report_id}:\n"
-    )
-
     # get reports URL
-    get_report_url = (f"https://{config['domain']}.{config['url']}/drs/v1/draftreport/case/"
+    get_report_url = (f"{method_tools.get_base_url(config)}/drs/v1/draftreport/case/"
                       f"{case_id}/reports/{subject_report_id}/pdf")
-    response = call_api(get_report_url, header)
-    if response:
-        logfile.write(str(response))
+    response = call_api(get_report_url, config)
+    logfile.info(
+        "get_pdf_report server response",
+        case_id=case_id,
+        report_id=subject_report_id,
+        status_code=getattr(response, "status_code", None),
+        bytes=len(response.content) if response else 0,
+    )
 
     return response
 
@@ -109,142 +108,163 @@ def get_pdf_report(config_file, case_id, subject_report_id, logfile):
 def get_json_report(config_file, case_id, logfile):
     """Get the JSON report"""
 
-    # get request header from config_file fields
+    # config fields
     config = method_tools.parse_config(config_file)
-    header = method_tools.get_headers_apikey(
-        config["apikey"], config["domain"], config["wg"]
-    )
-    logfile.write(f"\n\nget_json_report server response for case {case_id}:\n")
-
     # get reports URL
     get_report_url = (
-        f"https://{config['domain']}.{config['url']}:443/drs/v1/draftreport/case/{case_id}/json"
+        f"{method_tools.get_base_url(config)}/drs/v1/draftreport/case/{case_id}/json"
     )
-    response = call_api(get_report_url, header)
+    response = call_api(get_report_url, config)
     if response:
-        logfile.write(response.text)
-        return response.json()
+        json_report = method_tools.response_json(response)
+        logfile.payload("get_json_report server response", json_report, case_id=case_id)
+        return json_report
 
+    logfile.error("get_json_report failed", case_id=case_id, response=getattr(response, "text", None))
     return None
 
 
+# download the proband's latest PDF and JSON reports
+def download_case_reports(config_file, case_id, directory, log):
+    """Write the reports of a processed case to directory; returns the written paths"""
+
+    written = []
+
+    # get case info
+    case_payload = get_case(config_file, case_id, log)
+    if case_payload is None:
+        error = f"[ERROR] Case {case_id} does not exist; see log file for details."
+        log.error(error)
+        sys.exit()
+
+    # keep only the fields used below
+    case_record = case_model.CaseRecord.from_json(case_payload)
+    del case_payload
+    case_subjects = case_record.subjects
+    display_id = case_record.display_id
+    case_status = case_record.status
+    case_substate = case_record.sub_state
+    activation_state = case_record.activation_state
+
+    # logging
+    log.info(
+        "Case",
+        case_id=case_id,
+        display_id=display_id,
+        status=f"{case_status} - {case_substate}",
+        activation_state=activation_state,
+    )
+
+    # check if case has been successfully processed
+    if activation_state is None or activation_state == "INACTIVE":
+        error = (
+            f"[ERROR] Reports cannot be downloaded for an unprocessed, processing, or inactive case ; "
+            f"please check case ID {case_id}"
+        )
+        log.error(error, case_id=case_id)
+        sys.exit()
+
+    # loop over case subjects
+    for subject in case_subjects:
+        # find the proband; script only supports pushing variants to report for proband
+        if subject.relationship == "PROBAND":
+            report_types = subject.report_type_ids
+            relationship = subject.relationship
+
+            # the active sample
+            active_id = subject.external_sample_id or ""
+
+            # logging
+            log.info("Case subject", relationship=relationship, active_sample=active_id)
+
+            # check if report(s) exist
+            if report_types:
+
+                # loop over reports
+                for individual_report_id in report_types:
+
+                    # download the latest PDF report
+                    log.info(
+                        "Downloading PDF report(s)",
+                        relationship=relationship,
+                        report_id=individual_report_id,
+                    )
+                    pdf_content = get_pdf_report(
+                        config_file, case_id, individual_report_id, log)
+                    if pdf_content:
+
+                        # set report name
+                        pdf_name = (
+                            f"{display_id}_{relationship}_"
+                            f"{active_id}_{individual_report_id}_latest.pdf"
+                        )
+                        with open(directory + pdf_name, "wb") as pdf_report:
+
+                            # write content to report
+                            pdf_report.write(pdf_content.content)
+                            log.info("PDF report", path=os.path.abspath(pdf_report.name))
+                            written.append(os.path.abspath(pdf_report.name))
+                    else:
+                        error = (
+                            f"[ERROR] Could not download PDF reports for the {relationship}; see log "
+                            "file for details."
+                        )
+                        log.error(error)
+
+                    # download the latest JSON report
+                    log.info(
+                        "Downloading JSON report(s)",
+                        relationship=relationship,
+                        report_id=individual_report_id,
+                    )
+                    json_response = get_json_report(config_file, case_id, log)
+
+                    if json_response:
+                        json_content = json_response["response"]
+
+                        # set report name
+                        with open(directory + f"{display_id}_latest.json", "w", encoding="UTF-8") as json_report:
+                            method_tools.json_dump(json_content, json_report, indent=True)
+                            log.info("JSON report", path=os.path.abspath(json_report.name))
+                            written.append(os.path.abspath(json_report.name))
+                    else:
+                        error = (
+                            f"[ERROR] Could not download json reports for the {relationship}; "
+                            f"see log file for details."
+                        )
+                        log.error(error)
+            else:
+                error = (
+                    f"[ERROR] Report(s) do not exist for the {relationship}; "
+                    "see log file for details."
+                )
+                log.error(error)
+    return written
+
+
 # main runs automatically
 if __name__ == "__main__":
 
     arguments = get_args()
+    profile_tools.set_profiling(arguments)
+
+    method_tools.set_metrics(arguments)
+    method_tools.set_logging(arguments)
 
     # check and format the output dir
     directory = method_tools.format_path(arguments.output_dir)
 
     # create output CSV: sampleID, JSON file path
     # create logfile in which to record API call responses
-    with open(directory + "download_reports.log", "w", encoding="UTF-8") as log:
-
-        # logging
-        log.write(f"Current Working Directory:\t{os.getcwd()}")
-        log.write(f"\nOutput Directory:\t{os.path.abspath(directory)}")
-        log.write(f"\nConfig File:\t{os.path.abspath(arguments.config_file)}")
-
-        # get case info
-        case_payload = get_case(arguments.config_file, arguments.case_id, log)
-        if case_payload is None:
-            error = f"[ERROR] Case {arguments.case_id} does not exist; see log file for details."
-            log.write(error)
-            sys.exit()
-
-        case_subjects = case_payload["caseSubjects"]
-        display_id = case_payload["displayId"]
-        case_status = case_payload["status"]
-        case_substate = case_payload["subState"]
-        activation_state = case_payload["activationState"]
+    with method_tools.JsonLog(directory + "download_reports.log") as log:
 
         # logging
-        log.write(f"Case ID:\t{arguments.case_id}")
-        log.write(f"Case Display ID:\t{display_id}")
-        log.write(f"Case Status:\t{case_status} - {case_substate}")
-        log.write(f"Case Activation Status:\t{activation_state}")
-
-        # check if case has been successfully processed
-        if activation_state is None or activation_state == "INACTIVE":
-            error = (
-                f"[ERROR] Reports cannot be downloaded for an unprocessed, processing, or inactive case ; "
-                f"please check case ID {arguments.case_id}"
-            )
-            log.write(f"{arguments.case_id},,{error}\n")
-            sys.exit()
-
-        # loop over case subjects
-        for subject in case_subjects:
-            # find the proband; script only supports pushing variants to report for proband
-            if subject["relationshipToProband"] == "PROBAND":
-                report_types = subject["reportTypes"]
-                relationship = subject["relationshipToProband"]
-                samples = subject["samples"]
-
-                # find the active sample
-                ACTIVE_ID = ""
-                for sample in samples:
-                    if sample["status"] == "ACTIVE":
-                        ACTIVE_ID = sample["externalSampleId"]
-
-                # logging
-                log.write(f"Case Subject:\t{relationship}")
-                log.write(f"Active Sample:\t{ACTIVE_ID}")
-
-                # check if report(s) exist
-                if report_types:
-
-                    # loop over reports
-                    for individual_report_id in report_types:
-                        individual_report_id = individual_report_id["id"]
-
-                        # download the latest PDF report
-                        log.write(
-                            f"Downloading PDF report(s):\t{relationship, individual_report_id}"
-                        )
-                        pdf_content = get_pdf_report(
-                            arguments.config_file, arguments.case_id, individual_report_id, log)
-                        if pdf_content:
-
-                            # set report name
-                            pdf_name = (
-                                f"{display_id}_{relationship}_"
-                                f"{ACTIVE_ID}_{individual_report_id}_latest.pdf"
-                            )
-                            with open(directory + pdf_name, "wb", encoding="UTF-8") as pdf_report:
-
-                                # write content to report
-                                pdf_report.write(pdf_content.content)
-                                log.write(f"PDF Path:\t{os.path.abspath(pdf_report.name)}")
-                        else:
-                            error = (
-                                f"[ERROR] Could not download PDF reports for the {relationship}; see log "
-                                "file for details."
-                            )
-                            log.write(error)
-
-                        # download the latest JSON report
-                        log.write(
-                            f"Downloading JSON report(s):\t{relationship, individual_report_id}"
-                        )
-                        json_response = get_json_report(arguments.config_file, arguments.case_id, log)
-
-                        if json_response:
-                            json_content = json_response["response"]
-
-                            # set report name
-                            with open(directory + f"{display_id}_latest.json", "w", encoding="UTF-8") as json_report:
-                                json.dump(json_content, json_report, indent=2)
-                                log.write(f"JSON Path:\t{os.path.abspath(json_report.name)}")
-                        else:
-                            error = (
-                                f"[ERROR] Could not download json reports for the {relationship}; "
-                                f"see log file for details."
-                            )
-                            log.write(error)
-                else:
-                    error = (
-                        f"[ERROR] Report(s) do not exist for the {relationship}; "
-                        "see log file for details."
-                    )
-                    log.write(error)
+        log.info(
+            "Starting",
+            working_directory=os.getcwd(),
+            output_directory=os.path.abspath(directory),
+            config_file=os.path.abspath(arguments.config_file),
+        )
+
+        # download the proband's reports
+        download_case_reports(arguments.config_file, arguments.case_id, directory, log)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""Export every case in a workgroup to compressed JSONL and Parquet"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Export the full get_case JSON for every case in the workgroup
+# 1. Inputs: config, output dir, [optional] search criteria
+# 2. Outputs: cases-<page>.jsonl.zst (one case per line), [optional] subjects-<page>.parquet
+#    (one row per case subject sample), export_checkpoint.json
+# Notes: one search page is held in memory at a time; completed pages are checkpointed
+#        so an interrupted export resumes with the next page (-r/--resume). Pages are sorted
+#        by creation date (then id) so page numbers stay stable across runs; a resume first
+#        retries the cases that failed before (cases-retry-<n>.jsonl.zst)
+# Requires: zstandard (zstd compression), pyarrow (Parquet)
+##################################################################
+
+import os
+import sys
+import gzip
+import argparse
+import method_tools
+import profile_tools
+import search
+import case_mgt_v2
+
+HOME = os.environ["HOME"]
+CHECKPOINT_FILE = "export_checkpoint.json"
+# a stable order: new cases land on the last pages instead of shifting the checkpointed ones
+EXPORT_SORT = ["createdDate,asc", "id,asc"]
+SUBJECT_COLUMNS = [
+    "case_id",
+    "display_id",
+    "status",
+    "sub_state",
+    "test_definition_id",
+    "created_date",
+    "subject_id",
+    "relationship_to_proband",
+    "gender",
+    "is_affected",
+    "sample_id",
+    "external_sample_id",
+    "sample_status",
+]
+
+
+# get args
+def get_args():
+    """Get input arguments"""
+    parser = argparse.ArgumentParser(description="Export all cases in a TSS workgroup")
+    parser.add_argument(
+        "-c",
+        "--config_file",
+        help="Provide a TSS CLI config file, or a comma separated list of config files/ profile "
+        "names exported concurrently into one sub-directory per profile. "
+        "Default ~/.illumina/uploader-config.json",
+        type=str,
+        default=f"{HOME}/.illumina/uploader-config.json",
+    )
+    parser.add_argument(
+        "-o", "--output_dir", help="Path for the export files", type=str, required=True
+    )
+    parser.add_argument(
+        "--compression",
+        choices=["zstd", "gzip", "none"],
+        help="JSONL compression (default: zstd)",
+        default="zstd",
+    )
+    parser.add_argument(
+        "--parquet",
+        help="Also write a flattened Parquet table of case subjects and samples",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-r",
+        "--resume",
+        help="Resume from export_checkpoint.json in the output directory",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-s",
+        "--status",
+        help="Only export cases with a status (e.g. Complete)",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--page_size",
+        help=f"Cases per search page/ export part (default: {search.SEARCH_PAGE_SIZE})",
+        type=int,
+        default=search.SEARCH_PAGE_SIZE,
+    )
+    parser.add_argument(
+        "-w",
+        "--max_workers",
+        help=f"Number of concurrent get_case requests (default: {method_tools.MAX_WORKERS})",
+        type=int,
+        default=method_tools.MAX_WORKERS,
+    )
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+# open a compressed JSONL part
+def open_jsonl(path, compression):
+    """Open a text stream for writing with the requested compression"""
+
+    if compression == "zstd":
+        try:
+            import zstandard  # pylint: disable=import-outside-toplevel
+        except ModuleNotFoundError:
+            print("[ERROR] zstd compression requires zstandard (pip install zstandard)")
+            sys.exit()
+        return zstandard.open(path, "wt", encoding="utf-8")
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+# flatten a case to subject/ sample rows
+def flatten_case(case_json):
+    """One row per case subject sample"""
+
+    rows = []
+    base = {
+        "case_id": case_json.get("id"),
+        "display_id": case_json.get("displayId"),
+        "status": case_json.get("status"),
+        "sub_state": case_json.get("subState"),
+        "test_definition_id": (case_json.get("testDefinition") or {}).get("id"),
+        "created_date": case_json.get("createdDate"),
+    }
+    for subject in case_json.get("caseSubjects") or []:
+        subject_row = {
+            **base,
+            "subject_id": subject.get("id"),
+            "relationship_to_proband": subject.get("relationshipToProband"),
+            "gender": subject.get("gender"),
+            "is_affected": None
+            if subject.get("isAffected") is None
+            else str(subject.get("isAffected")),
+        }
+        samples = subject.get("samples") or [subject.get("activeSample") or {}]
+        for sample in samples:
+            rows.append(
+                {
+                    **subject_row,
+                    "sample_id": sample.get("id"),
+                    "external_sample_id": sample.get("externalSampleId"),
+                    "sample_status": sample.get("status"),
+                }
+            )
+    return rows
+
+
+# write the flattened rows of one page
+def write_parquet(rows, path):
+    """Write subject/ sample rows to a Parquet file"""
+
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+    except ModuleNotFoundError:
+        print("[ERROR] --parquet requires pyarrow (pip install pyarrow)")
+        sys.exit()
+
+    schema = pyarrow.schema([(column, pyarrow.string()) for column in SUBJECT_COLUMNS])
+    table = pyarrow.Table.from_pylist(
+        [{column: row.get(column) for column in SUBJECT_COLUMNS} for row in rows],
+        schema=schema,
+    )
+    pyarrow.parquet.write_table(table, path)
+
+
+# checkpoint helpers
+def read_checkpoint(directory, params, page_size):
+    """Return the saved checkpoint, or a new one when none exists"""
+
+    path = directory + CHECKPOINT_FILE
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as checkpoint_file:
+            checkpoint = method_tools.json_load(checkpoint_file)
+        if checkpoint["params"] != params or checkpoint["page_size"] != page_size:
+            print("[ERROR] The checkpoint was written with different search options; cannot resume")
+            sys.exit()
+        return checkpoint
+    return new_checkpoint(params, page_size)
+
+
+def new_checkpoint(params, page_size):
+    """Checkpoint for a fresh export"""
+
+    return {
+        "params": params,
+        "page_size": page_size,
+        "next_page": 0,
+        "cases": 0,
+        "failed": [],
+        "parts": [],
+    }
+
+
+def write_checkpoint(directory, checkpoint):
+    """Atomically save the checkpoint"""
+
+    path = directory + CHECKPOINT_FILE
+    with open(path + ".tmp", "w", encoding="utf-8") as output:
+        method_tools.json_dump(checkpoint, output, indent=True)
+    os.replace(path + ".tmp", path)
+
+
+# export one search page
+def export_page(part, case_ids, directory, config_dict, options):
+    """GET the part's cases concurrently and write its JSONL (and Parquet) file"""
+
+    extension = {"zstd": ".zst", "gzip": ".gz", "none": ""}[options["compression"]]
+    jsonl_path = f"{directory}cases-{part}.jsonl{extension}"
+    parquet_path = f"{directory}subjects-{part}.parquet"
+
+    case_details = case_mgt_v2.get_cases(case_ids, config_dict, options["max_workers"])
+
+    exported = 0
+    failed = []
+    rows = []
+    with open_jsonl(jsonl_path + ".tmp", options["compression"]) as output:
+        for case_id, case_json in case_details.items():
+            if case_json is None:
+                failed.append(case_id)
+                continue
+            output.write(method_tools.json_dumps(case_json) + "\n")
+            exported += 1
+            if options["parquet"]:
+                rows.extend(flatten_case(case_json))
+    os.replace(jsonl_path + ".tmp", jsonl_path)
+
+    parts = [os.path.basename(jsonl_path)]
+    if options["parquet"]:
+        write_parquet(rows, parquet_path + ".tmp")
+        os.replace(parquet_path + ".tmp", parquet_path)
+        parts.append(os.path.basename(parquet_path))
+    return exported, failed, parts
+
+
+# export every page
+def export_cases(config_dict, directory, options):
+    """Page through the workgroup and export each page, checkpointing as it goes"""
+
+    params = {"status": options["status"]} if options["status"] else {}
+    params["sort"] = EXPORT_SORT
+    profile = f"{config_dict['profile']} " if config_dict.get("profile") else ""
+    if options["resume"]:
+        checkpoint = read_checkpoint(directory, params, options["page_size"])
+        print(f"Resuming at page {checkpoint['next_page']} ({checkpoint['cases']} cases exported)")
+
+        # retry the cases that failed before
+        if checkpoint["failed"]:
+            retry = sum(part.startswith("cases-retry-") for part in checkpoint["parts"]) + 1
+            exported, failed, parts = export_page(
+                f"retry-{retry:03d}", checkpoint["failed"], directory, config_dict, options
+            )
+            checkpoint["cases"] += exported
+            checkpoint["failed"] = failed
+            checkpoint["parts"].extend(parts)
+            write_checkpoint(directory, checkpoint)
+            print(f"{profile}Retry {retry}:\t{exported} case(s) exported, {len(failed)} failed")
+    else:
+        checkpoint = new_checkpoint(params, options["page_size"])
+
+    for page, cases in search.iter_search_pages(
+        params, config_dict, options["page_size"], checkpoint["next_page"]
+    ):
+        exported, failed, parts = export_page(
+            f"{page:05d}", [case["id"] for case in cases], directory, config_dict, options
+        )
+        checkpoint["next_page"] = page + 1
+        checkpoint["cases"] += exported
+        checkpoint["failed"].extend(failed)
+        checkpoint["parts"].extend(parts)
+        write_checkpoint(directory, checkpoint)
+        print(f"{profile}Page {page}:\t{exported} case(s) exported, {len(failed)} failed")
+
+    return checkpoint
+
+
+# main runs automatically
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
+
+    # check and format the output dir
+    output_directory = method_tools.format_path(os.path.abspath(arguments.output_dir))
+    os.makedirs(output_directory, exist_ok=True)
+    profiles = method_tools.load_profiles(arguments.config_file)
+
+    # logging
+    print(f"Current Working Directory:\t{os.getcwd()}")
+    print(f"Output Directory:\t{output_directory}")
+
+    export_options = {
+        "compression": arguments.compression,
+        "parquet": arguments.parquet,
+        "resume": arguments.resume,
+        "status": arguments.status,
+        "page_size": arguments.page_size,
+        "max_workers": arguments.max_workers,
+    }
+
+    def export_profile(config):
+        """Export one workgroup; several profiles export into sub-directories"""
+        profile_directory = output_directory
+        if len(profiles) > 1:
+            profile_directory = method_tools.format_path(output_directory + config["profile"])
+            os.makedirs(profile_directory, exist_ok=True)
+        return export_cases(config, profile_directory, export_options)
+
+    try:
+        summaries = method_tools.run_per_profile(export_profile, profiles)
+    except method_tools.HTTPError as http_err:
+        print(f"HTTP error occurred: {http_err}")
+        print("Exiting; rerun with -r/ --resume to continue the export.")
+        sys.exit()
+
+    # summary
+    for profile_name, summary in summaries.items():
+        print(f"Profile:\t{profile_name}")
+        print(f"Cases Exported:\t{summary['cases']}")
+        print(f"Cases Failed:\t{len(summary['failed'])}")
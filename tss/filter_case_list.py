@@ -10,14 +10,18 @@
 
 import os
 import sys
+import logging
 import argparse
 import pathlib
+import shlex
 import time
-import requests
-from requests.exceptions import HTTPError
 import method_tools
+import profile_tools
 import search
 import case_mgt_v2
+import case_model
+
+ALL_STATUSES = ["New", "In Progress", "Complete"]
 
 
 # get args
@@ -32,8 +36,9 @@ def get_args():
     parser.add_argument(
         "-c",
         "--config_file",
-        help="Full path to a TSS config file",
-        type=pathlib.Path,
+        help="Full path to a TSS config file, or a comma separated list of config files/ "
+        "profile names (~/.illumina/<name>.json) filtered concurrently",
+        type=str,
         required=True,
     )
     parser.add_argument(
@@ -106,236 +111,439 @@ def get_args():
         "Provide a comma separated date range (e.g. YYYY-MM-DD,YYYY-MM-DD)",
         type=str,
     )
+    parser.add_argument(
+        "-x",
+        "--expression",
+        help="Additional boolean filter of field:value terms with AND, OR, NOT and "
+        "parentheses; fields are tags, status, creators, dates "
+        '(e.g. \'(tags:OTG,"On Hold" OR status:"In Progress") AND NOT creators:"June Salazar"\')',
+        type=str,
+    )
+    parser.add_argument(
+        "-tid",
+        "--test_definition_id",
+        help="Only search cases of a test definition (applied server-side)",
+        type=str,
+    )
+    method_tools.add_logging_args(parser)
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
     arguments = parser.parse_args()
     return arguments
 
 
-def build_case_list(search_response):
-    """converts search response to a list of case IDs"""
+def merge_case_lists(case_lists):
+    """ordered union of case ID lists, keyed by case ID"""
+    return list(dict.fromkeys(case_id for case_list in case_lists for case_id in case_list))
 
-    # get the case id
-    case_list = []
-    if search_response:
-        for entry in search_response["content"]:
-            case_list.append(entry["id"])
-    return case_list
+
+def search_concurrently(queries, config_dict):
+    """dispatch search criteria dicts concurrently; returns case ID lists in order
+
+    Every query is paged through, so no list stops at the server's default page size.
+    """
+
+    def run(criteria):
+        return [case["id"] for case in search.search_pages(criteria, config_dict)]
+
+    try:
+        return method_tools.run_concurrently(run, queries)
+    except method_tools.HTTPError as http_err:
+        print(f"HTTP error occurred: {http_err}")
+        print("Exiting.")
+        sys.exit()
+
+
+def build_queries(statuses=None, tags=None, test_definition_id=None):
+    """one composite server-side query per status (the search accepts a single status)"""
+    queries = []
+    for status in statuses or [None]:
+        criteria = {}
+        if status:
+            criteria["status"] = status
+        if tags:
+            criteria["tags"] = list(tags)
+        if test_definition_id:
+            criteria["testDefinitionId"] = test_definition_id
+        queries.append(criteria)
+    return queries
 
 
-def search_by_tags(query, config_dict, logfile):
+def search_by_tags(query, config_dict, logfile, statuses=None, test_definition_id=None):
     """searching for cases by tag"""
     print(f"\nSearching for cases with any of the tag(s): {query}")
-    logfile.write(f"\nSearching for cases by tag(s): {query}\n")
+    logfile.info("Searching for cases by tag(s)", query=query)
 
-    processed_tags = [entry.strip() for entry in query.split(",")]
-    tags_terms = "&tags=".join(processed_tags)
-    results = search.search(
-        option="tags", search_term=tags_terms, config_dict=config_dict
+    processed_tags = list(dict.fromkeys(entry.strip() for entry in query.split(",")))
+    case_list = merge_case_lists(
+        search_concurrently(
+            build_queries(statuses, processed_tags, test_definition_id), config_dict
+        )
     )
-    logfile.write(f"{results}\n")
-    case_list = build_case_list(results)
     print(f"Cases Found:\t{len(case_list)}")
-    logfile.write(f"Cases Found:\t{len(case_list)}\n")
+    logfile.info("Cases found", cases=len(case_list))
 
     return case_list
 
 
-def search_by_status(query, config_dict, logfile):
+def search_by_status(query, config_dict, logfile, tags=None, test_definition_id=None):
     """searching for cases by status"""
     print(f"\nSearching for cases by status (or statuses): {query}")
-    logfile.write(
-        f"\nSearching for cases by status (or statuses): {query}\n"
-    )
+    logfile.info("Searching for cases by status (or statuses)", query=query)
 
-    processed_status = [entry.strip() for entry in query.split(",")]
-    case_list = []
-    for status in processed_status:
-        results = search.search(
-            option="status", search_term=status, config_dict=config_dict
-        )
-        logfile.write(f"{results}\n")
-        search_list = build_case_list(results)
+    processed_status = list(dict.fromkeys(entry.strip() for entry in query.split(",")))
+    search_lists = search_concurrently(
+        build_queries(processed_status, tags, test_definition_id), config_dict
+    )
+    for status, search_list in zip(processed_status, search_lists):
         print(f"{status} Cases Found:\t{len(search_list)}")
-        logfile.write(f"{status} Cases Found:\t{len(search_list)}\n")
-        case_list.extend(search_list)
-    return case_list
+        logfile.info("Cases found", status=status, cases=len(search_list))
+    return merge_case_lists(search_lists)
 
 
-def get_all_cases(config_dict, logfile):
+def get_all_cases(config_dict, logfile, statuses=None, tags=None, test_definition_id=None):
     """search for cases across all statuses: New, In Progress, Complete"""
     print("\nCompiling a list of all cases: New, In Progress, and Complete")
-    logfile.write("\nCompiling a list of all cases: New, In Progress, Complete\n")
-
-    # new cases
-    results = search.search(option="status", search_term="New", config_dict=config_dict)
-    new_cases = build_case_list(results)
-    logfile.write(f"New Cases:\t{len(new_cases)}\n")
-    logfile.write(f"{results}\n")
+    logfile.info("Compiling a list of all cases: New, In Progress, Complete")
 
-    # in progress cases
-    results = search.search(
-        option="status", search_term="In Progress", config_dict=config_dict
+    statuses = [status for status in ALL_STATUSES if statuses is None or status in statuses]
+    search_lists = search_concurrently(
+        build_queries(statuses, tags, test_definition_id), config_dict
     )
-    ip_cases = build_case_list(results)
-    logfile.write(f"In Progress Cases:\t{len(ip_cases)}\n")
-    logfile.write(f"{results}\n")
+    for status, search_list in zip(statuses, search_lists):
+        logfile.info("Cases found", status=status, cases=len(search_list))
 
-    # complete cases
-    results = search.search(
-        option="status", search_term="Complete", config_dict=config_dict
-    )
-    complete_cases = build_case_list(results)
-    logfile.write(f"Complete Cases:\t{len(complete_cases)}\n")
-    logfile.write(f"{results}\n")
-
-    return new_cases + ip_cases + complete_cases
+    return merge_case_lists(search_lists)
 
 
 def get_users(config_dict, logfile):
     """Get a list of workgroup users"""
     url = (
-        f"https://{config_dict['domain']}.{config_dict['url']}/crs/api/v1/session/users"
-    )
-    headers = method_tools.get_headers_apikey(
-        config_dict["apikey"], config_dict["domain"], config_dict["wg"]
+        f"{method_tools.get_base_url(config_dict)}/crs/api/v1/session/users"
     )
     response = None
 
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = method_tools.api_request("GET", url, config_dict)
 
         # If the response was successful, no Exception will be raised
         response.raise_for_status()
 
     # Error posting case
-    except HTTPError as http_err:
-        logfile.write(f"HTTP error occurred: {http_err}\n")
-        logfile.write(f"{response.text}")
+    except method_tools.HTTPError as http_err:
+        logfile.error(f"HTTP error occurred: {http_err}", response=response.text)
         print(
             "Exiting, case ingestion failed. Please check the logs for detailed error message."
         )
         sys.exit()
     else:
         if response.status_code == 200:
-            return response.json()
+            return method_tools.response_json(response)
         # Error posting case
-        logfile.write(f"{response.text}")
+        logfile.error("Unexpected get_users response", response=response.text)
         print(
             "Exiting, case ingestion failed. Please check the logs for detailed error message."
         )
         sys.exit()
 
 
-def filter_by_tags(case_info, query):
-    """filter cases via tags"""
-    tags = query.split(",")
-    case_tags = case_info["tags"]
-    match_count = 0
-    for filter_tag in tags:
-        for tag in case_tags:
-            if filter_tag == tag:
-                match_count += 1
-    return bool(match_count > 0)
-
-
-def filter_by_status(case_info, query):
-    """filter cases via status"""
-    statuses = query.split(",")
-    match_count = 0
-    for state in statuses:
-        if state == case_info["status"]:
-            match_count += 1
-    return bool(match_count > 0)
-
-
-def filter_by_creators(case_info, query, users):
-    """filter cases via createdBy"""
-    creators = query.split(",")
-    match_count = 0
-    for person in creators:
-        for entry in users:
-            name = entry["fullName"]
-            if name == person:
-                user_guid = entry["guid"]
-                if case_info["createdBy"] == user_guid:
-                    match_count += 1
-    return bool(match_count > 0)
-
-
-def filter_by_dates(case_info, query):
-    """filter cases via creationDate"""
-    dates = query.split(",")
-    start_date = time.strptime(dates[0], "%Y-%m-%d")
-    stop_date = time.strptime(dates[1], "%Y-%m-%d")
-    date_info = case_info["createdDate"].split("-")
-    creation_date_str = f"{date_info[0]}-{date_info[1]}-{date_info[2].split('T')[0]}"
-    creation_date = time.strptime(creation_date_str, "%Y-%m-%d")
-    return bool(start_date <= creation_date <= stop_date)
-
-
-def filter_case_list(case_list, criteria, config_dict, logfile):
+def split_query(query):
+    """Comma separated query to a frozenset of stripped values"""
+    return frozenset(entry.strip() for entry in query.split(",") if entry.strip())
+
+
+def filter_by_tags(query):
+    """compile a tags filter: any case tag in the query"""
+    tags = split_query(query)
+    return lambda case_info: not tags.isdisjoint(case_info.tags)
+
+
+def filter_by_status(query):
+    """compile a status filter"""
+    statuses = split_query(query)
+    return lambda case_info: case_info.status in statuses
+
+
+def filter_by_creators(query, users):
+    """compile a createdBy filter from full names to user GUIDs"""
+    creators = split_query(query)
+    guids = frozenset(entry["guid"] for entry in users if entry["fullName"] in creators)
+    return lambda case_info: case_info.created_by in guids
+
+
+def filter_by_dates(query):
+    """compile a createdDate filter; ISO dates compare as strings"""
+    dates = [entry.strip() for entry in query.split(",")]
+    if len(dates) != 2:
+        raise ValueError(f"Expected two dates (dates:YYYY-MM-DD,YYYY-MM-DD), got {query}")
+    start_date = time.strftime("%Y-%m-%d", time.strptime(dates[0], "%Y-%m-%d"))
+    stop_date = time.strftime("%Y-%m-%d", time.strptime(dates[1], "%Y-%m-%d"))
+    return lambda case_info: start_date <= (case_info.created_date or "")[:10] <= stop_date
+
+
+def compile_filter(field, query, users):
+    """compile one tags/ status/ creators/ dates criterion"""
+    if field == "tags":
+        return filter_by_tags(query)
+    if field == "status":
+        return filter_by_status(query)
+    if field == "creators":
+        return filter_by_creators(query, users)
+    if field == "dates":
+        return filter_by_dates(query)
+    raise ValueError(f"Unknown filter field, {field}")
+
+
+def tokenize_expression(expression):
+    """split an expression into words, parentheses and field:value terms"""
+    lexer = shlex.shlex(expression, posix=True, punctuation_chars="()")
+    lexer.whitespace_split = True
+    return list(lexer)
+
+
+def compile_expression(expression, users):
+    """compile an AND/ OR/ NOT expression of field:value terms into one predicate
+
+    e.g. (tags:OTG,"On Hold" OR status:"In Progress") AND NOT creators:"June Salazar"
+    """
+    tokens = tokenize_expression(expression)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take(expected=None):
+        nonlocal position
+        token = peek()
+        if token is None or (expected and token.upper() != expected):
+            raise ValueError(f"Invalid filter expression near '{token}': {expression}")
+        position += 1
+        return token
+
+    def parse_or():
+        left = parse_and()
+        while (peek() or "").upper() == "OR":
+            take("OR")
+            right = parse_and()
+            left = (lambda a, b: lambda case_info: a(case_info) or b(case_info))(left, right)
+        return left
+
+    def parse_and():
+        left = parse_not()
+        while (peek() or "").upper() == "AND":
+            take("AND")
+            right = parse_not()
+            left = (lambda a, b: lambda case_info: a(case_info) and b(case_info))(left, right)
+        return left
+
+    def parse_not():
+        token = peek()
+        if (token or "").upper() == "NOT":
+            take("NOT")
+            inner = parse_not()
+            return lambda case_info: not inner(case_info)
+        if token == "(":
+            take("(")
+            inner = parse_or()
+            take(")")
+            return inner
+        field, _, query = take().partition(":")
+        if not query:
+            raise ValueError(f"Expected field:value, found '{field}': {expression}")
+        return compile_filter(field.strip(), query, users)
+
+    predicate = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Invalid filter expression near '{peek()}': {expression}")
+    return predicate
+
+
+def compile_criteria(criteria, users, expression=None):
+    """compile include/ exclude criteria (and an optional expression) into one predicate
+
+    include criteria must match, exclude criteria must not; evaluation stops at the first
+    failing criterion
+    """
+    checks = []
+    for flag, query in criteria.items():
+        mode, _, field = flag.partition("_")
+        check = compile_filter(field, query, users)
+        if mode == "exclude":
+            check = (lambda inner: lambda case_info: not inner(case_info))(check)
+        checks.append(check)
+    if expression:
+        checks.append(compile_expression(expression, users))
+    checks = tuple(checks)
+    return lambda case_info: all(check(case_info) for check in checks)
+
+
+def filter_case_list(case_list, criteria, config_dict, logfile, expression=None):
     """apply filters specified in args"""
 
     print("\nApplying Include and Exclude Criteria")
-    logfile.write("\nApplying Include and Exclude Criteria\n")
-    logfile.write(f"{case_list}\n")
+    logfile.info("Applying Include and Exclude Criteria", criteria=criteria, expression=expression)
+    logfile.payload("Case list", case_list, level=logging.DEBUG)
 
     # summarize search/ filter criteria
-    users = {}
-    expected_results = []
     for item, _ in criteria.items():
         print(f"{item}:\t{_}")
-        logfile.write(f"{item}:\t{_}\n")
+    if expression:
+        print(f"expression:\t{expression}")
 
-        # get users
-        if item.endswith("creators"):
-            users = get_users(config_dict=config_dict, logfile=logfile)
+    # get users once, only when creators are used
+    users = []
+    if any(item.endswith("creators") for item in criteria) or (
+        expression and "creators:" in expression
+    ):
+        users = get_users(config_dict=config_dict, logfile=logfile)
 
-        # set expectations for include/ exclude
-        if item.startswith("include"):
-            expected_results.append(True)
-        else:
-            expected_results.append(False)
+    # compile the criteria once
+    try:
+        predicate = compile_criteria(criteria, users, expression)
+    except ValueError as err:
+        print(f"[ERROR] {err}")
+        sys.exit()
+
+    # nothing left to check client-side
+    if not criteria and not expression:
+        print(f"Number of Cases Remaining:\t{len(case_list)}")
+        logfile.info("Number of cases remaining", cases=len(case_list))
+        return list(case_list), []
+
+    # get the cases concurrently under the shared rate limiter; keep only the compact records
+    errors = {}
+
+    def fetch_record(case_guid):
+        try:
+            response = case_mgt_v2.fetch_case(case_guid, config_dict)
+        except method_tools.RequestException as err:
+            errors[case_guid] = f"{type(err).__name__}: {err}"
+            return None
+        if response.status_code != 200:
+            errors[case_guid] = f"{response.status_code}: {response.text}"
+            return None
+        return case_model.CaseRecord.from_json(method_tools.response_json(response))
+
+    case_records = method_tools.run_concurrently(fetch_record, case_list)
+    if errors:
+        for case_guid, error in errors.items():
+            logfile.error("Failed to get the case", case_guid=case_guid, error=error)
+        print(f"Exiting, failed to get {len(errors)} case(s). Please check the logs.")
+        sys.exit()
 
     # loop over case list
     include_list = []
     exclude_list = []
-    for case_guid in enumerate(case_list):
-        # get the case info
-        get_case_results = case_mgt_v2.get_case(case_guid[1], config_dict)
-
-        # filter on include criteria
-        # exclude filtering when only tags are applied
-        results = []
-        for flag, _ in criteria.items():
-            if flag.endswith("tags"):
-                results.append(filter_by_tags(case_info=get_case_results, query=_))
-            if flag.endswith("status"):
-                results.append(filter_by_status(case_info=get_case_results, query=_))
-            if flag.endswith("creators"):
-                results.append(
-                    filter_by_creators(case_info=get_case_results, query=_, users=users)
-                )
-            if flag.endswith("dates"):
-                results.append(filter_by_dates(case_info=get_case_results, query=_))
-
+    for case_guid, case_record in zip(case_list, case_records):
         # summary of include/ exclude status per case
-        print(case_guid[1], expected_results, results)
-        if results == expected_results:
-            logfile.write(f"Match found, {case_guid[1]}\n")
-            include_list.append(case_guid[1])
+        if predicate(case_record):
+            logfile.sample("match", "Match found", case_guid=case_guid)
+            include_list.append(case_guid)
         else:
-            logfile.write(f"Not a match, case will be filtered out, {case_guid[1]}\n")
-            exclude_list.append(case_guid[1])
+            logfile.sample(
+                "no_match", "Not a match, case will be filtered out", case_guid=case_guid
+            )
+            exclude_list.append(case_guid)
 
     # summary of include/ exclude status across all cases
     print(f"Number of Cases Filtered Out:\t{len(exclude_list)}")
-    logfile.write(f"Number of Cases Filtered Out:\t{len(exclude_list)}\n")
     print(f"Number of Cases Remaining:\t{len(include_list)}")
-    logfile.write(f"Number of Cases Remaining:\t{len(include_list)}\n")
+    logfile.info(
+        "Filter summary", filtered_out=len(exclude_list), remaining=len(include_list)
+    )
 
     return include_list, exclude_list
 
 
+def search_and_filter(args, config_dict, logfile):
+    """search for cases, then apply the remaining include/ exclude criteria"""
+
+    # set up case lists
+    search_case_list = []
+
+    # filter criteria
+    filter_options = {}
+    for option in vars(args):
+        value = getattr(args, option)
+        if value:
+            if option.startswith(("include_", "exclude_")):
+                filter_options.update({option: value})
+
+    # include tags/ statuses are expressed server-side; only the rest is filtered locally
+    server_tags = None
+    server_statuses = None
+    if args.include_tags:
+        server_tags = list(split_query(args.include_tags))
+        del filter_options["include_tags"]
+    if args.include_status:
+        server_statuses = [entry.strip() for entry in args.include_status.split(",")]
+        del filter_options["include_status"]
+
+    # search by tag(s)
+    if args.search == "tags":
+        # check for include option
+        if args.include_tags is None:
+            print("Provide one or more tags to search for cases")
+            sys.exit()
+
+        # search for cases
+        search_case_list = search_by_tags(
+            query=args.include_tags,
+            config_dict=config_dict,
+            logfile=logfile,
+            statuses=server_statuses,
+            test_definition_id=args.test_definition_id,
+        )
+
+    # search by status
+    if args.search == "status":
+        # check for include option
+        if args.include_status is None:
+            print(
+                "Provide one or more statuses to search for cases: New, 'In Progress', or Complete"
+            )
+            sys.exit()
+
+        # search for cases
+        search_case_list = search_by_status(
+            query=args.include_status,
+            config_dict=config_dict,
+            logfile=logfile,
+            tags=server_tags,
+            test_definition_id=args.test_definition_id,
+        )
+
+    # search by creator or date
+    if args.search in ("creators", "dates"):
+        # check for include option
+        if args.search == "creators" and args.include_creators is None:
+            print("Provide one or more case creators to search for cases\n")
+            sys.exit()
+        elif args.search == "dates" and args.include_dates is None:
+            print("Provide a date range to search for cases")
+            sys.exit()
+
+        # search across all New, Complete, and In Progress cases
+        search_case_list = get_all_cases(
+            config_dict=config_dict,
+            logfile=logfile,
+            statuses=server_statuses,
+            tags=server_tags,
+            test_definition_id=args.test_definition_id,
+        )
+
+    # apply the remaining (client-side) filtering
+    included_case_list, excluded_case_list = filter_case_list(
+        case_list=search_case_list,
+        criteria=filter_options,
+        config_dict=config_dict,
+        logfile=logfile,
+        expression=args.expression,
+    )
+
+    return included_case_list, excluded_case_list
+
+
 def summary_of_case_list(case_list, logfile, output_file):
     """print case IDs"""
 
@@ -343,117 +551,81 @@ def summary_of_case_list(case_list, logfile, output_file):
         file.write("#case_id\n")
         # loop over final case list
         for case in case_list:
-            logfile.write(f"{case}\n")
             file.write(f"{case}\n")
+    logfile.info("Case IDs written", path=output_file, cases=len(case_list))
+    logfile.payload("Case IDs", case_list, level=logging.DEBUG)
+
+
+def summary_of_profile_case_lists(case_lists, output_file):
+    """print case IDs tagged with their profile"""
+
+    with open(f"{output_file}", "w", encoding="utf-8") as file:
+        file.write("#case_id,profile\n")
+        for profile, case_list in case_lists.items():
+            for case in case_list:
+                file.write(f"{case},{profile}\n")
 
 
 if __name__ == "__main__":
     # get args
     args = get_args()
+    profile_tools.set_profiling(args)
+    method_tools.set_metrics(args)
 
-    # parse config
-    config = method_tools.parse_config(str(args.config_file))
+    # parse config(s)
+    method_tools.set_logging(args)
+    profiles = method_tools.load_profiles(args.config_file)
 
     # check and format the output dir
     directory = os.path.abspath(args.output_dir)
 
-    # logging
-    with open(f"{directory}/filter_case_list.log", "w", encoding="utf-8") as log:
+    # single workgroup
+    if len(profiles) == 1:
+        config = next(iter(profiles.values()))
+
+        # logging
+        with method_tools.JsonLog(f"{directory}/filter_case_list.log") as log:
+            print(f"Current Working Directory:\t{os.getcwd()}")
+            print(f"Output Directory:\t{directory}")
+            log.info("Starting", working_directory=os.getcwd(), output_directory=directory)
+
+            included_case_list, excluded_case_list = search_and_filter(args, config, log)
+
+            # cases matching criteria
+            case_file = f"{directory}/included_case_list.txt"
+            print(f"\nCase IDs Matching Search Criteria:\t{case_file}")
+            summary_of_case_list(
+                case_list=included_case_list, logfile=log, output_file=case_file
+            )
+
+            # cases not matching criteria
+            case_file = f"{directory}/excluded_case_list.txt"
+            print(f"\nCase IDs Filtered Out:\t{case_file}")
+            summary_of_case_list(
+                case_list=excluded_case_list, logfile=log, output_file=case_file
+            )
+
+    # many workgroups: run concurrently, one log per profile, merged profile-tagged lists
+    else:
         print(f"Current Working Directory:\t{os.getcwd()}")
         print(f"Output Directory:\t{directory}")
-        log.write(f"Current Working Directory:\t{os.getcwd()}\n")
-        log.write(f"Output Directory:\t{directory}\n")
-
-        # set up case lists
-        search_case_list = []
-        included_case_list = []
-
-        # filter criteria
-        filter_options = {}
-        for option in vars(args):
-            value = getattr(args, option)
-            if value:
-                if option.startswith("include") or option.startswith("exclude"):
-                    filter_options.update({option: value})
-
-        # search by tag(s)
-        if args.search == "tags":
-            # check for include option
-            if args.include_tags is None:
-                print("Provide one or more tags to search for cases")
-                sys.exit()
-
-            # search for cases
-            else:
-                search_case_list = search_by_tags(
-                    query=args.include_tags, config_dict=config, logfile=log
-                )
-
-                # apply filtering
-                del filter_options["include_tags"]
-                included_case_list, excluded_case_list = filter_case_list(
-                    case_list=search_case_list,
-                    criteria=filter_options,
-                    config_dict=config,
-                    logfile=log,
-                )
-
-        # search by status
-        if args.search == "status":
-            # check for include option
-            if args.include_status is None:
-                print(
-                    "Provide one or more statuses to search for cases: New, 'In Progress', or Complete"
-                )
-                sys.exit()
-
-            # search for cases
-            else:
-                search_case_list = search_by_status(
-                    query=args.include_status, config_dict=config, logfile=log
-                )
-
-                # apply filtering
-                del filter_options["include_status"]
-                included_case_list, excluded_case_list = filter_case_list(
-                    case_list=search_case_list,
-                    criteria=filter_options,
-                    config_dict=config,
-                    logfile=log,
-                )
-
-        # search by creator or date
-        if args.search in ("creators", "dates"):
-            # check for include option
-            if args.search == "creators" and args.include_creators is None:
-                print("Provide one or more case creators to search for cases\n")
-                sys.exit()
-            elif args.search == "dates" and args.include_dates is None:
-                print("Provide a date range to search for cases")
-                sys.exit()
-
-            # search across all New, Complete, and In Progress cases
-            else:
-                search_case_list = get_all_cases(config_dict=config, logfile=log)
-                included_case_list, excluded_case_list = filter_case_list(
-                    case_list=search_case_list,
-                    criteria=filter_options,
-                    config_dict=config,
-                    logfile=log,
-                )
-
-        # cases matching criteria
+        print(f"Profiles:\t{', '.join(profiles)}")
+
+        def filter_profile(config):
+            """search and filter one workgroup"""
+            log_name = f"{directory}/filter_case_list.{config['profile']}.log"
+            with method_tools.JsonLog(log_name) as profile_log:
+                return search_and_filter(args, config, profile_log)
+
+        profile_results = method_tools.run_per_profile(filter_profile, profiles)
+
         case_file = f"{directory}/included_case_list.txt"
-        log.write(f"\nCase IDs Matching Search Criteria:\t{case_file}\n")
         print(f"\nCase IDs Matching Search Criteria:\t{case_file}")
-        summary_of_case_list(
-            case_list=included_case_list, logfile=log, output_file=case_file
+        summary_of_profile_case_lists(
+            {name: result[0] for name, result in profile_results.items()}, case_file
         )
-
-        # cases not matching criteria
         case_file = f"{directory}/excluded_case_list.txt"
-        log.write(f"\nCase IDs Filtered Out:\t{case_file}\n")
         print(f"\nCase IDs Filtered Out:\t{case_file}")
-        summary_of_case_list(
-            case_list=excluded_case_list, logfile=log, output_file=case_file
+        summary_of_profile_case_lists(
+            {name: result[1] for name, result in profile_results.items()}, case_file
         )
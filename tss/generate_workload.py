@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Generate synthetic TSS and DRAGEN inputs for load tests"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Seeded synthetic workload generator
+# 1. Inputs: output dir, record count (10 to 1M+), seed, [optional] test definition/ report IDs
+# 2. Outputs (any of):
+#    cases.csv - case manifest for read_case_csv (one row per family member)
+#    ehr/<shard>/ehr_<n>.json - EHR JSON for parse_ehr (caseInfo + quickStart)
+#    sample_sheet.csv - v2 sample sheet with [Cloud_Data] for create_biosamples
+#    dragen/<sample>/*_metrics.csv - DRAGEN metrics trees for aggregate_dragen_qc_metrics
+# Notes: records are generated and written one at a time, so memory does not grow with the
+#        record count; the same seed always writes the same files. Case CSV and EHR records
+#        are families; sample sheet and DRAGEN records are samples.
+##################################################################
+
+import os
+import sys
+import csv
+import random
+import argparse
+import method_tools
+import profile_tools
+import case_manifest
+
+KINDS = ["cases", "ehr", "sample_sheet", "dragen"]
+EHR_SHARD_SIZE = 1000
+FAMILY_SIZES = [1, 1, 2, 3, 3, 3, 4, 5]
+MEMBERS = ["PROBAND", "MOTHER", "FATHER", "SIBLING", "OTHER;Cousin"]
+MEMBER_CODES = {"PROBAND": "P", "MOTHER": "M", "FATHER": "F", "SIBLING": "S", "OTHER;Cousin": "O"}
+FIRST_NAMES = ["Ana", "Ben", "Chloe", "Dev", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jon"]
+LAST_NAMES = ["Garcia", "Nguyen", "Smith", "Okafor", "Kowalski", "Haddad", "Ito", "Silva"]
+INDICATIONS = [
+    "HP:0001250",
+    "HP:0000252",
+    "HP:0001263",
+    "HP:0004322",
+    "HP:0000707",
+    "HP:0001249",
+    "HP:0002069",
+    "HP:0000729",
+]
+TAGS = ["OTG", "Keep", "Research", "Load Test"]
+DEFAULT_TEST_ID = "00000000-0000-4000-8000-000000000001"
+DEFAULT_REPORT_ID = "00000000-0000-4000-8000-000000000002"
+MAPPING_METRICS = [
+    ("Number of duplicate marked reads", 4.0e7, 1.2e8),
+    ("Mapped reads", 7.9e8, 1.19e9),
+    ("Properly paired reads", 7.7e8, 1.17e9),
+    ("Q30 bases", 1.0e11, 1.6e11),
+    ("Insert length: mean", 350, 450),
+]
+VC_METRICS = [
+    ("Total", 4.5e6, 5.2e6),
+    ("SNPs", 3.6e6, 4.2e6),
+    ("Indels", 4.0e5, 6.0e5),
+    ("Ti/Tv ratio", 1.9, 2.1),
+    ("Het/Hom ratio", 1.4, 1.8),
+]
+COVERAGE_METRICS = [
+    ("Aligned bases", 9.0e10, 1.4e11),
+    ("Average alignment coverage over genome", 28, 45),
+    ("PCT of genome with coverage [  20x: inf)", 85, 99),
+    ("Mean/Median autosomal coverage ratio over genome", 0.98, 1.05),
+]
+
+
+# families shared by the case CSV and EHR writers
+def iter_families(count, seed):
+    """Yield (family_id, [member dict], tags) for count families"""
+
+    rng = random.Random(seed)
+    for family in range(1, count + 1):
+        family_id = f"WL-{family:07d}"
+        last_name = rng.choice(LAST_NAMES)
+        indications = rng.sample(INDICATIONS, rng.randint(1, 3))
+        members = []
+        for relationship in MEMBERS[: rng.choice(FAMILY_SIZES)]:
+            if relationship == "MOTHER":
+                sex = "FEMALE"
+            elif relationship == "FATHER":
+                sex = "MALE"
+            else:
+                sex = rng.choice(["MALE", "FEMALE"])
+            members.append(
+                {
+                    "relationship": relationship,
+                    "sample_id": f"WL{family:07d}{MEMBER_CODES[relationship]}",
+                    "sex": sex,
+                    "affected": "TRUE" if relationship == "PROBAND" or rng.random() < 0.1 else "FALSE",
+                    "first_name": rng.choice(FIRST_NAMES),
+                    "last_name": last_name,
+                    "dob": f"{rng.randint(1950, 2022)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    "mrn": f"MRN{rng.randint(0, 10**9):09d}",
+                    "indications": indications if relationship == "PROBAND" else [],
+                }
+            )
+        yield family_id, members, rng.sample(TAGS, rng.randint(0, 2))
+
+
+# case manifest
+def write_case_csv(path, count, seed=1, test_id=DEFAULT_TEST_ID, report_id=DEFAULT_REPORT_ID):
+    """Write a read_case_csv manifest for count families; returns the number of rows"""
+
+    columns = case_manifest.REQUIRED_COLUMNS + case_manifest.OPTIONAL_COLUMNS
+    rows = 0
+    with open(path, "w", encoding="utf-8", newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(columns)
+        for family_id, members, tags in iter_families(count, seed):
+            for member in members:
+                writer.writerow(
+                    [
+                        family_id,
+                        member["sample_id"],
+                        member["relationship"],
+                        member["affected"],
+                        member["sex"],
+                        test_id,
+                        member["first_name"],
+                        "",
+                        member["last_name"],
+                        member["dob"],
+                        member["mrn"],
+                        report_id if member["relationship"] == "PROBAND" else "",
+                        ";".join(member["indications"]),
+                        ";".join(tags),
+                    ]
+                )
+                rows += 1
+    return rows
+
+
+# EHR JSON files
+def write_ehr_files(directory, count, seed=1, test_name="WGS Trio", test_version="1.0"):
+    """Write one parse_ehr JSON per family, EHR_SHARD_SIZE files per sub-directory"""
+
+    directory = method_tools.format_path(directory)
+    files = 0
+    for family, (family_id, members, tags) in enumerate(iter_families(count, seed)):
+        shard = method_tools.format_path(f"{directory}{family // EHR_SHARD_SIZE:04d}")
+        if family % EHR_SHARD_SIZE == 0:
+            os.makedirs(shard, exist_ok=True)
+
+        # parse_ehr fills reportTypes on the first subject, so the proband comes first
+        subjects = []
+        sample_ids = {}
+        for member in members:
+            relationship, _, other = member["relationship"].partition(";")
+            subject = {
+                "dateOfBirth": member["dob"],
+                "firstName": member["first_name"],
+                "lastName": member["last_name"],
+                "middleName": "",
+                "gender": member["sex"],
+                "mrn": member["mrn"],
+                "isAffected": member["affected"],
+                "relationshipToProband": relationship,
+                "phenotypes": [{"code": code, "source": "HPO"} for code in member["indications"]],
+                "reportTypes": [],
+                "samples": [{"externalSampleId": ""}],
+                "previousTestHistory": "",
+                "medicalHistory": "",
+                "familyHistory": "",
+                "customPhenotypes": "",
+                "hasResearchConsent": "NO",
+                "allowDnaStorage": "NO",
+            }
+            if other:
+                subject["otherRelationshipToProband"] = other
+                subject["samples"][0]["externalSampleId"] = member["sample_id"]
+            else:
+                sample_ids.setdefault(relationship.lower(), member["sample_id"])
+            subjects.append(subject)
+
+        ehr = {
+            "caseInfo": {
+                "displayId": family_id,
+                "tags": tags,
+                "subjects": subjects,
+                "phi": {"summary": ""},
+            },
+            "quickStart": {
+                "testName": test_name,
+                "test_version": test_version,
+                "externalSampleId": sample_ids,
+            },
+        }
+        with open(f"{shard}ehr_{family + 1:07d}.json", "w", encoding="utf-8") as output:
+            method_tools.json_dump(ehr, output, indent=True)
+        files += 1
+    return files
+
+
+# v2 sample sheet
+def iter_samples(count, seed):
+    """Yield (sample ID, index, index2) for count samples"""
+
+    rng = random.Random(seed)
+    for sample in range(1, count + 1):
+        index = "".join(rng.choice("ACGT") for _ in range(10))
+        index2 = "".join(rng.choice("ACGT") for _ in range(10))
+        yield f"WS{sample:07d}", index, index2
+
+
+def write_sample_sheet(path, count, seed=1, project="LoadTest"):
+    """Write a v2 sample sheet with [BCLConvert_Data] and [Cloud_Data] for count samples"""
+
+    with open(path, "w", encoding="utf-8") as output:
+        output.write(
+            "[Header]\n"
+            "FileFormatVersion,2\n"
+            f"RunName,LoadTest_{seed}\n"
+            "InstrumentPlatform,NovaSeq6000\n"
+            "\n[Reads]\n"
+            "Read1Cycles,151\n"
+            "Read2Cycles,151\n"
+            "Index1Cycles,10\n"
+            "Index2Cycles,10\n"
+            "\n[BCLConvert_Settings]\n"
+            "SoftwareVersion,3.9.3\n"
+            "\n[BCLConvert_Data]\n"
+            "Lane,Sample_ID,Index,Index2\n"
+        )
+        # samples are regenerated for each section instead of being held in memory
+        for sample_id, index, index2 in iter_samples(count, seed):
+            lane = int(sample_id[2:]) % 4 + 1
+            output.write(f"{lane},{sample_id},{index},{index2}\n")
+        output.write(
+            "\n[Cloud_Settings]\n"
+            "GeneratedVersion,1.0.0\n"
+            "\n[Cloud_Data]\n"
+            "Sample_ID,ProjectName,LibraryName,LibraryPrepKitName,IndexAdapterKitName\n"
+        )
+        for sample_id, index, index2 in iter_samples(count, seed):
+            output.write(
+                f"{sample_id},{project},{sample_id}_{index}_{index2},"
+                "IlluminaDNAPCRFree,IDTforIlluminaUDIndexes\n"
+            )
+    return count
+
+
+# DRAGEN metrics trees
+def metric_rows(rng, section, metrics, percent_of=None):
+    """CSV rows for one metrics section; percent columns relative to percent_of"""
+
+    rows = []
+    for name, low, high in metrics:
+        value = rng.uniform(low, high)
+        value = round(value) if high > 1000 else round(value, 2)
+        if percent_of and high > 1000:
+            rows.append(f"{section},,{name},{value},{round(100 * value / percent_of, 2)}")
+        else:
+            rows.append(f"{section},,{name},{value}")
+    return rows
+
+
+def write_dragen_tree(directory, count, seed=1):
+    """Write mapping, variant calling and coverage *_metrics.csv files for count samples"""
+
+    directory = method_tools.format_path(directory)
+    rng = random.Random(seed)
+    files = 0
+    for sample in range(1, count + 1):
+        sample_id = f"WS{sample:07d}"
+        sample_dir = method_tools.format_path(f"{directory}{sample_id}")
+        os.makedirs(sample_dir, exist_ok=True)
+        # aggregate_dragen_qc_metrics takes the sample ID between the first "_" and "-"
+        prefix = f"{sample_dir}dragen_{sample_id}-1"
+
+        total_reads = round(rng.uniform(8.0e8, 1.2e9))
+        mapping = [f"MAPPING/ALIGNING SUMMARY,,Total input reads,{total_reads},100.00"]
+        mapping += metric_rows(rng, "MAPPING/ALIGNING SUMMARY", MAPPING_METRICS, total_reads)
+        mapping += [
+            f"MAPPING/ALIGNING PER RG,{sample_id}_RG{lane},Total reads in RG,{total_reads // 4},25.00"
+            for lane in range(1, 5)
+        ]
+        outputs = {
+            "mapping_metrics.csv": mapping,
+            "vc_metrics.csv": metric_rows(rng, "VARIANT CALLER SUMMARY", VC_METRICS)
+            + metric_rows(rng, "VARIANT CALLER POSTFILTER", VC_METRICS),
+            "wgs_coverage_metrics.csv": metric_rows(rng, "COVERAGE SUMMARY", COVERAGE_METRICS),
+            "ploidy_estimation_metrics.csv": [
+                f"PLOIDY ESTIMATION,,Autosomal median coverage,{round(rng.uniform(28, 45), 2)}",
+                f"PLOIDY ESTIMATION,,Ploidy estimation,{rng.choice(['XX', 'XY'])}",
+            ],
+        }
+        for name, rows in outputs.items():
+            with open(f"{prefix}.{name}", "w", encoding="utf-8") as output:
+                output.write("\n".join(rows) + "\n")
+            files += 1
+    return files
+
+
+# write the requested kinds
+def generate(directory, kinds, count, seed=1, options=None):
+    """Write each requested kind under directory; returns {kind: (path, count written)}"""
+
+    options = options or {}
+    directory = method_tools.format_path(os.path.abspath(directory))
+    os.makedirs(directory, exist_ok=True)
+    written = {}
+    if "cases" in kinds:
+        path = directory + "cases.csv"
+        rows = write_case_csv(
+            path,
+            count,
+            seed,
+            options.get("test_id", DEFAULT_TEST_ID),
+            options.get("report_id", DEFAULT_REPORT_ID),
+        )
+        written["cases"] = (path, rows)
+    if "ehr" in kinds:
+        path = directory + "ehr/"
+        files = write_ehr_files(
+            path,
+            count,
+            seed,
+            options.get("test_name", "WGS Trio"),
+            options.get("test_version", "1.0"),
+        )
+        written["ehr"] = (path, files)
+    if "sample_sheet" in kinds:
+        path = directory + "sample_sheet.csv"
+        written["sample_sheet"] = (path, write_sample_sheet(path, count, seed))
+    if "dragen" in kinds:
+        path = directory + "dragen/"
+        written["dragen"] = (path, write_dragen_tree(path, count, seed))
+    return written
+
+
+# get args
+def get_args():
+    """Get command line arguments"""
+    parser = argparse.ArgumentParser(description="Generate synthetic TSS/ DRAGEN inputs")
+    parser.add_argument("-o", "--output_dir", help="Path for the generated inputs", type=str, required=True)
+    parser.add_argument(
+        "-k",
+        "--kinds",
+        help=f"Comma separated kinds to write (default: all): {','.join(KINDS)}",
+        type=str,
+        default=",".join(KINDS),
+    )
+    parser.add_argument(
+        "-n",
+        "--records",
+        help="Families (cases, ehr) or samples (sample_sheet, dragen) to write (default: 100)",
+        type=int,
+        default=100,
+    )
+    parser.add_argument("--seed", help="Random seed (default: 1)", type=int, default=1)
+    parser.add_argument("--test_id", help="TestID for the case manifest", type=str, default=DEFAULT_TEST_ID)
+    parser.add_argument(
+        "--report_id", help="ReportID for probands in the case manifest", type=str, default=DEFAULT_REPORT_ID
+    )
+    parser.add_argument("--test_name", help="quickStart testName for EHRs", type=str, default="WGS Trio")
+    parser.add_argument("--test_version", help="quickStart test_version for EHRs", type=str, default="1.0")
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+
+    requested = [kind.strip() for kind in arguments.kinds.split(",") if kind.strip()]
+    unknown = [kind for kind in requested if kind not in KINDS]
+    if unknown or arguments.records < 1:
+        print(f"[ERROR] Unknown kind(s) {', '.join(unknown)} or records < 1")
+        sys.exit()
+
+    outputs = generate(
+        arguments.output_dir,
+        requested,
+        arguments.records,
+        arguments.seed,
+        {
+            "test_id": arguments.test_id,
+            "report_id": arguments.report_id,
+            "test_name": arguments.test_name,
+            "test_version": arguments.test_version,
+        },
+    )
+    for kind, (output_path, written_count) in outputs.items():
+        unit = {"cases": "rows", "ehr": "files", "sample_sheet": "samples", "dragen": "files"}[kind]
+        print(f"{kind}:\t{output_path}\t{written_count} {unit}")
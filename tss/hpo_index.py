@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Local HPO ontology index for indication validation"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Build and query a compact HPO index
+# 1. Inputs: hp.obo (https://hpo.jax.org/app/data/ontology)
+# 2. Outputs: hp.idx, a prebuilt binary index that is memory-mapped for lookups
+# Notes: lookups validate codes, map term names/ exact synonyms to codes and
+#        resolve obsolete or alternative IDs to their replacement
+##################################################################
+
+import os
+import re
+import mmap
+import struct
+import argparse
+import profile_tools
+from bisect import bisect_left
+
+MAGIC = b"HPOIDX02"
+HEADER = struct.Struct("<8sII")  # magic, number of codes, number of names
+CODE_ENTRY = struct.Struct("<Ii")  # code, replacement (code itself when current, 0 when none)
+NAME_ENTRY = struct.Struct("<II")  # offset into the string table, code
+HPO_ID = re.compile(r"^HP:(\d{7})$")
+SYNONYM = re.compile(r'^"(.*)"\s+EXACT')
+
+
+# HP:0001250 <-> 1250
+def code_to_int(code):
+    """Return the integer part of an HPO ID, or None"""
+
+    match = HPO_ID.match(code.strip().upper()) if code else None
+    return int(match.group(1)) if match else None
+
+
+def int_to_code(number):
+    """Return the HPO ID for an integer"""
+
+    return f"HP:{number:07d}"
+
+
+# normalize names for lookups
+def normalize_name(name):
+    """Case and whitespace insensitive key"""
+
+    return " ".join(name.casefold().split())
+
+
+# stream hp.obo
+def parse_obo(obo_path):
+    """Yield one dict per [Term] stanza"""
+
+    term = None
+    with open(obo_path, "r", encoding="utf-8") as obo:
+        for line in obo:
+            line = line.strip()
+            if line.startswith("["):
+                if term and term.get("id"):
+                    yield term
+                term = None
+                if line == "[Term]":
+                    term = {"synonyms": [], "alt_ids": [], "replaced_by": None, "obsolete": False}
+                continue
+            if term is None or ": " not in line:
+                continue
+            key, value = line.split(": ", 1)
+            if key == "id":
+                term["id"] = value
+            elif key == "name":
+                term["name"] = value
+            elif key == "synonym":
+                match = SYNONYM.match(value)
+                if match:
+                    term["synonyms"].append(match.group(1))
+            elif key == "alt_id":
+                term["alt_ids"].append(value)
+            elif key == "replaced_by":
+                term["replaced_by"] = value
+            elif key == "is_obsolete":
+                term["obsolete"] = value == "true"
+    if term and term.get("id"):
+        yield term
+
+
+# build the binary index
+def build_index(obo_path, index_path):
+    """Write a sorted, fixed-width binary index from hp.obo"""
+
+    codes = {}
+    names = {}
+    for term in parse_obo(obo_path):
+        number = code_to_int(term["id"])
+        if number is None:
+            continue
+        if term["obsolete"]:
+            # "consider" terms are only suggestions; without replaced_by the code is invalid
+            codes[number] = code_to_int(term["replaced_by"] or "") or 0
+            continue
+        codes[number] = number
+        for alt_id in term["alt_ids"]:
+            alt_number = code_to_int(alt_id)
+            if alt_number is not None:
+                codes.setdefault(alt_number, number)
+        if term.get("name"):
+            names.setdefault(normalize_name(term["name"]), number)
+        for synonym in term["synonyms"]:
+            names.setdefault(normalize_name(synonym), number)
+
+    # follow chains of replacements (obsolete -> obsolete -> current)
+    for number, replacement in codes.items():
+        seen = {number}
+        while replacement and codes.get(replacement, 0) != replacement and replacement not in seen:
+            seen.add(replacement)
+            replacement = codes.get(replacement, 0)
+        codes[number] = replacement if codes.get(replacement) == replacement else 0
+
+    sorted_names = sorted((key.encode("utf-8"), number) for key, number in names.items())
+    with open(index_path, "wb") as index:
+        index.write(HEADER.pack(MAGIC, len(codes), len(sorted_names)))
+        for number in sorted(codes):
+            index.write(CODE_ENTRY.pack(number, codes[number]))
+        offset = 0
+        for key, number in sorted_names:
+            index.write(NAME_ENTRY.pack(offset, number))
+            offset += len(key)
+        index.write(NAME_ENTRY.pack(offset, 0))  # end of the string table
+        for key, _ in sorted_names:
+            index.write(key)
+    return len(codes), len(sorted_names)
+
+
+class _Column:
+    """Sequence view over fixed-width records for bisect"""
+
+    def __init__(self, length, getter):
+        self.length = length
+        self.getter = getter
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        return self.getter(position)
+
+
+class HpoIndex:
+    """Memory-mapped HPO lookups"""
+
+    def __init__(self, index_path):
+        with open(index_path, "rb") as index:
+            self.buffer = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.code_count, self.name_count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{index_path} is not an HPO index")
+        self.codes_start = HEADER.size
+        self.names_start = self.codes_start + self.code_count * CODE_ENTRY.size
+        self.strings_start = self.names_start + (self.name_count + 1) * NAME_ENTRY.size
+        self.code_column = _Column(self.code_count, self._code_at)
+        self.name_column = _Column(self.name_count, self._name_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Release the memory map"""
+        self.buffer.close()
+
+    def _code_at(self, position):
+        return CODE_ENTRY.unpack_from(self.buffer, self.codes_start + position * CODE_ENTRY.size)[0]
+
+    def _name_at(self, position):
+        start, _ = NAME_ENTRY.unpack_from(self.buffer, self.names_start + position * NAME_ENTRY.size)
+        stop, _ = NAME_ENTRY.unpack_from(
+            self.buffer, self.names_start + (position + 1) * NAME_ENTRY.size
+        )
+        return self.buffer[self.strings_start + start:self.strings_start + stop]
+
+    def resolve(self, code):
+        """Return the current HPO ID for a code (obsolete/ alternative IDs are replaced), or None"""
+
+        number = code_to_int(code)
+        if number is None:
+            return None
+        position = bisect_left(self.code_column, number)
+        if position == self.code_count or self._code_at(position) != number:
+            return None
+        _, replacement = CODE_ENTRY.unpack_from(
+            self.buffer, self.codes_start + position * CODE_ENTRY.size
+        )
+        return int_to_code(replacement) if replacement else None
+
+    def is_current(self, code):
+        """True when the code exists and is not obsolete"""
+
+        return self.resolve(code) == (code or "").strip().upper()
+
+    def lookup_term(self, name):
+        """Return the HPO ID for a term name or exact synonym, or None"""
+
+        key = normalize_name(name).encode("utf-8")
+        position = bisect_left(self.name_column, key)
+        if position == self.name_count or self._name_at(position) != key:
+            return None
+        _, number = NAME_ENTRY.unpack_from(self.buffer, self.names_start + position * NAME_ENTRY.size)
+        return int_to_code(number)
+
+    def normalize(self, indication):
+        """Map an HPO ID or term name to a current HPO ID, or None"""
+
+        if code_to_int(indication) is not None:
+            return self.resolve(indication)
+        return self.lookup_term(indication)
+
+
+# open an index, building it from hp.obo when needed
+def load_index(path):
+    """Open hp.idx, or build hp.idx next to hp.obo when it is missing or stale"""
+
+    if path.endswith(".obo"):
+        index_path = os.path.splitext(path)[0] + ".idx"
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(path):
+            build_index(path, index_path)
+        try:
+            return HpoIndex(index_path)
+        except ValueError:
+            # built by an older version
+            build_index(path, index_path)
+        path = index_path
+    return HpoIndex(path)
+
+
+# get args
+def get_args():
+    """Get command line arguments"""
+    parser = argparse.ArgumentParser(description="Build or query a local HPO index")
+    parser.add_argument("-i", "--input", help="Path to hp.obo or hp.idx", type=str, required=True)
+    parser.add_argument(
+        "-o", "--output", help="Path for the built index (default: next to hp.obo)", type=str
+    )
+    parser.add_argument(
+        "-q", "--query", help="Semicolon separated HPO IDs or term names to look up", type=str
+    )
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+
+    if arguments.output:
+        code_total, name_total = build_index(arguments.input, arguments.output)
+        print(f"HPO Index:\t{os.path.abspath(arguments.output)}")
+        print(f"Codes:\t{code_total}")
+        print(f"Names:\t{name_total}")
+        index_file = arguments.output
+    else:
+        index_file = arguments.input
+
+    if arguments.query:
+        with load_index(index_file) as hpo:
+            for entry in arguments.query.strip(";").split(";"):
+                print(f"{entry}:\t{hpo.normalize(entry)}")
@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""Drop-folder ingestion: EHR JSON and case CSV files -> post -> process -> monitor"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Watch an inbox directory and start every EHR JSON/ case CSV dropped into it
+# 1. Inputs: inbox dir, output dir, [optional] config, job queue, workers
+# 2. Outputs: inbox/processing, inbox/done (with <file>.result.json) and inbox/failed (with
+#    <file>.error.txt); parse_ehr/ post_case/ process_case logs per file in the output dir
+# Notes: new files are picked up with inotify on Linux and by polling elsewhere (or with
+#        --polling). *.json files go through parse_ehr, *.csv files through read_case_csv;
+#        a file with an invalid case (case_validation.py) goes to failed/ with the report;
+#        every case becomes a post -> process -> monitor chain in the job queue
+#        (job_queue.py), which this daemon works with its own worker threads. A file moves to
+#        done/ once all of its jobs are done and to failed/ when one fails; cases it already
+#        posted are listed in failed/<file>.result.json (and the error file), so only the
+#        other families need to be dropped again. Hidden files and
+#        *.part/ *.tmp are ignored: write large files elsewhere and move them in.
+##################################################################
+
+import os
+import sys
+import glob
+import time
+import ctypes
+import ctypes.util
+import select
+import signal
+import struct
+import argparse
+import threading
+import traceback
+from datetime import datetime
+import method_tools
+import profile_tools
+import parse_ehr
+import case_mgt_v2
+import case_validation
+import job_queue
+
+HOME = os.environ["HOME"]
+FOLDERS = ("processing", "done", "failed")
+INPUT_TYPES = (".json", ".csv")
+IGNORED_SUFFIXES = (".part", ".tmp", ".swp")
+SINGLETON_WAIT_MINUTES = 330
+PEDIGREE_WAIT_MINUTES = 540
+POLL_SECONDS = 2.0
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Report inbox files whose size and mtime did not change between two scans"""
+
+    mode = "polling"
+
+    def __init__(self, inbox):
+        self.inbox = inbox
+        self.seen = {}
+
+    def ready(self, timeout):
+        """Wait up to timeout seconds; returns the settled files"""
+        time.sleep(timeout)
+        settled = []
+        current = {}
+        for path in inbox_files(self.inbox):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            current[path] = (stat.st_size, stat.st_mtime_ns)
+            if self.seen.get(path) == current[path]:
+                settled.append(path)
+        self.seen = {path: state for path, state in current.items() if path not in settled}
+        return settled
+
+    def close(self):
+        """Nothing to release"""
+
+
+class InotifyWatcher:
+    """Report inbox files as soon as they are closed after writing or moved in (Linux)"""
+
+    mode = "inotify"
+
+    def __init__(self, inbox):
+        self.inbox = inbox
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, inbox.encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {inbox}")
+        # files that were already there
+        self.pending = inbox_files(inbox)
+
+    def ready(self, timeout):
+        """Wait up to timeout seconds for events; returns the new files"""
+        settled, self.pending = self.pending, []
+        if settled:
+            return settled
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0").decode()
+            offset += length
+            path = os.path.join(self.inbox, name)
+            if accepted(name) and os.path.isfile(path) and path not in settled:
+                settled.append(path)
+        return settled
+
+    def close(self):
+        """Close the inotify descriptor"""
+        os.close(self.fd)
+
+
+# inotify where the kernel has it, polling otherwise
+def get_watcher(inbox, polling=False):
+    """InotifyWatcher, or PollingWatcher when inotify is unavailable or polling is set"""
+
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(inbox)
+        except (OSError, AttributeError) as err:
+            print(f"{datetime.now()}\tinotify unavailable ({err}); polling every {POLL_SECONDS} s")
+    return PollingWatcher(inbox)
+
+
+# is this a file the daemon should pick up
+def accepted(name):
+    """False for hidden and partially written files"""
+
+    return not name.startswith(".") and not name.endswith(IGNORED_SUFFIXES)
+
+
+# files in the inbox (not its sub-folders)
+def inbox_files(inbox):
+    """Files waiting in the inbox, oldest first"""
+
+    paths = [
+        entry.path
+        for entry in os.scandir(inbox)
+        if entry.is_file() and accepted(entry.name)
+    ]
+    return sorted(paths, key=os.path.getmtime)
+
+
+# move a file, never overwriting an older one with the same name
+def move(path, folder):
+    """Move path into folder; returns the new path"""
+
+    target = os.path.join(folder, os.path.basename(path))
+    if os.path.exists(target):
+        stem, suffix = os.path.splitext(target)
+        target = f"{stem}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}{suffix}"
+    os.replace(path, target)
+    return target
+
+
+# the case payloads in an input file
+def read_payloads(path, output_dir, config, hpo=None):
+    """EHR JSON -> [case JSON] (parse_ehr), case CSV -> one payload per family"""
+
+    if path.endswith(".json"):
+        case_info = parse_ehr.main(path, output_dir, config)
+        if not case_info:
+            raise ValueError("parse_ehr did not return a case")
+        return [case_info[0]]
+    families = case_mgt_v2.read_case_csv(path, hpo)
+    return [case_mgt_v2.get_payload(subjects) for subjects in families.values()]
+
+
+class Ingester:
+    """Moves inbox files through processing/ into done/ or failed/"""
+
+    def __init__(self, inbox, output_dir, config_file, queue, arguments):
+        self.inbox = inbox
+        self.folders = {name: os.path.join(inbox, name) for name in FOLDERS}
+        for folder in self.folders.values():
+            os.makedirs(folder, exist_ok=True)
+        self.output_dir = output_dir
+        self.config_file = config_file
+        self.config = next(iter(method_tools.load_profiles(config_file).values()))
+        self.queue = queue
+        self.hpo = arguments.hpo
+        self.interval = arguments.interval
+        self.max_attempts = arguments.max_attempts
+
+    def fail(self, path, error, result=None):
+        """Move a file (and its job list) to failed/ next to an error file (and its result)"""
+        target = move(path, self.folders["failed"])
+        if os.path.exists(path + ".jobs"):
+            os.remove(path + ".jobs")
+        if result is not None:
+            with open(target + ".result.json", "w", encoding="utf-8") as result_file:
+                method_tools.json_dump(result, result_file, indent=True)
+        with open(target + ".error.txt", "w", encoding="utf-8") as error_file:
+            error_file.write(error)
+        job_queue.report(os.path.basename(path), f"failed: {error.strip().splitlines()[-1]}")
+
+    def ingest(self, path):
+        """Parse one file and enqueue post -> process -> monitor for each of its cases"""
+        try:
+            arrived = time.time()
+            claimed = move(path, self.folders["processing"])
+        except FileNotFoundError:
+            # picked up twice or removed again
+            return
+        if not claimed.endswith(INPUT_TYPES):
+            self.fail(claimed, "Expected an EHR JSON (*.json) or case CSV (*.csv)\n")
+            return
+        name = os.path.basename(claimed)
+        directory = method_tools.format_path(
+            os.path.join(self.output_dir, f"{os.path.splitext(name)[0]}_{datetime.now().strftime('%Y%m%d%H%M%S')}")
+        )
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with method_tools.TRACER.span("ingest", "ingest", input_file=name):
+                payloads = read_payloads(claimed, directory, self.config, self.hpo)
+        except SystemExit:
+            # the parsers print the error and sys.exit()
+            self.fail(claimed, f"Could not read {name}; see the printed error and the logs in {directory}\n")
+            return
+        except Exception:  # pylint: disable=broad-except
+            self.fail(claimed, traceback.format_exc())
+            return
+
+        # an invalid family fails the whole file before anything is queued
+        labelled = {
+            f"case {position + 1} ({payload.get('displayId') or 'no displayId'})": payload
+            for position, payload in enumerate(payloads)
+        }
+        warnings = {}
+        report = case_validation.validate_payloads(labelled, warnings)
+        for label, messages in warnings.items():
+            for message in messages:
+                job_queue.report(name, f"[WARNING] {label}: {message}")
+        if report:
+            self.fail(claimed, "\n".join(case_validation.format_report(report, len(labelled))) + "\n")
+            return
+
+        # all of a file's jobs commit together, after its job list is written: a crash leaves
+        # either no jobs or a job list that resume() checks against the queue
+        options = {"config_file": self.config_file, "max_attempts": self.max_attempts}
+        chains = []
+        with self.queue.transaction():
+            for payload in payloads:
+                wait_time = SINGLETON_WAIT_MINUTES if len(payload["subjects"]) == 1 else PEDIGREE_WAIT_MINUTES
+                post = self.queue.enqueue("post", {"payload": payload, "output_dir": directory}, **options)
+                guid = {"$job": post, "key": "case_guid"}
+                process = self.queue.enqueue("process", {"case_guid": guid, "output_dir": directory}, **options)
+                watch = self.queue.enqueue(
+                    "monitor", {"case_guid": guid, "wait_time": wait_time, "interval": self.interval}, **options
+                )
+                chains.append({"post": post, "process": process, "monitor": watch})
+            with open(claimed + ".jobs.tmp", "w", encoding="utf-8") as jobs_file:
+                method_tools.json_dump({"arrived": arrived, "output_dir": directory, "chains": chains}, jobs_file)
+            os.replace(claimed + ".jobs.tmp", claimed + ".jobs")
+        job_queue.report(name, f"{len(chains)} case(s) queued, output in {directory}")
+
+    def settle(self):
+        """Move processing files whose jobs all finished to done/ or failed/; returns files left"""
+        left = 0
+        for jobs_path in glob.glob(os.path.join(self.folders["processing"], "*.jobs")):
+            path = jobs_path[: -len(".jobs")]
+            with open(jobs_path, "r", encoding="utf-8") as jobs_file:
+                tracking = method_tools.json_load(jobs_file)
+            job_ids = [job_id for chain in tracking["chains"] for job_id in chain.values()]
+            jobs = {job["id"]: job for job in self.queue.jobs(job_ids=job_ids, limit=len(job_ids))}
+            states = {jobs[job_id]["state"] if job_id in jobs else "failed" for job_id in job_ids}
+            if states & {"queued", "running"}:
+                left += 1
+                continue
+            if states != {"done"}:
+                errors = [
+                    f"job {job_id} {jobs[job_id]['kind']} {jobs[job_id]['state']}: {jobs[job_id]['error']}"
+                    for job_id in job_ids
+                    if job_id in jobs and jobs[job_id]["state"] != "done"
+                ]
+                # cases that were posted exist on the server: record them so they are not re-posted
+                created = []
+                for chain in tracking["chains"]:
+                    post = jobs.get(chain["post"])
+                    if post and post["state"] == "done":
+                        steps = {step: jobs[job_id]["state"] if job_id in jobs else "missing"
+                                 for step, job_id in chain.items()}
+                        created.append({**method_tools.json_loads(post["result"]), "jobs": steps})
+                if created:
+                    errors.insert(
+                        0,
+                        "already posted (drop only the other cases again): "
+                        + ", ".join(case["display_id"] for case in created)
+                    )
+                self.fail(
+                    path,
+                    "\n".join(errors or ["jobs missing from the queue"]) + "\n",
+                    {"output_dir": tracking["output_dir"], "cases": created} if created else None,
+                )
+                continue
+            cases = []
+            for chain in tracking["chains"]:
+                post, process, watch = (jobs[chain[step]] for step in ("post", "process", "monitor"))
+                result = method_tools.json_loads(post["result"])
+                cases.append(
+                    {
+                        **result,
+                        "status": method_tools.json_loads(watch["result"]).get("status"),
+                        "seconds_to_processing": round(process["finished"] - tracking["arrived"], 1),
+                    }
+                )
+            target = move(path, self.folders["done"])
+            os.remove(jobs_path)
+            with open(target + ".result.json", "w", encoding="utf-8") as result_file:
+                method_tools.json_dump({"output_dir": tracking["output_dir"], "cases": cases}, result_file, indent=True)
+            job_queue.report(os.path.basename(path), f"done: {', '.join(case['display_id'] for case in cases)}")
+        return left
+
+    def queued(self, jobs_path):
+        """True when the jobs in a job list were committed to the queue"""
+        with open(jobs_path, "r", encoding="utf-8") as jobs_file:
+            tracking = method_tools.json_load(jobs_file)
+        posts = [chain["post"] for chain in tracking["chains"]]
+        jobs = self.queue.jobs(job_ids=posts, limit=len(posts)) if posts else []
+        return len(jobs) == len(posts) and all(
+            job["kind"] == "post" and method_tools.json_loads(job["args"])["output_dir"] == tracking["output_dir"]
+            for job in jobs
+        )
+
+    def resume(self):
+        """Files claimed before a crash but never queued go back to the inbox"""
+        for path in glob.glob(os.path.join(self.folders["processing"], "*")):
+            if path.endswith(".jobs.tmp"):
+                os.remove(path)
+                continue
+            if path.endswith(".jobs"):
+                continue
+            if os.path.exists(path + ".jobs"):
+                if self.queued(path + ".jobs"):
+                    continue
+                os.remove(path + ".jobs")
+            move(path, self.inbox)
+
+
+# get args
+def get_args():
+    """Get command line arguments"""
+    parser = argparse.ArgumentParser(description="Drop-folder ingestion of EHR JSON and case CSV files")
+    parser.add_argument("-i", "--inbox", help="Directory to watch", type=str, required=True)
+    parser.add_argument(
+        "-o", "--output_dir", help="Per-file logs and case JSONs are written under this dir", type=str, required=True
+    )
+    parser.add_argument(
+        "-c",
+        "--config_file",
+        help="TSS CLI config file or profile name (default ~/.illumina/uploader-config.json)",
+        type=str,
+        default=f"{HOME}/.illumina/uploader-config.json",
+    )
+    parser.add_argument(
+        "-q",
+        "--queue",
+        help=f"Job queue database (default: {job_queue.QUEUE_FILE})",
+        type=str,
+        default=job_queue.QUEUE_FILE,
+    )
+    parser.add_argument(
+        "-p",
+        "--workers",
+        help=f"Worker threads (default: {method_tools.MAX_WORKERS})",
+        type=int,
+        default=method_tools.MAX_WORKERS,
+    )
+    parser.add_argument(
+        "-n", "--interval", help="Minutes between case status checks (default: 5)", type=float, default=5
+    )
+    parser.add_argument(
+        "--max_attempts",
+        help=f"Attempts per job (default: {job_queue.MAX_ATTEMPTS})",
+        type=int,
+        default=job_queue.MAX_ATTEMPTS,
+    )
+    parser.add_argument("--hpo", help="HPO index for case CSVs (see hpo_index.py)", type=str, default=None)
+    parser.add_argument(
+        "--polling", help=f"Scan the inbox every {POLL_SECONDS} s instead of using inotify", action="store_true"
+    )
+    parser.add_argument(
+        "--once", help="Ingest the files already in the inbox, wait for their jobs and exit", action="store_true"
+    )
+    method_tools.add_logging_args(parser)
+    method_tools.add_metrics_args(parser)
+    method_tools.add_tracing_args(parser)
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
+    method_tools.set_logging(arguments)
+    method_tools.set_tracing(arguments, "ingest_daemon")
+
+    inbox_dir = os.path.abspath(os.path.expanduser(arguments.inbox))
+    method_tools.check_path(inbox_dir)
+    ingester = Ingester(
+        inbox_dir,
+        os.path.abspath(os.path.expanduser(arguments.output_dir)),
+        arguments.config_file,
+        job_queue.JobQueue(arguments.queue),
+        arguments,
+    )
+    ingester.resume()
+
+    # logging
+    print(f"{datetime.now()}\tInbox:\t{inbox_dir}")
+    print(f"{datetime.now()}\tOutput Directory:\t{ingester.output_dir}")
+    print(f"{datetime.now()}\tQueue:\t{ingester.queue.path}")
+
+    stop = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: stop.set())
+
+    if arguments.once:
+        method_tools.run_concurrently(ingester.ingest, inbox_files(inbox_dir))
+        job_queue.work(ingester.queue, arguments.workers, {}, stop=stop)
+        ingester.settle()
+        sys.exit()
+
+    watcher = get_watcher(inbox_dir, arguments.polling)
+    print(f"{datetime.now()}\tWatching the inbox ({watcher.mode})")
+    workers = threading.Thread(
+        target=job_queue.work,
+        args=(ingester.queue, arguments.workers, {}),
+        kwargs={"forever": True, "stop": stop},
+        name="job-workers",
+    )
+    workers.start()
+    while not stop.is_set():
+        arrivals = watcher.ready(POLL_SECONDS)
+        if arrivals:
+            method_tools.run_concurrently(ingester.ingest, arrivals)
+        ingester.settle()
+    print(f"{datetime.now()}\tStopping: running jobs finish, queued jobs stay queued")
+    watcher.close()
+    workers.join()
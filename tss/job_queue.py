@@ -0,0 +1,829 @@
+#!/usr/bin/env python3
+"""Durable SQLite job queue and worker pool for TSS operations"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Enqueue TSS operations as jobs and drain them with a worker pool
+# 1. Inputs: enqueue (case CSV, case GUIDs or a case JSON), work, status, retry, cancel
+# 2. Outputs: ~/.illumina/tss_jobs.db (jobs, dependencies, attempts, results, errors),
+#    the usual post_case/ process_case logs and downloaded reports in the output dir
+# Notes: job kinds: post, process, update, delete, qc, download, monitor; "-k case" enqueues
+#        post -> process -> monitor -> download per family. A job runs once all of its
+#        dependencies are done; when one fails its dependents are cancelled. Job arguments
+#        can take a value from a dependency's result ({"$job": id, "key": name}).
+#        Failed jobs are retried with exponential backoff up to --max_attempts; monitor jobs
+#        check once and reschedule themselves instead of holding a worker. Running jobs
+#        hold a lease that their worker renews while they run, so only jobs of a crashed
+#        worker are queued again. The database holds case
+#        payloads (PHI): it is created with mode 0600 and a done post/ update job's payload
+#        is cleared.
+##################################################################
+
+import os
+import sys
+import csv
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import traceback
+from datetime import datetime
+from contextlib import contextmanager
+import method_tools
+import profile_tools
+import case_mgt_v2
+import case_model
+import case_validation
+import monitor_progress
+import download_reports
+
+HOME = os.environ["HOME"]
+QUEUE_FILE = f"{method_tools.PROFILE_DIR}/tss_jobs.db"
+JOB_KINDS = ["post", "process", "update", "delete", "qc", "download", "monitor"]
+STATES = ["queued", "running", "done", "failed", "cancelled"]
+MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 30
+LEASE_SECONDS = 900
+HEARTBEAT_SECONDS = LEASE_SECONDS // 3
+POLL_SECONDS = 1.0
+ERROR_CHARS = 2000
+# arguments with PHI, cleared once the job is done
+SCRUBBED_ARGS = {"post": ("payload",), "update": ("input_json",)}
+PRINT_LOCK = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    config_file TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS deps (
+    job_id INTEGER NOT NULL REFERENCES jobs(id),
+    depends_on INTEGER NOT NULL REFERENCES jobs(id),
+    PRIMARY KEY (job_id, depends_on)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, not_before);
+CREATE INDEX IF NOT EXISTS deps_depends_on ON deps (depends_on);
+"""
+
+
+class Reschedule(Exception):
+    """Raised by a job that is not finished yet: run it again after delay seconds"""
+
+    def __init__(self, delay, progress):
+        super().__init__(f"rescheduled in {delay} s")
+        self.delay = delay
+        self.progress = progress
+
+
+class JobFailed(Exception):
+    """Raised by a job that must not be retried"""
+
+
+class JobQueue:
+    """Jobs and dependencies in SQLite (WAL); one connection per thread"""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # owner only; SQLite gives the -wal and -shm files the same mode
+        os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(self.path, 0o600)
+        self.local = threading.local()
+        self.db().executescript(SCHEMA)
+
+    def db(self):
+        """This thread's connection"""
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT: one writer at a time across processes
+
+        A nested block joins the outer transaction, so several enqueue() calls commit together.
+        """
+        connection = self.db()
+        if connection.in_transaction:
+            yield connection
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def enqueue(self, kind, args, config_file, depends_on=(), max_attempts=MAX_ATTEMPTS):
+        """Add a job; jobs referenced in args become dependencies too. Returns its id"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        depends_on = sorted(set(depends_on) | job_references(args))
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "INSERT INTO jobs (kind, args, config_file, max_attempts, created) VALUES (?, ?, ?, ?, ?)",
+                (kind, method_tools.json_dumps(args), config_file, max_attempts, time.time()),
+            )
+            job_id = cursor.lastrowid
+            for parent in depends_on:
+                if not connection.execute("SELECT 1 FROM jobs WHERE id = ?", (parent,)).fetchone():
+                    raise ValueError(f"Unknown dependency: job {parent}")
+                connection.execute(
+                    "INSERT OR IGNORE INTO deps (job_id, depends_on) VALUES (?, ?)", (job_id, parent)
+                )
+        return job_id
+
+    @staticmethod
+    def cancel_orphans(connection):
+        """Cancel queued jobs whose dependencies failed or were cancelled"""
+        while connection.execute(
+            """UPDATE jobs SET state = 'cancelled', finished = ?, error = 'dependency failed'
+               WHERE state = 'queued' AND EXISTS (
+                   SELECT 1 FROM deps JOIN jobs AS parent ON parent.id = deps.depends_on
+                   WHERE deps.job_id = jobs.id AND parent.state IN ('failed', 'cancelled'))""",
+            (time.time(),),
+        ).rowcount:
+            pass
+
+    @staticmethod
+    def release(connection, condition, params=()):
+        """Queue running jobs matching condition again (or fail them when out of attempts)"""
+        connection.execute(
+            f"""UPDATE jobs SET
+                   state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                   error = 'worker lost', worker = NULL, lease_until = NULL
+               WHERE state = 'running' AND {condition}""",
+            params,
+        )
+
+    def recover(self, host):
+        """Queue the running jobs of dead workers on this host again"""
+        with self.transaction() as connection:
+            for row in connection.execute(
+                "SELECT DISTINCT worker FROM jobs WHERE state = 'running' AND worker LIKE ?", (f"{host}:%",)
+            ).fetchall():
+                if not pid_alive(int(row["worker"].rsplit(":", 2)[1])):
+                    self.release(connection, "worker = ?", (row["worker"],))
+
+    def claim(self, worker, limits):
+        """Mark the next runnable job running; returns it with its dependencies' results"""
+        now = time.time()
+        with self.transaction() as connection:
+            self.release(connection, "lease_until < ?", (now,))
+            self.cancel_orphans(connection)
+            running = dict(
+                connection.execute(
+                    "SELECT kind, COUNT(*) FROM jobs WHERE state = 'running' GROUP BY kind"
+                ).fetchall()
+            )
+            full = [kind for kind, limit in limits.items() if running.get(kind, 0) >= limit]
+            row = connection.execute(
+                f"""SELECT * FROM jobs WHERE state = 'queued' AND not_before <= ?
+                       AND kind NOT IN ({",".join("?" * len(full))})
+                       AND NOT EXISTS (
+                           SELECT 1 FROM deps JOIN jobs AS parent ON parent.id = deps.depends_on
+                           WHERE deps.job_id = jobs.id AND parent.state != 'done')
+                   ORDER BY not_before, id LIMIT 1""",
+                (now, *full),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                """UPDATE jobs SET state = 'running', worker = ?, started = ?, lease_until = ?,
+                       attempts = attempts + 1 WHERE id = ?""",
+                (worker, now, now + LEASE_SECONDS, row["id"]),
+            )
+            results = {
+                parent["id"]: method_tools.json_loads(parent["result"] or "null")
+                for parent in connection.execute(
+                    """SELECT jobs.id, jobs.result FROM deps JOIN jobs ON jobs.id = deps.depends_on
+                       WHERE deps.job_id = ?""",
+                    (row["id"],),
+                ).fetchall()
+            }
+        job = dict(row)
+        job["attempts"] += 1
+        job["worker"] = worker
+        job["args"] = method_tools.json_loads(job["args"])
+        job["result"] = method_tools.json_loads(job["result"]) if job["result"] else None
+        job["dependency_results"] = results
+        return job
+
+    def renew(self, job):
+        """Extend a running job's lease; False once the job is no longer this worker's"""
+        with self.transaction() as connection:
+            return connection.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND state = 'running' AND worker = ?",
+                (time.time() + LEASE_SECONDS, job["id"], job["worker"]),
+            ).rowcount == 1
+
+    def finish(self, job, result):
+        """Store a done job's result and clear its SCRUBBED_ARGS"""
+        args = job["args"] if isinstance(job["args"], dict) else method_tools.json_loads(job["args"])
+        args = {key: None if key in SCRUBBED_ARGS.get(job["kind"], ()) else value
+                for key, value in args.items()}
+        with self.transaction() as connection:
+            connection.execute(
+                """UPDATE jobs SET state = 'done', finished = ?, result = ?, error = NULL,
+                       lease_until = NULL, args = ? WHERE id = ?""",
+                (time.time(), method_tools.json_dumps(result), method_tools.json_dumps(args), job["id"]),
+            )
+
+    def fail(self, job, error, retry=True):
+        """Retry with backoff, or mark failed when out of attempts"""
+        retry = retry and job["attempts"] < job["max_attempts"]
+        with self.transaction() as connection:
+            connection.execute(
+                """UPDATE jobs SET state = ?, not_before = ?, finished = ?, error = ?,
+                       lease_until = NULL WHERE id = ?""",
+                (
+                    "queued" if retry else "failed",
+                    time.time() + RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1) if retry else 0,
+                    None if retry else time.time(),
+                    error[-ERROR_CHARS:],
+                    job["id"],
+                ),
+            )
+            self.cancel_orphans(connection)
+        return retry
+
+    def reschedule(self, job, delay, progress):
+        """Run again after delay seconds without using up an attempt"""
+        with self.transaction() as connection:
+            connection.execute(
+                """UPDATE jobs SET state = 'queued', not_before = ?, attempts = attempts - 1,
+                       result = ?, lease_until = NULL WHERE id = ?""",
+                (time.time() + delay, method_tools.json_dumps(progress), job["id"]),
+            )
+
+    def pending(self):
+        """Number of queued and running jobs"""
+        return self.db().execute(
+            "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')"
+        ).fetchone()[0]
+
+    def retry(self, job_ids=None):
+        """Queue failed (or the given) jobs and all cancelled jobs again"""
+        with self.transaction() as connection:
+            if job_ids:
+                marks = ",".join("?" * len(job_ids))
+                condition, params = f"id IN ({marks}) AND state IN ('failed', 'cancelled')", job_ids
+            else:
+                condition, params = "state = 'failed'", []
+            count = connection.execute(
+                f"""UPDATE jobs SET state = 'queued', attempts = 0, not_before = 0, error = NULL,
+                       finished = NULL WHERE {condition}""",
+                params,
+            ).rowcount
+            count += connection.execute(
+                """UPDATE jobs SET state = 'queued', not_before = 0, error = NULL, finished = NULL
+                   WHERE state = 'cancelled' AND error = 'dependency failed'"""
+            ).rowcount
+            self.cancel_orphans(connection)
+        return count
+
+    def cancel(self, job_ids):
+        """Cancel queued jobs (and, through their dependencies, their dependents)"""
+        marks = ",".join("?" * len(job_ids))
+        with self.transaction() as connection:
+            count = connection.execute(
+                f"""UPDATE jobs SET state = 'cancelled', finished = ?, error = 'cancelled'
+                   WHERE id IN ({marks}) AND state = 'queued'""",
+                (time.time(), *job_ids),
+            ).rowcount
+            self.cancel_orphans(connection)
+        return count
+
+    def counts(self):
+        """{kind: {state: count}}"""
+        counts = {}
+        for row in self.db().execute("SELECT kind, state, COUNT(*) AS n FROM jobs GROUP BY kind, state"):
+            counts.setdefault(row["kind"], {})[row["state"]] = row["n"]
+        return counts
+
+    def jobs(self, state=None, job_ids=None, limit=50):
+        """Job rows, newest first"""
+        query, params = "SELECT * FROM jobs", []
+        if job_ids:
+            query += f" WHERE id IN ({','.join('?' * len(job_ids))})"
+            params = list(job_ids)
+        elif state:
+            query += " WHERE state = ?"
+            params = [state]
+        query += " ORDER BY id DESC LIMIT ?"
+        return [dict(row) for row in self.db().execute(query, (*params, limit))]
+
+
+# is a worker process still alive
+def pid_alive(pid):
+    """True when a process with pid exists"""
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# job IDs referenced by {"$job": id, "key": name} values
+def job_references(value):
+    """Set of job IDs referenced anywhere in value"""
+
+    if isinstance(value, dict):
+        if "$job" in value:
+            return {value["$job"]}
+        return set().union(*(job_references(item) for item in value.values()))
+    if isinstance(value, list):
+        return set().union(*(job_references(item) for item in value))
+    return set()
+
+
+# {"$job": id, "key": name} -> that dependency's result[name]
+def resolve_args(value, results):
+    """Replace dependency references with the values from their results"""
+
+    if isinstance(value, dict):
+        if "$job" in value:
+            result = results.get(value["$job"]) or {}
+            if value.get("key") not in result:
+                raise JobFailed(f"Job {value['$job']} result has no {value.get('key')}")
+            return result[value["key"]]
+        return {key: resolve_args(item, results) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_args(item, results) for item in value]
+    return value
+
+
+# client errors will not go away on a retry
+def check_response(response, expected, label):
+    """Raise JobFailed on 4xx (but 429), RuntimeError on other unexpected codes"""
+
+    if response.status_code in expected:
+        return
+    message = f"{label} {response.status_code}: {response.text}"
+    if 400 <= response.status_code < 500 and response.status_code != 429:
+        raise JobFailed(message)
+    raise RuntimeError(message)
+
+
+# job kinds
+def run_post(job, args, config):
+    """POST a case payload (4xx: not retried)
+
+    A POST is not idempotent: a retry first adopts a case the earlier attempt created
+    (looked up by displayId), and a payload without a displayId is never retried.
+    """
+    directory = method_tools.format_path(os.path.abspath(args["output_dir"]))
+    display_id = args["payload"].get("displayId")
+    with method_tools.JsonLog(directory + "post_case.log") as logfile:
+        if job["attempts"] > 1 and not display_id:
+            raise JobFailed("An earlier attempt may have created the case and it has no displayId to check")
+        if job["attempts"] > 1:
+            errors = {}
+            case_guid = case_mgt_v2.get_case_ids([display_id], config, errors=errors)[display_id]
+            if errors:
+                raise RuntimeError(errors[display_id])
+            if case_guid:
+                logfile.info("Case created by an earlier attempt", display_id=display_id, case_guid=case_guid)
+                return {"case_guid": case_guid, "display_id": display_id}
+        logfile.payload("post_case payload", args["payload"])
+        try:
+            response = case_mgt_v2.create_case(args["payload"], config)
+            if response.status_code != 201:
+                logfile.error("Case ingestion failed", status_code=response.status_code, response=response.text)
+            check_response(response, (201,), "POST case")
+        except (RuntimeError, method_tools.RequestException) as err:
+            if not display_id:
+                raise JobFailed(f"{err} (no displayId to check for a created case; not retried)") from err
+            raise
+        results = method_tools.response_json(response)
+        logfile.info("Case created", display_id=results["displayId"], case_guid=results["id"])
+    return {"case_guid": results["id"], "display_id": results["displayId"]}
+
+
+def run_process(job, args, config):
+    """Start secondary analysis (4xx: not retried)"""
+    directory = method_tools.format_path(os.path.abspath(args["output_dir"]))
+    with method_tools.JsonLog(directory + "process_case.log") as logfile:
+        response = case_mgt_v2.start_processing(args["case_guid"], config)
+        if response.status_code != 200:
+            logfile.error("Case processing failed", status_code=response.status_code, response=response.text)
+        check_response(response, (200,), "POST process")
+        logfile.info("Case is now processing", case_guid=args["case_guid"])
+    return {"case_guid": args["case_guid"]}
+
+
+def run_update(job, args, config):
+    """Merge a case JSON into the server copy and PUT it"""
+    server_copy = case_mgt_v2.get_case(args["case_guid"], config)
+    error = case_mgt_v2.check_case_editable(server_copy)
+    if error:
+        raise JobFailed(error)
+    data = case_mgt_v2.modify_case_json(server_copy, args["input_json"])
+    response = case_mgt_v2.put_case(args["case_guid"], data, config)
+    check_response(response, (200,), "PUT")
+    return {"case_guid": args["case_guid"]}
+
+
+def run_delete(job, args, config):
+    """Delete a case (404: already gone)"""
+    response = case_mgt_v2.delete_case(args["case_guid"], config)
+    check_response(response, (204, 404), "DELETE")
+    return {"case_guid": args["case_guid"], "status_code": response.status_code}
+
+
+def run_qc(job, args, config):
+    """QC override or QC modify"""
+    response = case_mgt_v2.post_qc_action(args["case_guid"], args["action"], config)
+    check_response(response, (200,), f"QC {args['action']}")
+    return {"case_guid": args["case_guid"], "action": args["action"]}
+
+
+def run_download(job, args, config):
+    """Download the proband's PDF and JSON reports"""
+    directory = method_tools.format_path(os.path.abspath(args["output_dir"]))
+    with method_tools.JsonLog(directory + "download_reports.log") as log:
+        config_path = method_tools.resolve_profile(job["config_file"])[1]
+        paths = download_reports.download_case_reports(config_path, args["case_guid"], directory, log)
+    if not paths:
+        raise RuntimeError("No reports were downloaded; see download_reports.log")
+    return {"case_guid": args["case_guid"], "files": paths}
+
+
+def run_monitor(job, args, config):
+    """Check the case status once; reschedule until it stops processing or time runs out"""
+    progress = job["result"] or {"first_check": time.time()}
+    record = case_model.CaseRecord.from_json(case_mgt_v2.get_case(args["case_guid"], config))
+    status = record.status_label
+    if status in monitor_progress.EXIT_STATUS or record.status in ["New", "Complete"]:
+        return {"case_guid": args["case_guid"], "status": status}
+    if time.time() - progress["first_check"] > args["wait_time"] * 60:
+        raise JobFailed(f"Still {status} after {args['wait_time']} minutes")
+    raise Reschedule(args["interval"] * 60, {**progress, "status": status})
+
+
+JOB_FUNCTIONS = {
+    "post": run_post,
+    "process": run_process,
+    "update": run_update,
+    "delete": run_delete,
+    "qc": run_qc,
+    "download": run_download,
+    "monitor": run_monitor,
+}
+
+
+class Configs:
+    """Parsed TSS configs by config file/ profile name, shared by the workers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.configs = {}
+
+    def get(self, config_file):
+        """Parse a config once per worker process"""
+        with self.lock:
+            if config_file not in self.configs:
+                self.configs[config_file] = next(iter(method_tools.load_profiles(config_file).values()))
+            return self.configs[config_file]
+
+
+# one status line per job event; worker threads print whole lines
+def report(name, message):
+    """Print a timestamped job status line"""
+
+    with PRINT_LOCK:
+        print(f"{datetime.now()}\t{name}\t{message}", flush=True)
+
+
+# keep a long job's lease from running out
+@contextmanager
+def heartbeat(queue, job, interval=HEARTBEAT_SECONDS):
+    """Renew the job's lease every interval seconds while the block runs"""
+
+    done = threading.Event()
+
+    def beat():
+        while not done.wait(interval):
+            try:
+                queue.renew(job)
+            except sqlite3.Error:
+                pass  # database busy: the next beat tries again
+
+    thread = threading.Thread(target=beat, name=f"job-{job['id']}-lease", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+# run one claimed job
+def run_job(queue, job, configs):
+    """Run a job and record done/ retry/ failed/ rescheduled"""
+
+    name = f"job {job['id']} {job['kind']} (attempt {job['attempts']}/{job['max_attempts']})"
+    with method_tools.TRACER.span(f"job {job['kind']}", "job", job_id=job["id"]) as span, heartbeat(queue, job):
+        try:
+            config = configs.get(job["config_file"])
+            args = resolve_args(job["args"], job["dependency_results"])
+            result = JOB_FUNCTIONS[job["kind"]](job, args, config)
+        except Reschedule as pending:
+            queue.reschedule(job, pending.delay, pending.progress)
+            span["state"] = "rescheduled"
+            report(name, f"{pending.progress.get('status')}, next check in {pending.delay} s")
+            return
+        except JobFailed as err:
+            queue.fail(job, str(err), retry=False)
+            span["state"] = "failed"
+            report(name, f"failed: {err}")
+            return
+        except SystemExit:
+            # the case_mgt_v2 helpers print the error and sys.exit()
+            error = "exited; see the printed error and the logs in the output dir"
+        except Exception:  # pylint: disable=broad-except
+            error = traceback.format_exc()
+        else:
+            queue.finish(job, result)
+            span["state"] = "done"
+            report(name, "done")
+            return
+    retried = queue.fail(job, error)
+    report(name, f"{'will retry' if retried else 'failed'}: {error.strip().splitlines()[-1]}")
+
+
+# drain the queue with a pool of worker threads
+def work(queue, workers, limits, forever=False, poll=POLL_SECONDS, stop=None):
+    """Run jobs until the queue is empty (or forever); SIGINT or setting stop ends claiming"""
+
+    host = socket.gethostname()
+    worker = f"{host}:{os.getpid()}"
+    queue.recover(host)
+    configs = Configs()
+    stop = stop or threading.Event()
+
+    def loop(index):
+        while not stop.is_set():
+            job = queue.claim(f"{worker}:{index}", limits)
+            if job is None:
+                if not forever and not queue.pending():
+                    return
+                stop.wait(poll)
+                continue
+            run_job(queue, job, configs)
+
+    threads = [threading.Thread(target=loop, args=(index,), name=f"job-worker-{index}") for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        print(f"{datetime.now()}\tStopping: running jobs finish, queued jobs stay queued")
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+# read case GUIDs from -g or the first column of a CSV (header skipped)
+def read_case_guids(case_guid, input_file):
+    """Case GUIDs from a comma separated string or a CSV file"""
+
+    if case_guid:
+        return [guid.strip() for guid in case_guid.split(",") if guid.strip()]
+    method_tools.check_path(input_file)
+    with open(input_file, "r", encoding="utf-8", newline="") as file:
+        rows = list(csv.reader(file))[1:]
+    return [row[0].strip() for row in rows if row and row[0].strip()]
+
+
+# enqueue jobs from the command line
+def enqueue_jobs(queue, arguments):
+    """Enqueue the jobs of one command line; returns the new job IDs"""
+
+    output_dir = os.path.abspath(os.path.expanduser(arguments.output_dir))
+    os.makedirs(output_dir, exist_ok=True)
+    options = {"config_file": arguments.config_file, "max_attempts": arguments.max_attempts}
+    depends_on = [int(job_id) for job_id in (arguments.depends_on or "").split(",") if job_id.strip()]
+    monitor = {"wait_time": arguments.wait_time, "interval": arguments.interval}
+    job_ids = []
+
+    if arguments.kind in ("post", "case"):
+        if not arguments.input_file:
+            print("[ERROR] post/ case jobs need a case CSV (-i/ --input_file)")
+            sys.exit()
+        families = case_mgt_v2.read_case_csv(arguments.input_file, arguments.hpo)
+        payloads = {family_id: case_mgt_v2.get_payload(subjects) for family_id, subjects in families.items()}
+        # validate every family before anything is queued
+        case_validation.check_payloads(payloads)
+        # all chains commit together: an interrupted enqueue leaves no partial chains
+        with queue.transaction():
+            for payload in payloads.values():
+                post = queue.enqueue(
+                    "post", {"payload": payload, "output_dir": output_dir}, depends_on=depends_on, **options
+                )
+                job_ids.append(post)
+                if arguments.kind == "case":
+                    guid = {"$job": post, "key": "case_guid"}
+                    process = queue.enqueue(
+                        "process", {"case_guid": guid, "output_dir": output_dir}, depends_on=[post], **options
+                    )
+                    watch = queue.enqueue(
+                        "monitor", {"case_guid": guid, **monitor}, depends_on=[process], **options
+                    )
+                    download = queue.enqueue(
+                        "download", {"case_guid": guid, "output_dir": output_dir}, depends_on=[watch], **options
+                    )
+                    job_ids += [process, watch, download]
+        return job_ids
+
+    if not arguments.case_guid and not arguments.input_file:
+        print(f"[ERROR] {arguments.kind} jobs need case GUIDs (-g/ --case_guid or -i/ --input_file)")
+        sys.exit()
+    extra = {"output_dir": output_dir}
+    if arguments.kind == "monitor":
+        extra = monitor
+    elif arguments.kind == "qc":
+        extra = {"action": arguments.qc_action}
+    elif arguments.kind == "update":
+        if not arguments.input_json:
+            print("[ERROR] update jobs need a case JSON (-j/ --input_json)")
+            sys.exit()
+        with open(arguments.input_json, "r", encoding="utf-8") as file:
+            extra = {"input_json": method_tools.json_load(file)}
+    elif arguments.kind == "delete":
+        extra = {}
+    for guid in read_case_guids(arguments.case_guid, arguments.input_file):
+        job_ids.append(queue.enqueue(arguments.kind, {"case_guid": guid, **extra}, depends_on=depends_on, **options))
+    return job_ids
+
+
+# status table
+def print_status(queue, arguments):
+    """Counts per kind and state, then the failed (or selected) jobs"""
+
+    if arguments.job_ids:
+        for job in queue.jobs(job_ids=arguments.job_ids):
+            print(method_tools.json_dumps({**job, "args": method_tools.json_loads(job["args"])}, indent=True))
+        return
+    counts = queue.counts()
+    print(f"Queue:\t{queue.path}")
+    print(f"{'kind':<10}" + "".join(f"{state:>11}" for state in STATES))
+    for kind in JOB_KINDS:
+        if kind in counts:
+            print(f"{kind:<10}" + "".join(f"{counts[kind].get(state, 0):>11}" for state in STATES))
+    failed = queue.jobs(state="failed", limit=arguments.limit)
+    if failed:
+        print("\nFailed jobs:")
+    for job in failed:
+        error = (job["error"] or "").strip().splitlines() or [""]
+        print(f"{job['id']:>8}  {job['kind']:<9}{job['attempts']} attempt(s)  {error[-1][:100]}")
+
+
+# get args
+def get_args():
+    """Get command line arguments"""
+    parser = argparse.ArgumentParser(description="SQLite job queue and worker pool for TSS operations")
+    parser.add_argument(
+        "action",
+        choices=["enqueue", "work", "status", "retry", "cancel"],
+        help="enqueue jobs, work (drain the queue), status, retry failed jobs or cancel queued jobs",
+    )
+    parser.add_argument(
+        "-q",
+        "--queue",
+        help=f"Queue database (default: {QUEUE_FILE})",
+        type=str,
+        default=QUEUE_FILE,
+    )
+    parser.add_argument(
+        "-k",
+        "--kind",
+        choices=JOB_KINDS + ["case"],
+        help="enqueue: job kind; case = post -> process -> monitor -> download per family",
+    )
+    parser.add_argument("-i", "--input_file", help="Case CSV (post/ case) or CSV of case GUIDs", type=str)
+    parser.add_argument("-g", "--case_guid", help="Comma separated case GUIDs", type=str)
+    parser.add_argument("-j", "--input_json", help="update: case JSON merged into each case", type=str)
+    parser.add_argument(
+        "-a",
+        "--qc_action",
+        help="qc: QC action (default: override)",
+        choices=["override", "modify"],
+        default="override",
+    )
+    parser.add_argument("--hpo", help="HPO index for the case CSV (see hpo_index.py)", type=str, default=None)
+    parser.add_argument(
+        "-c",
+        "--config_file",
+        help="TSS CLI config file or profile name (default ~/.illumina/uploader-config.json)",
+        type=str,
+        default=f"{HOME}/.illumina/uploader-config.json",
+    )
+    parser.add_argument(
+        "-o", "--output_dir", help="Logs and reports of the jobs (default: current dir)", type=str, default="."
+    )
+    parser.add_argument("-d", "--depends_on", help="Comma separated job IDs the new jobs wait for", type=str)
+    parser.add_argument(
+        "--max_attempts", help=f"Attempts per job (default: {MAX_ATTEMPTS})", type=int, default=MAX_ATTEMPTS
+    )
+    parser.add_argument(
+        "-w", "--wait_time", help="monitor: minutes to wait in total (default: 330)", type=float, default=330
+    )
+    parser.add_argument(
+        "-n", "--interval", help="monitor: minutes between status checks (default: 5)", type=float, default=5
+    )
+    parser.add_argument(
+        "-p",
+        "--workers",
+        help=f"work: worker threads (default: {method_tools.MAX_WORKERS})",
+        type=int,
+        default=method_tools.MAX_WORKERS,
+    )
+    parser.add_argument(
+        "-l",
+        "--limits",
+        help="work: comma separated per-kind concurrency limits (e.g. download=2,post=4)",
+        type=str,
+        default="",
+    )
+    parser.add_argument(
+        "--forever", help="work: keep polling when the queue is empty", action="store_true"
+    )
+    parser.add_argument(
+        "--job_ids", help="status/ retry/ cancel: comma separated job IDs", type=str, default=None
+    )
+    parser.add_argument(
+        "--limit", help="status: failed jobs to list (default: 20)", type=int, default=20
+    )
+    method_tools.add_metrics_args(parser)
+    method_tools.add_tracing_args(parser)
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    args.job_ids = [int(job_id) for job_id in args.job_ids.split(",") if job_id.strip()] if args.job_ids else []
+    return args
+
+
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    job_queue = JobQueue(arguments.queue)
+
+    if arguments.action == "enqueue":
+        if not arguments.kind:
+            print("[ERROR] enqueue needs a job kind (-k/ --kind)")
+            sys.exit()
+        new_jobs = enqueue_jobs(job_queue, arguments)
+        print(f"Queued {len(new_jobs)} job(s):\t{','.join(str(job_id) for job_id in new_jobs)}")
+        print(f"Queue:\t{job_queue.path}")
+
+    elif arguments.action == "work":
+        method_tools.set_metrics(arguments)
+        method_tools.set_tracing(arguments, "job_queue")
+        kind_limits = {}
+        for entry in arguments.limits.split(","):
+            if entry.strip():
+                kind, _, limit = entry.partition("=")
+                if kind.strip() not in JOB_KINDS or not limit.strip().isdigit():
+                    print(f"[ERROR] Expected kind=N limits, got {entry}")
+                    sys.exit()
+                kind_limits[kind.strip()] = int(limit)
+        work(job_queue, arguments.workers, kind_limits, arguments.forever)
+        print_status(job_queue, arguments)
+
+    elif arguments.action == "status":
+        print_status(job_queue, arguments)
+
+    elif arguments.action == "retry":
+        print(f"Queued again:\t{job_queue.retry(arguments.job_ids)} job(s)")
+
+    else:
+        if not arguments.job_ids:
+            print("[ERROR] cancel needs --job_ids")
+            sys.exit()
+        print(f"Cancelled:\t{job_queue.cancel(arguments.job_ids)} job(s)")
@@ -12,9 +12,81 @@
 ############################################################################################
 
 import os
+import re
+import hashlib
+import socket
+import struct
 import subprocess
 import json
 import sys
+import atexit
+import threading
+import time
+import logging
+from bisect import bisect_left
+from urllib.parse import urlsplit
+from datetime import datetime
+from itertools import islice
+from contextlib import contextmanager
+from logging.handlers import MemoryHandler, RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
+
+# optional fast JSON codec; the stdlib json module is used when orjson is not installed
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+PROFILE_DIR = "~/.illumina"
+
+# requests is imported on first use, so a tool starts (and prints -h) without loading it;
+# tools catch method_tools.HTTPError/ RequestException instead of importing requests
+LAZY_REQUESTS_EXCEPTIONS = ("HTTPError", "RequestException")
+
+# shared HTTP settings for batch runs
+MAX_WORKERS = 8
+REQUESTS_PER_SECOND = 10
+REQUEST_TIMEOUT = 30
+
+_SESSIONS = {}
+_SESSION_LOCK = threading.Lock()
+
+# local agent (tss_agent.py): warm pools, caches and rate limiters shared by every CLI run;
+# api_request goes through it when the socket exists. TSS_AGENT_SOCKET="" turns it off.
+AGENT_SOCKET = os.path.expanduser(
+    os.environ.get("TSS_AGENT_SOCKET", f"{PROFILE_DIR}/tss_agent.sock")
+)
+AGENT_FRAME = struct.Struct("!II")
+AGENT_KWARGS = {"params", "data", "headers", "timeout", "stream"}
+AGENT_CONFIG_KEYS = ("domain", "url", "wg", "apikey", "base_url", "requests_per_second")
+# marks a display ID search that only needs the case GUID (the agent may cache it);
+# stripped before the request goes to TSS
+AGENT_LOOKUP_HEADERS = {"X-TSS-Agent-Lookup": "case-id"}
+_AGENT_LOCAL = threading.local()
+
+# HTTP instrumentation: latency histogram bucket bounds (seconds)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+ID_SEGMENT = re.compile(r"^(?=.*\d)[0-9A-Za-z_-]{8,}$|^\d+$")
+
+# structured logs: JSONL, buffered, rotated by size
+LOG_LEVELS = {
+    "error": logging.ERROR,
+    "warning": logging.WARNING,
+    "info": logging.INFO,
+    "debug": logging.DEBUG,
+}
+LOG_OPTIONS = {"verbosity": "info", "max_mb": 50, "backups": 3}
+LOG_BUFFER_RECORDS = 500
+# one rotating file handler per log path, shared by every JsonLog open on it: {path: [handler, users]}
+_LOG_FILES = {}
+_LOG_FILES_LOCK = threading.Lock()
+LOG_VALUE_CHARS = 1000
+LOG_LIST_ITEMS = 20
+LOG_SAMPLE_EVERY = 100
+
+# span tracing: Chrome trace-event JSON
+TRACE_MAX_SPANS = 100000
+SECRET = re.compile(r"(X-Auth-Token:\s*(?:apikey\s+)?|apikey\s+)[^\s\"']+", re.IGNORECASE)
 
 
 # get header with an APIKEY
@@ -42,19 +114,30 @@ def format_path(path):
     return path
 
 
+# check an input path
+def check_path(path):
+    """Exit when an input file or directory does not exist"""
+
+    if not os.path.exists(os.path.expanduser(str(path))):
+        print(f"[ERROR] {path} does not exist. Please check.")
+        sys.exit()
+
+
 # run a shell command and return stdout
 def run_shell_with_pipe(command):
     """Run shell command with stream"""
 
-    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True) as process:
-        stdout = process.stdout.read().splitlines()
-        stderr = process.stderr.read().splitlines()
+    with TRACER.span(shell_span_name(command), "subprocess", command=redact(command)) as span:
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True) as process:
+            stdout = process.stdout.read().splitlines()
+            stderr = process.stderr.read().splitlines()
 
-        # clean up
-        process.kill()
-        process.wait()
-        process.stdout.close()
-        process.stderr.close()
+            # clean up
+            process.kill()
+            process.wait()
+            process.stdout.close()
+            process.stderr.close()
+        span["returncode"] = process.returncode
     return stdout, stderr
 
 
@@ -62,9 +145,11 @@ def run_shell_with_pipe(command):
 def run_shell_with_screen(command):
     """Run shell to screen"""
 
-    with subprocess.Popen(command, shell=True) as process:
-        process.wait()
-        process.kill()
+    with TRACER.span(shell_span_name(command), "subprocess", command=redact(command)) as span:
+        with subprocess.Popen(command, shell=True) as process:
+            process.wait()
+            process.kill()
+        span["returncode"] = process.returncode
 
 
 # indications to json
@@ -87,11 +172,60 @@ def indications_to_json(key, string):
     return json_array
 
 
+# JSON codec: orjson when installed, stdlib json otherwise
+def json_dumps(obj, indent=False, default=None):
+    """Serialize to a JSON string"""
+
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, option=option, default=default).decode("utf-8")
+    return json.dumps(obj, indent=2 if indent else None, default=default)
+
+
+def json_encode(obj):
+    """Serialize to UTF-8 JSON bytes (request bodies)"""
+
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def json_loads(data):
+    """Parse JSON from str or bytes"""
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dump(obj, file, indent=False):
+    """Write JSON to an open text file"""
+
+    file.write(json_dumps(obj, indent))
+
+
+def json_load(file):
+    """Read JSON from an open file"""
+
+    return json_loads(file.read())
+
+
+# decode each response body once
+def response_json(response):
+    """Return the decoded JSON body, decoding it only on the first call"""
+
+    try:
+        return response.decoded_json
+    except AttributeError:
+        response.decoded_json = json_loads(response.content)
+        return response.decoded_json
+
+
 # for better error reporting
 def error_messaging(jsonobject):
     """Extract error message"""
 
-    error_message = json.loads(jsonobject)
+    error_message = json_loads(jsonobject)
     try:
         print(error_message["code"])
         print(error_message["message"])
@@ -115,6 +249,10 @@ def parse_config(config_file):
                 "wg": load_config["workgroup"],
                 "apikey": load_config["apiKey"],
             }
+            if load_config.get("baseUrl"):
+                config["base_url"] = load_config["baseUrl"]
+            if load_config.get("requestsPerSecond"):
+                config["requests_per_second"] = float(load_config["requestsPerSecond"])
     except FileNotFoundError:
         print("Config file not found. Please check.")
         sys.exit()
@@ -137,18 +275,23 @@ def get_test(test_name, test_version, config):
 
     # curl command, request does not work :(
     command = (
-        f"curl -X GET \"https://{config['domain']}.{config['url']}/tms/api/v1/testDefinitions\""
+        f"curl -X GET \"{get_base_url(config)}/tms/api/v1/testDefinitions\""
         f' -H "accept: application/json"'
         f" -H \"Authorization: apikey {config['apikey']}\""
         f" -H \"X-ILMN-Workgroup: {config['wg']}\""
         f" -H \"X-ILMN-Domain: {config['domain']}\""
     )
 
-    print(f"Command:\t{command}")
-    output, _ = run_shell_with_pipe(command)
+    # the local agent caches the test definitions between runs
+    if AGENT_SOCKET and agent_connection() is not None:
+        response = api_request("GET", f"{get_base_url(config)}/tms/api/v1/testDefinitions", config)
+        output = [response.content] if response.status_code == 200 else []
+    else:
+        print(f"Command:\t{command}")
+        output, _ = run_shell_with_pipe(command)
     if output:
         try:
-            data = json.loads(output[0])["items"]
+            data = json_loads(output[0])["items"]
         except AssertionError:
             pass
         else:
@@ -161,3 +304,814 @@ def get_test(test_name, test_version, config):
     print(f"TestId:\t{test_id}")
     print(f"Report Types:\t{report_ids}")
     return test_id, report_ids
+
+
+# throttle API calls across worker threads
+class RateLimiter:
+    """Token bucket shared by every thread talking to one workgroup"""
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# base URL for a TSS domain
+def get_base_url(config):
+    """Construct https://<domain>.<url>, or use the config's baseUrl (e.g. a local mock server)"""
+
+    return config.get("base_url") or f"https://{config['domain']}.{config['url']}"
+
+
+# requests exceptions without importing requests at startup
+def __getattr__(name):
+    """method_tools.HTTPError/ RequestException load requests.exceptions when first used"""
+
+    if name in LAZY_REQUESTS_EXCEPTIONS:
+        from requests import exceptions  # pylint: disable=import-outside-toplevel
+        return getattr(exceptions, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# pooled session per domain/ workgroup
+def get_session(config, pool_size=MAX_WORKERS):
+    """Get (or create) the pooled session and rate limiter for a config"""
+    import requests  # pylint: disable=import-outside-toplevel
+    from requests.adapters import HTTPAdapter  # pylint: disable=import-outside-toplevel
+
+    # the key hash keeps profiles (and rotated keys) for one workgroup apart
+    apikey_hash = hashlib.sha256(config["apikey"].encode()).hexdigest()
+    key = (config["domain"], config["url"], config["wg"], apikey_hash)
+    with _SESSION_LOCK:
+        if key not in _SESSIONS:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(
+                get_headers_apikey(config["apikey"], config["domain"], config["wg"])
+            )
+            limiter = RateLimiter(config.get("requests_per_second", REQUESTS_PER_SECOND))
+            _SESSIONS[key] = (session, limiter)
+        return _SESSIONS[key]
+
+
+# rate limited request through the pooled session
+def api_request(method, url, config, **kwargs):
+    """Send a request through the shared session and rate limiter (or the local agent)"""
+    import requests  # pylint: disable=import-outside-toplevel
+
+    if AGENT_SOCKET and set(kwargs) <= AGENT_KWARGS and agent_connection() is not None:
+        return agent_request(method, url, config, **kwargs)
+
+    session, limiter = get_session(config)
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    if kwargs.get("headers"):
+        kwargs["headers"] = {
+            name: value for name, value in kwargs["headers"].items() if name not in AGENT_LOOKUP_HEADERS
+        }
+    with TRACER.span(f"{method} {endpoint_name(url)}", "http", url=url) as span:
+        start = time.perf_counter()
+        limiter.acquire()
+
+        # latency excludes the rate limiter wait
+        data = kwargs.get("data")
+        sent = len(data) if isinstance(data, (bytes, str)) else 0
+        span["rate_limit_wait_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as err:
+            HTTP_METRICS.record(method, url, type(err).__name__, time.perf_counter() - start, sent)
+            raise
+        if kwargs.get("stream"):
+            received = int(response.headers.get("Content-Length") or 0)
+        else:
+            received = len(response.content)
+        HTTP_METRICS.record(
+            method, url, response.status_code, time.perf_counter() - start, sent, received
+        )
+        span["status"] = response.status_code
+        span["bytes_received"] = received
+    return response
+
+
+# connection to the local agent
+def agent_connection():
+    """This thread's connection to tss_agent.py, or None when the agent is not running"""
+
+    connection = getattr(_AGENT_LOCAL, "connection", None)
+    if connection is not None:
+        return connection
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(AGENT_SOCKET):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(AGENT_SOCKET)
+    except OSError:
+        # stale socket file: the agent is gone
+        connection.close()
+        return None
+    _AGENT_LOCAL.connection = connection
+    return connection
+
+
+def close_agent_connection():
+    """Drop this thread's agent connection"""
+
+    connection = getattr(_AGENT_LOCAL, "connection", None)
+    _AGENT_LOCAL.connection = None
+    if connection is not None:
+        connection.close()
+
+
+# agent wire format: header length, body length, JSON header, body bytes
+def send_frame(connection, header, body=b""):
+    """Send one frame"""
+
+    head = json_encode(header)
+    connection.sendall(AGENT_FRAME.pack(len(head), len(body)) + head + body)
+
+
+def recv_exact(connection, size):
+    """Read size bytes; None when the peer closed before the first byte"""
+
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(min(size - len(data), 1 << 20))
+        if not chunk:
+            if data:
+                raise ConnectionError("Agent connection closed mid-frame")
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(connection):
+    """Receive one frame as (header, body); None at the end of the stream"""
+
+    sizes = recv_exact(connection, AGENT_FRAME.size)
+    if sizes is None:
+        return None
+    head_size, body_size = AGENT_FRAME.unpack(sizes)
+    header = json_loads(recv_exact(connection, head_size))
+    body = recv_exact(connection, body_size) if body_size else b""
+    if body is None:
+        raise ConnectionError("Agent connection closed mid-frame")
+    return header, body
+
+
+# one call to the local agent
+def agent_call(header, body=b""):
+    """Send a frame to the agent and return its (reply, body); reconnects once if it restarted"""
+    import requests  # pylint: disable=import-outside-toplevel
+
+    for attempt in range(2):
+        connection = agent_connection()
+        if connection is None:
+            raise requests.exceptions.ConnectionError(f"TSS agent not running: {AGENT_SOCKET}")
+        try:
+            send_frame(connection, header, body)
+            break
+        except OSError as err:
+            # the agent restarted since this connection was opened; nothing was sent
+            close_agent_connection()
+            if attempt:
+                raise requests.exceptions.ConnectionError(f"TSS agent: {err}") from err
+    try:
+        frame = recv_frame(connection)
+    except OSError as err:
+        frame = err
+    if not isinstance(frame, tuple):
+        close_agent_connection()
+        raise requests.exceptions.ConnectionError(f"TSS agent closed the connection: {frame}")
+    return frame
+
+
+# request through the local agent
+def agent_request(method, url, config, **kwargs):
+    """Same contract as api_request; the agent applies the rate limit and its caches"""
+    import requests  # pylint: disable=import-outside-toplevel
+    from requests.structures import CaseInsensitiveDict  # pylint: disable=import-outside-toplevel
+
+    data = kwargs.get("data") or b""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    header = {
+        "op": "request",
+        "method": method,
+        "url": url,
+        "config": {key: config[key] for key in AGENT_CONFIG_KEYS if key in config},
+        "params": kwargs.get("params"),
+        "headers": kwargs.get("headers"),
+        "timeout": kwargs.get("timeout", REQUEST_TIMEOUT),
+    }
+    with TRACER.span(f"{method} {endpoint_name(url)}", "http", url=url, agent=True) as span:
+        start = time.perf_counter()
+        try:
+            reply, body = agent_call(header, data)
+            if reply.get("error"):
+                error = getattr(requests.exceptions, reply["error"], None)
+                if not (isinstance(error, type) and issubclass(error, requests.exceptions.RequestException)):
+                    error = requests.exceptions.RequestException
+                raise error(reply.get("message"))
+        except requests.exceptions.RequestException as err:
+            HTTP_METRICS.record(method, url, type(err).__name__, time.perf_counter() - start, len(data))
+            raise
+        HTTP_METRICS.record(
+            method, url, reply["status"], time.perf_counter() - start, len(data), len(body)
+        )
+        span["status"] = reply["status"]
+        span["bytes_received"] = len(body)
+        span["cached"] = reply.get("cached", False)
+
+    response = requests.Response()
+    response.status_code = reply["status"]
+    response.reason = reply.get("reason")
+    response.url = reply.get("url") or url
+    response.headers = CaseInsensitiveDict(reply.get("headers") or {})
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response._content = body  # pylint: disable=protected-access
+    response._content_consumed = True  # pylint: disable=protected-access
+    response.from_cache = reply.get("cached", False)
+    return response
+
+
+# group URLs by endpoint: IDs in the path become {id}
+def endpoint_name(url):
+    """e.g. /crs/api/v1/cases/{id}/process"""
+
+    segments = urlsplit(url).path.split("/")
+    return "/".join("{id}" if ID_SEGMENT.match(segment) else segment for segment in segments)
+
+
+class HttpMetrics:
+    """Per-endpoint request counts, latency histograms, bytes and status codes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, method, url, status, seconds, sent=0, received=0):
+        """Record one request; status is the HTTP status code or the exception name"""
+        key = (method.upper(), endpoint_name(url))
+        with self.lock:
+            entry = self.endpoints.get(key)
+            if entry is None:
+                entry = self.endpoints[key] = {
+                    "count": 0,
+                    "errors": 0,
+                    "seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "bytes_sent": 0,
+                    "bytes_received": 0,
+                    "status": {},
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                }
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["bytes_sent"] += sent
+            entry["bytes_received"] += received
+            entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                entry["errors"] += 1
+            entry["buckets"][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    @staticmethod
+    def quantile(entry, fraction):
+        """Histogram estimate: the upper bound of the bucket holding the quantile"""
+        target = fraction * entry["count"]
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, entry["buckets"]):
+            seen += count
+            if count and seen >= target:
+                return min(bound, entry["max_seconds"])
+        return entry["max_seconds"]
+
+    def to_dict(self):
+        """Metrics as {"METHOD path": {...}}"""
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+        metrics = {}
+        for (method, path), entry in endpoints:
+            metrics[f"{method} {path}"] = {
+                "method": method,
+                "endpoint": path,
+                "requests": entry["count"],
+                "errors": entry["errors"],
+                "status": dict(entry["status"]),
+                "bytes_sent": entry["bytes_sent"],
+                "bytes_received": entry["bytes_received"],
+                "seconds_total": round(entry["seconds"], 6),
+                "seconds_mean": round(entry["seconds"] / entry["count"], 6),
+                "seconds_p50": round(self.quantile(entry, 0.5), 6),
+                "seconds_p99": round(self.quantile(entry, 0.99), 6),
+                "seconds_max": round(entry["max_seconds"], 6),
+                "buckets": {
+                    str(bound): count for bound, count in zip(LATENCY_BUCKETS, entry["buckets"])
+                },
+            }
+        return metrics
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+        lines = [
+            "# HELP tss_http_requests_total TSS API requests by endpoint and status.",
+            "# TYPE tss_http_requests_total counter",
+        ]
+        for (method, path), entry in endpoints:
+            for status, count in sorted(entry["status"].items()):
+                lines.append(
+                    f'tss_http_requests_total{{method="{method}",endpoint="{path}",'
+                    f'status="{status}"}} {count}'
+                )
+        lines += [
+            "# HELP tss_http_request_duration_seconds TSS API request latency.",
+            "# TYPE tss_http_request_duration_seconds histogram",
+        ]
+        for (method, path), entry in endpoints:
+            labels = f'method="{method}",endpoint="{path}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, entry["buckets"]):
+                cumulative += count
+                bound = "+Inf" if bound == float("inf") else bound
+                lines.append(
+                    f'tss_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"tss_http_request_duration_seconds_sum{{{labels}}} {entry['seconds']}")
+            lines.append(f"tss_http_request_duration_seconds_count{{{labels}}} {entry['count']}")
+        for name, field in (("sent", "bytes_sent"), ("received", "bytes_received")):
+            lines += [
+                f"# HELP tss_http_bytes_{name}_total TSS API body bytes {name}.",
+                f"# TYPE tss_http_bytes_{name}_total counter",
+            ]
+            for (method, path), entry in endpoints:
+                lines.append(
+                    f'tss_http_bytes_{name}_total{{method="{method}",endpoint="{path}"}} '
+                    f"{entry[field]}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Plain-text table, slowest endpoints first"""
+        rows = sorted(self.to_dict().values(), key=lambda row: -row["seconds_total"])
+        lines = [
+            f"{'Endpoint':<60}{'Requests':>9}{'Errors':>7}{'Mean ms':>9}{'p50 ms':>9}"
+            f"{'p99 ms':>9}{'Max ms':>9}{'KB in':>10}"
+        ]
+        for row in rows:
+            lines.append(
+                f"{(row['method'] + ' ' + row['endpoint'])[:59]:<60}{row['requests']:>9}"
+                f"{row['errors']:>7}{row['seconds_mean'] * 1000:>9.1f}"
+                f"{row['seconds_p50'] * 1000:>9.1f}{row['seconds_p99'] * 1000:>9.1f}"
+                f"{row['seconds_max'] * 1000:>9.1f}{row['bytes_received'] / 1024:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def write(self, path):
+        """Write Prometheus text (.prom/ .txt) or JSON (anything else)"""
+        with open(path, "w", encoding="utf-8") as output:
+            if path.endswith((".prom", ".txt")):
+                output.write(self.to_prometheus())
+            else:
+                json_dump(self.to_dict(), output, indent=True)
+
+
+HTTP_METRICS = HttpMetrics()
+
+
+# metrics options shared by the API tools
+def add_metrics_args(parser):
+    """Add --metrics_file and --no_http_summary to an argparse parser"""
+
+    parser.add_argument(
+        "--metrics_file",
+        help="Write per-endpoint HTTP metrics at exit: Prometheus text (.prom) or JSON",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--no_http_summary",
+        help="Do not print the per-endpoint HTTP summary at exit",
+        action="store_true",
+    )
+
+
+def set_metrics(args):
+    """Report the HTTP metrics when the tool exits"""
+
+    atexit.register(
+        report_metrics,
+        getattr(args, "metrics_file", None),
+        not getattr(args, "no_http_summary", False),
+    )
+
+
+def report_metrics(metrics_file=None, print_summary=True):
+    """Print the summary table (stderr) and/ or write the metrics file"""
+
+    if not HTTP_METRICS.endpoints:
+        return
+    if print_summary:
+        print(f"\nHTTP Requests:\n{HTTP_METRICS.summary()}", file=sys.stderr)
+    if metrics_file:
+        HTTP_METRICS.write(os.path.expanduser(metrics_file))
+        print(f"HTTP Metrics:\t{os.path.abspath(os.path.expanduser(metrics_file))}", file=sys.stderr)
+
+
+# nested spans exported as Chrome trace events
+class Tracer:
+    """Per-thread nested spans; a no-op until enable() is called"""
+
+    def __init__(self):
+        self.enabled = False
+        self.name = None
+        self.started = None
+        self.events = []
+        self.threads = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # perf_counter -> epoch microseconds
+        self.epoch = time.time() - time.perf_counter()
+
+    def enable(self, name):
+        """Start recording; the whole run becomes a root span called name"""
+        self.name = name
+        self.started = time.perf_counter()
+        self.enabled = True
+
+    @contextmanager
+    def span(self, name, category="step", **attributes):
+        """Time a block; yields the attribute dict so callers can add to it"""
+        if not self.enabled:
+            yield attributes
+            return
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as err:
+            attributes["error"] = type(err).__name__
+            raise
+        finally:
+            stack.pop()
+            attributes["depth"] = len(stack)
+            self.add(name, category, start, time.perf_counter(), attributes)
+
+    def add(self, name, category, start, stop, attributes):
+        """Store one complete ("X") event"""
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((self.epoch + start) * 1e6),
+            "dur": round((stop - start) * 1e6),
+            "pid": os.getpid(),
+            "tid": thread.native_id,
+            "args": attributes,
+        }
+        with self.lock:
+            self.threads[thread.native_id] = thread.name
+            if len(self.events) < TRACE_MAX_SPANS:
+                self.events.append(event)
+            else:
+                self.dropped += 1
+
+    def to_dict(self):
+        """Chrome trace-event JSON, including the root span up to now"""
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        if self.started is not None:
+            root = threading.current_thread()
+            threads.setdefault(root.native_id, root.name)
+            events.append(
+                {
+                    "name": self.name,
+                    "cat": "run",
+                    "ph": "X",
+                    "ts": round((self.epoch + self.started) * 1e6),
+                    "dur": round((time.perf_counter() - self.started) * 1e6),
+                    "pid": os.getpid(),
+                    "tid": root.native_id,
+                    "args": {"argv": " ".join(sys.argv)},
+                }
+            )
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        )
+        return {
+            "traceEvents": sorted(events, key=lambda event: event.get("ts", 0)),
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_spans": self.dropped},
+        }
+
+    def write(self, path):
+        """Write the trace for chrome://tracing or ui.perfetto.dev"""
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json_dump(self.to_dict(), trace_file)
+
+
+TRACER = Tracer()
+
+
+# span names/ attributes for shell commands
+def shell_span_name(command):
+    """e.g. subprocess curl"""
+
+    words = command.split()
+    return f"subprocess {os.path.basename(words[0]) if words else ''}"
+
+
+def redact(text):
+    """Hide API keys in logged commands"""
+
+    return SECRET.sub(r"\1***", text)
+
+
+# tracing options shared by the pipelines
+def add_tracing_args(parser):
+    """Add --trace_file to an argparse parser"""
+
+    parser.add_argument(
+        "--trace_file",
+        help="Write a Chrome trace-event JSON of the pipeline steps, HTTP and subprocess calls "
+        "(open in chrome://tracing or https://ui.perfetto.dev)",
+        type=str,
+        default=None,
+    )
+
+
+def set_tracing(args, name):
+    """Start tracing and write the trace when the tool exits"""
+
+    trace_file = getattr(args, "trace_file", None)
+    if trace_file:
+        TRACER.enable(name)
+        atexit.register(report_trace, os.path.expanduser(trace_file))
+
+
+def report_trace(trace_file):
+    """Write the trace file"""
+
+    TRACER.write(trace_file)
+    print(f"Trace File:\t{os.path.abspath(trace_file)}", file=sys.stderr)
+
+
+# apply a function to many items with a thread pool
+def run_concurrently(function, items, max_workers=MAX_WORKERS):
+    """Run function over items concurrently; results keep the input order"""
+
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(function, items))
+
+
+# resolve a profile name or config path
+def resolve_profile(profile):
+    """Return (profile name, config path); names map to ~/.illumina/<name>.json"""
+
+    path = os.path.expanduser(profile)
+    if not os.path.exists(path) and not profile.endswith(".json"):
+        path = os.path.join(os.path.expanduser(PROFILE_DIR), f"{profile}.json")
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name, path
+
+
+# profile registry
+def load_profiles(profiles):
+    """Parse many TSS configs: comma separated string or list of names/ paths
+
+    Returns {profile name: config}; each config carries its "profile" name and gets its
+    own connection pool and rate limiter (see get_session).
+    """
+
+    if isinstance(profiles, str):
+        profiles = profiles.split(",")
+    registry = {}
+    for profile in profiles:
+        if not str(profile).strip():
+            continue
+        name, path = resolve_profile(str(profile).strip())
+        if name in registry:
+            name = f"{name}_{len(registry)}"
+        config = parse_config(path)
+        config["profile"] = name
+        registry[name] = config
+    return registry
+
+
+# pair case IDs with profiles
+def assign_profiles(rows, registry):
+    """[(config, case ID)] from CSV rows of case ID[, profile name]
+
+    The second column names the profile only when the registry holds several profiles;
+    rows with an unknown or missing profile are reported and skipped.
+    """
+
+    default_profile = next(iter(registry)) if len(registry) == 1 else None
+    cases = []
+    for row in rows:
+        if not row or not row[0].strip():
+            continue
+        case_id = row[0].strip()
+        profile_name = default_profile or (row[1].strip() if len(row) > 1 else None)
+        if profile_name not in registry:
+            print(f"[ERROR] Unknown or missing profile for case {case_id}, skipping")
+            continue
+        cases.append((registry[profile_name], case_id))
+    return cases
+
+
+# run a function once per profile
+def run_per_profile(function, registry, max_workers=MAX_WORKERS):
+    """Call function(config) for every profile concurrently; returns {profile name: result}"""
+
+    names = list(registry)
+    results = run_concurrently(lambda name: function(registry[name]), names, max_workers)
+    return dict(zip(names, results))
+
+
+# logging options shared by the batch tools
+def add_logging_args(parser):
+    """Add --verbosity and --log_max_mb to an argparse parser"""
+
+    parser.add_argument(
+        "--verbosity",
+        choices=list(LOG_LEVELS),
+        help="Log level; payloads and responses are only logged in full at debug (default: info)",
+        default=LOG_OPTIONS["verbosity"],
+    )
+    parser.add_argument(
+        "--log_max_mb",
+        help="Log files are appended to (not overwritten) and rotated at this size in MB "
+        f"(default: {LOG_OPTIONS['max_mb']})",
+        type=float,
+        default=LOG_OPTIONS["max_mb"],
+    )
+
+
+def set_logging(args):
+    """Apply the --verbosity/ --log_max_mb arguments to every log opened afterwards"""
+
+    LOG_OPTIONS["verbosity"] = getattr(args, "verbosity", LOG_OPTIONS["verbosity"])
+    LOG_OPTIONS["max_mb"] = getattr(args, "log_max_mb", LOG_OPTIONS["max_mb"])
+
+
+# bound large values before they reach a log
+def truncate_value(value, limit=LOG_VALUE_CHARS, items=LOG_LIST_ITEMS):
+    """Cut long strings, lists and dicts; the original sizes are noted"""
+
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8", "replace")
+    if isinstance(value, str):
+        return value if len(value) <= limit else f"{value[:limit]}... [{len(value)} chars]"
+    if isinstance(value, dict):
+        kept = {
+            str(key): truncate_value(item, limit, items)
+            for key, item in islice(value.items(), items)
+        }
+        if len(value) > items:
+            kept["..."] = f"[{len(value)} keys]"
+        return kept
+    if isinstance(value, (list, tuple, set, frozenset)):
+        kept = [truncate_value(item, limit, items) for item in islice(value, items)]
+        if len(value) > items:
+            kept.append(f"... [{len(value)} items]")
+        return kept
+    return value
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per record: time, level, message and any fields"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json_dumps(entry, default=str)
+
+
+class JsonLog:
+    """Buffered JSONL log with levels, payload truncation/ sampling and size-based rotation
+
+    Unlike the old text logs (opened with "w") the file is appended to, so reruns and
+    concurrent workers keep each other's records; it is rotated at max_mb instead. Logs
+    open on the same path share one file handler, so rotation never renames the file
+    under another writer in this process.
+    """
+
+    def __init__(self, path, verbosity=None, max_mb=None):
+        self.name = path
+        self.verbosity = verbosity or LOG_OPTIONS["verbosity"]
+        max_bytes = int((max_mb or LOG_OPTIONS["max_mb"]) * 1024 * 1024)
+
+        self.path = os.path.abspath(path)
+        with _LOG_FILES_LOCK:
+            entry = _LOG_FILES.get(self.path)
+            if entry is None:
+                file_handler = RotatingFileHandler(
+                    self.path, maxBytes=max_bytes, backupCount=LOG_OPTIONS["backups"], encoding="utf-8"
+                )
+                file_handler.setFormatter(JsonLineFormatter())
+                entry = _LOG_FILES[self.path] = [file_handler, 0]
+            entry[1] += 1
+        self.file_handler = entry[0]
+        self.closed = False
+
+        # records are written in batches; errors flush immediately
+        self.handler = MemoryHandler(
+            LOG_BUFFER_RECORDS, flushLevel=logging.ERROR, target=self.file_handler
+        )
+        self.logger = logging.Logger(f"tss.{os.path.basename(path)}", LOG_LEVELS[self.verbosity])
+        self.logger.addHandler(self.handler)
+        self.samples = {}
+        self.sample_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Flush the buffer; the last log open on the path closes the file"""
+        if self.closed:
+            return
+        self.closed = True
+        self.handler.close()
+        self.logger.removeHandler(self.handler)
+        with _LOG_FILES_LOCK:
+            entry = _LOG_FILES.get(self.path)
+            if entry is not None and entry[0] is self.file_handler:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del _LOG_FILES[self.path]
+                    self.file_handler.close()
+
+    def log(self, level, message, **fields):
+        """Log a message with structured fields"""
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, extra={"fields": fields})
+
+    def debug(self, message, **fields):
+        """Debug record"""
+        self.log(logging.DEBUG, message, **fields)
+
+    def info(self, message, **fields):
+        """Info record"""
+        self.log(logging.INFO, message, **fields)
+
+    def warning(self, message, **fields):
+        """Warning record"""
+        self.log(logging.WARNING, message, **fields)
+
+    def error(self, message, **fields):
+        """Error record (flushes the buffer)"""
+        self.log(logging.ERROR, message, **fields)
+
+    def payload(self, message, data, level=logging.INFO, **fields):
+        """Log a payload/ response: in full at debug verbosity, truncated otherwise"""
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.verbosity != "debug":
+            data = truncate_value(data)
+        self.log(level, message, payload=data, **fields)
+
+    def sample(self, key, message, every=LOG_SAMPLE_EVERY, **fields):
+        """Log the first and every n-th message for a key (all of them at debug verbosity)"""
+        with self.sample_lock:
+            count = self.samples.get(key, 0) + 1
+            self.samples[key] = count
+        if self.verbosity == "debug" or count % every == 1 or every == 1:
+            self.info(message, sample=key, count=count, **fields)
+
@@ -0,0 +1,758 @@
+#!/usr/bin/env python3
+"""Local stand-in for the TSS CRS, DRS and TMS APIs"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Mock TSS server for offline benchmarks and tests
+# 1. Inputs: number of synthetic cases, seed, [optional] latency, error rate, rate limit
+# 2. Outputs: an HTTP server on localhost and a TSS config file pointing at it (baseUrl)
+# Notes: emulates the endpoints the tss/ scripts call: cases search v2, cases CRUD,
+#        /process, qc-actions, files (presigned URLs), session/users, draftreport pdf/json
+#        and testDefinitions. Run it in-process (MockTssServer) or as a subprocess
+#        (start_subprocess or this script). Standard library only.
+#        GET cases/{id} drops subject PHI unless directIdentifiers=true, like TSS.
+##################################################################
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import subprocess
+import profile_tools
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+MOCK_DOMAIN = "mock"
+MOCK_URL = "trusight.localhost"
+MOCK_WORKGROUP = "mock-workgroup"
+MOCK_APIKEY = "mock-apikey"
+READY_MESSAGE = "Mock TSS server listening on"
+
+SEED_STATES = [
+    ("New", "READY_FOR_PROCESSING"),
+    ("In Progress", "PROCESSING"),
+    ("In Progress", "READY_FOR_INTERPRETATION"),
+    ("In Progress", "QC_WARNING"),
+    ("In Progress", "HAS_ISSUE"),
+    ("In Progress", "READY_FOR_REVIEW"),
+    ("Complete", "REPORTS_AVAILABLE"),
+]
+TAGS = ["OTG", "Keep", "On Hold", "Overdue", "review ASAP", "Research"]
+RELATIONSHIPS = ["PROBAND", "MOTHER", "FATHER", "SIBLING", "SIBLING"]
+USER_NAMES = ["LeAnne Lovato", "June Salazar", "Jeff Sanchez", "Jill Xu", "Aaron Air"]
+SUMMARY_FIELDS = [
+    "id",
+    "displayId",
+    "status",
+    "subState",
+    "tags",
+    "createdBy",
+    "createdDate",
+    "modifiedDate",
+    "testDefinitionId",
+    "activationState",
+]
+PHI_FIELDS = ("firstName", "middleName", "lastName", "dateOfBirth", "mrn")
+
+
+# deterministic IDs
+def make_uuid(rng):
+    """UUID4 string from a seeded random generator"""
+
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def iso_time(moment):
+    """Timestamp in the TSS format"""
+
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class CaseStore:
+    """Thread-safe synthetic case store"""
+
+    def __init__(self, seed=1, processing_seconds=2.0):
+        self.rng = random.Random(seed)
+        self.processing_seconds = processing_seconds
+        self.lock = threading.Lock()
+        self.cases = {}
+        self.display_ids = {}
+        self.processing = {}
+        self.users = [{"guid": make_uuid(self.rng), "fullName": name} for name in USER_NAMES]
+        self.tests = []
+        for name, version in (("WGS Trio", "1.0"), ("WES Proband", "2.1"), ("Panel", "1.3")):
+            self.tests.append(
+                {
+                    "id": make_uuid(self.rng),
+                    "name": name,
+                    "version": version,
+                    "reports": [{"id": make_uuid(self.rng)}],
+                    "secondaryAnalysis": {
+                        "referenceGenomeBuild": "GRCh38",
+                        "workflowName": "DRAGEN Germline",
+                    },
+                }
+            )
+
+    # synthetic data
+    def make_subject(self, relationship, display_id, position, test):
+        """caseSubjects entry with one active sample"""
+
+        sample = {
+            "id": make_uuid(self.rng),
+            "externalSampleId": f"{display_id}-{position + 1:02d}",
+            "status": "ACTIVE",
+            "molecularData": [
+                {"fastqLink": f"gds://mock-volume/fastq/{display_id}/{position + 1:02d}_R1.fastq.gz"}
+            ],
+        }
+        return {
+            "id": make_uuid(self.rng),
+            "firstName": relationship.title(),
+            "middleName": "",
+            "lastName": display_id,
+            "dateOfBirth": "1990-01-01",
+            "mrn": f"{display_id}-MRN{position + 1:02d}",
+            "relationshipToProband": relationship,
+            "gender": "FEMALE" if relationship == "MOTHER" else self.rng.choice(["MALE", "FEMALE"]),
+            "isAffected": "TRUE" if relationship == "PROBAND" else "FALSE",
+            "reportTypes": [{"id": report["id"]} for report in test["reports"]]
+            if relationship == "PROBAND"
+            else [],
+            "phenotypes": [{"code": f"HP:{self.rng.randint(1, 99999):07d}", "source": "HPO"}],
+            "activeSample": sample,
+            "samples": [sample],
+        }
+
+    def make_case(self, index):
+        """One synthetic case"""
+
+        test = self.rng.choice(self.tests)
+        status, sub_state = self.rng.choice(SEED_STATES)
+        display_id = f"MOCK-{index:07d}"
+        created = datetime(2022, 1, 1) + timedelta(minutes=self.rng.randint(0, 60 * 24 * 730))
+        family = RELATIONSHIPS[: self.rng.choice([1, 1, 2, 3, 3, 4, 5])]
+        case = {
+            "id": make_uuid(self.rng),
+            "displayId": display_id,
+            "status": status,
+            "subState": sub_state,
+            "tags": self.rng.sample(TAGS, self.rng.randint(0, 2)),
+            "createdBy": self.rng.choice(self.users)["guid"],
+            "createdDate": iso_time(created),
+            "modifiedDate": iso_time(created + timedelta(hours=self.rng.randint(1, 240))),
+            "testDefinitionId": test["id"],
+            "testDefinition": {
+                "id": test["id"],
+                "name": test["name"],
+                "secondaryAnalysis": test["secondaryAnalysis"],
+            },
+            "activationState": None if status == "New" else "ACTIVE",
+            "caseSubjects": [
+                self.make_subject(relationship, display_id, position, test)
+                for position, relationship in enumerate(family)
+            ],
+            "ingestionResult": None,
+        }
+        if status == "Complete" or sub_state == "READY_FOR_INTERPRETATION":
+            case["ingestionResult"] = json.dumps(
+                {
+                    "result": {
+                        "analysisInfo": {
+                            "outputVolume": "mock-volume",
+                            "outputFolder": f"/analysis/{display_id}/",
+                        }
+                    }
+                }
+            )
+        return case
+
+    def seed(self, count):
+        """Add count synthetic cases"""
+
+        with self.lock:
+            start = len(self.cases)
+            for index in range(start, start + count):
+                case = self.make_case(index + 1)
+                self.cases[case["id"]] = case
+                self.display_ids[case["displayId"]] = case["id"]
+        return self
+
+    # state
+    def advance(self, case):
+        """Move processing cases on once processing_seconds have passed (lock held)"""
+
+        started = self.processing.get(case["id"])
+        if started is not None and time.monotonic() - started >= self.processing_seconds:
+            del self.processing[case["id"]]
+            case["subState"] = "READY_FOR_INTERPRETATION"
+            case["modifiedDate"] = iso_time(datetime.utcnow())
+
+    def get(self, case_id):
+        """Case JSON or None"""
+
+        with self.lock:
+            case = self.cases.get(case_id)
+            if case is not None:
+                self.advance(case)
+            return case
+
+    def search(self, params):
+        """Cases matching the v2 search parameters"""
+
+        def first(name):
+            return (params.get(name) or [None])[0]
+
+        display_id = first("displayId")
+        case_id = first("id")
+        test_id = first("testDefinitionId")
+        sample_id = first("externalSampleId")
+        statuses = set(params.get("status") or [])
+        sub_states = set(params.get("subState") or [])
+        tags = set(params.get("tags") or [])
+
+        with self.lock:
+            # exact display ID lookups skip the scan
+            if display_id and display_id in self.display_ids:
+                candidates = [self.cases[self.display_ids[display_id]]]
+            else:
+                candidates = list(self.cases.values())
+            matches = []
+            for case in candidates:
+                self.advance(case)
+                if display_id and display_id not in case["displayId"]:
+                    continue
+                if case_id and case_id not in case["id"]:
+                    continue
+                if test_id and test_id not in (case["testDefinitionId"] or ""):
+                    continue
+                if statuses and case["status"] not in statuses:
+                    continue
+                if sub_states and case["subState"] not in sub_states:
+                    continue
+                if tags and not tags.intersection(case["tags"]):
+                    continue
+                if sample_id and not any(
+                    sample_id in subject["activeSample"]["externalSampleId"]
+                    for subject in case["caseSubjects"]
+                ):
+                    continue
+                matches.append({field: case[field] for field in SUMMARY_FIELDS})
+            return matches
+
+    def create(self, payload):
+        """POST /cases; returns (status, body)"""
+
+        subjects = payload.get("subjects") or []
+        if not subjects or not payload.get("testDefinitionId"):
+            return 400, {"code": "BAD_REQUEST", "message": "subjects and testDefinitionId are required"}
+        test = next((item for item in self.tests if item["id"] == payload["testDefinitionId"]), None)
+        test = test or {"id": payload["testDefinitionId"], "name": "Unknown", "reports": []}
+        with self.lock:
+            display_id = payload.get("displayId") or f"MOCK-{len(self.cases) + 1:07d}"
+            if display_id in self.display_ids:
+                return 400, {"code": "DUPLICATE", "message": f"Case {display_id} already exists"}
+            now = datetime.utcnow()
+            case = {
+                "id": make_uuid(self.rng),
+                "displayId": display_id,
+                "status": "New",
+                "subState": "READY_FOR_PROCESSING",
+                "tags": payload.get("tags") or [],
+                "createdBy": self.users[0]["guid"],
+                "createdDate": iso_time(now),
+                "modifiedDate": iso_time(now),
+                "testDefinitionId": test["id"],
+                "testDefinition": {
+                    "id": test["id"],
+                    "name": test["name"],
+                    "secondaryAnalysis": test.get("secondaryAnalysis") or {},
+                },
+                "activationState": None,
+                "caseSubjects": [],
+                "ingestionResult": None,
+            }
+            for subject in subjects:
+                sample = dict((subject.get("samples") or [{}])[0])
+                fastq = f"gds://mock-volume/fastq/{display_id}/{sample.get('externalSampleId')}_R1.fastq.gz"
+                sample.update(
+                    {"id": make_uuid(self.rng), "status": "ACTIVE", "molecularData": [{"fastqLink": fastq}]}
+                )
+                entry = {key: value for key, value in subject.items() if key != "samples"}
+                entry.update({"id": make_uuid(self.rng), "activeSample": sample, "samples": [sample]})
+                case["caseSubjects"].append(entry)
+            self.cases[case["id"]] = case
+            self.display_ids[display_id] = case["id"]
+            return 201, case
+
+    def update(self, case_id, payload):
+        """PUT /cases/{id}; returns (status, body)"""
+
+        with self.lock:
+            case = self.cases.get(case_id)
+            if case is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Case {case_id} not found"}
+            if case["status"] == "Complete" or case["subState"] == "QC_WARNING":
+                return 400, {"code": "NOT_EDITABLE", "message": "The case cannot be edited"}
+            for key in ("tags", "testDefinitionId"):
+                if key in payload:
+                    case[key] = payload[key]
+            subjects = {subject["id"]: subject for subject in case["caseSubjects"]}
+            for subject in payload.get("subjects") or []:
+                current = subjects.get(subject.get("id"))
+                if current is not None:
+                    current.update(
+                        {key: value for key, value in subject.items() if key not in ("id", "samples")}
+                    )
+            case["modifiedDate"] = iso_time(datetime.utcnow())
+            return 200, case
+
+    def delete(self, case_id):
+        """DELETE /cases/{id}; returns (status, body)"""
+
+        with self.lock:
+            case = self.cases.pop(case_id, None)
+            if case is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Case {case_id} not found"}
+            self.display_ids.pop(case["displayId"], None)
+            self.processing.pop(case_id, None)
+            return 204, None
+
+    def process(self, case_id):
+        """POST /cases/{id}/process; returns (status, body)"""
+
+        with self.lock:
+            case = self.cases.get(case_id)
+            if case is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Case {case_id} not found"}
+            case.update({"status": "In Progress", "subState": "PROCESSING", "activationState": "ACTIVE"})
+            case["modifiedDate"] = iso_time(datetime.utcnow())
+            self.processing[case_id] = time.monotonic()
+            return 200, None
+
+    def qc_action(self, case_id, action):
+        """POST /cases/{id}/qc-actions; returns (status, body)"""
+
+        with self.lock:
+            case = self.cases.get(case_id)
+            if case is None:
+                return 404, {"code": "NOT_FOUND", "message": f"Case {case_id} not found"}
+            if case["subState"] != "QC_WARNING":
+                return 400, {"code": "INVALID_STATE", "message": "The case is not in QC_WARNING"}
+            if action == "override":
+                case["subState"] = "PROCESSING"
+                self.processing[case_id] = time.monotonic()
+            elif action == "modify":
+                case["subState"] = "HAS_ISSUE"
+            else:
+                return 400, {"code": "BAD_REQUEST", "message": f"Unknown action {action}"}
+            case["modifiedDate"] = iso_time(datetime.utcnow())
+            return 200, {"message": f"QC {action} applied to case {case_id}"}
+
+
+class TokenBucket:
+    """Non-blocking token bucket; callers get 429 instead of waiting"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """True when a request may proceed"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Route requests to the case store"""
+
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in one write; avoids delayed-ACK stalls on keep-alive
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    routes = [
+        ("GET", re.compile(r"^/crs/api/v2/cases/search$"), "search_cases"),
+        ("POST", re.compile(r"^/crs/api/v1/cases$"), "create_case"),
+        ("GET", re.compile(r"^/crs/api/v1/cases/(?P<case_id>[^/]+)$"), "get_case"),
+        ("PUT", re.compile(r"^/crs/api/v1/cases/(?P<case_id>[^/]+)$"), "update_case"),
+        ("DELETE", re.compile(r"^/crs/api/v1/cases/(?P<case_id>[^/]+)$"), "delete_case"),
+        ("POST", re.compile(r"^/crs/api/v1/cases/(?P<case_id>[^/]+)/process$"), "process_case"),
+        ("POST", re.compile(r"^/crs/api/v1/cases/(?P<case_id>[^/]+)/qc-actions$"), "qc_action"),
+        ("GET", re.compile(r"^/crs/api/v1/files$"), "get_files"),
+        ("GET", re.compile(r"^/crs/api/v1/session/users$"), "get_users"),
+        (
+            "GET",
+            re.compile(r"^/drs/v1/draftreport/case/(?P<case_id>[^/]+)/reports/(?P<report_id>[^/]+)/pdf$"),
+            "get_pdf_report",
+        ),
+        ("GET", re.compile(r"^/drs/v1/draftreport/case/(?P<case_id>[^/]+)/json$"), "get_json_report"),
+        ("GET", re.compile(r"^/tms/api/v1/testDefinitions$"), "get_test_definitions"),
+    ]
+
+    # quiet unless --verbose
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.options.get("verbose"):
+            super().log_message(format, *args)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """GET"""
+        self.dispatch("GET")
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """POST"""
+        self.dispatch("POST")
+
+    def do_PUT(self):  # pylint: disable=invalid-name
+        """PUT"""
+        self.dispatch("PUT")
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        """DELETE"""
+        self.dispatch("DELETE")
+
+    def dispatch(self, method):
+        """Auth, rate limit, latency and error injection, then the endpoint"""
+
+        parts = urlsplit(self.path)
+        self.params = parse_qs(parts.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        handler, groups = "not_found", {}
+        for route_method, pattern, name in self.routes:
+            match = pattern.match(parts.path)
+            if match and route_method == method:
+                handler, groups = name, match.groupdict()
+                break
+        self.server.count(handler)
+
+        if not (self.headers.get("X-Auth-Token") or self.headers.get("Authorization")):
+            return self.send_json(401, {"code": "UNAUTHORIZED", "message": "Missing API key"})
+        if not self.server.allow(self.headers.get("X-ILMN-Workgroup")):
+            return self.send_json(429, {"code": "TOO_MANY_REQUESTS", "message": "Rate limit exceeded"})
+        self.server.delay()
+        if self.server.inject_error():
+            return self.send_json(
+                self.server.options["error_status"],
+                {"code": "INJECTED_ERROR", "message": "Injected server error"},
+            )
+
+        if handler == "not_found":
+            return self.send_json(404, {"code": "NOT_FOUND", "message": f"No route for {method} {parts.path}"})
+        return getattr(self, handler)(**groups)
+
+    # responses
+    def send_json(self, status, body):
+        """Send a JSON (or empty) response"""
+        data = b"" if body is None else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_bytes(self, status, data, content_type):
+        """Send a binary response"""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def param(self, name, default=None):
+        """First value of a query parameter"""
+        return (self.params.get(name) or [default])[0]
+
+    # CRS
+    def search_cases(self):
+        """GET /crs/api/v2/cases/search (Spring page)"""
+        page = int(self.param("page", 0))
+        size = int(self.param("size", 20))
+        matches = self.server.store.search(self.params)
+        total_pages = max(1, -(-len(matches) // size))
+        self.send_json(
+            200,
+            {
+                "content": matches[page * size:(page + 1) * size],
+                "number": page,
+                "size": size,
+                "totalElements": len(matches),
+                "totalPages": total_pages,
+                "last": page >= total_pages - 1,
+            },
+        )
+
+    def create_case(self):
+        """POST /crs/api/v1/cases"""
+        try:
+            payload = json.loads(self.body or b"{}")
+        except ValueError:
+            return self.send_json(400, {"code": "BAD_REQUEST", "message": "Invalid JSON"})
+        return self.send_json(*self.server.store.create(payload))
+
+    def get_case(self, case_id):
+        """GET /crs/api/v1/cases/{id}"""
+        case = self.server.store.get(case_id)
+        if case is None:
+            return self.send_json(404, {"code": "NOT_FOUND", "message": f"Case {case_id} not found"})
+        if self.param("directIdentifiers", "false").lower() != "true":
+            case = dict(case)
+            case["caseSubjects"] = [
+                {key: value for key, value in subject.items() if key not in PHI_FIELDS}
+                for subject in case["caseSubjects"]
+            ]
+        return self.send_json(200, case)
+
+    def update_case(self, case_id):
+        """PUT /crs/api/v1/cases/{id}"""
+        try:
+            payload = json.loads(self.body or b"{}")
+        except ValueError:
+            return self.send_json(400, {"code": "BAD_REQUEST", "message": "Invalid JSON"})
+        return self.send_json(*self.server.store.update(case_id, payload))
+
+    def delete_case(self, case_id):
+        """DELETE /crs/api/v1/cases/{id}"""
+        self.send_json(*self.server.store.delete(case_id))
+
+    def process_case(self, case_id):
+        """POST /crs/api/v1/cases/{id}/process"""
+        self.send_json(*self.server.store.process(case_id))
+
+    def qc_action(self, case_id):
+        """POST /crs/api/v1/cases/{id}/qc-actions?action=override|modify"""
+        self.send_json(*self.server.store.qc_action(case_id, self.param("action")))
+
+    def get_files(self):
+        """GET /crs/api/v1/files?path=... with presigned URLs"""
+        path = self.param("path", "")
+        files = [
+            {
+                "path": f"{path.rstrip('/')}/{name}",
+                "preSignedUrl": f"{self.server.base_url}/presigned{urlsplit(path).path}/{name}",
+            }
+            for name in ("sample.hard-filtered.vcf.gz", "sample.bam", "sample.mapping_metrics.csv")
+        ]
+        self.send_json(200, files)
+
+    def get_users(self):
+        """GET /crs/api/v1/session/users"""
+        self.send_json(200, self.server.store.users)
+
+    # DRS
+    def get_pdf_report(self, case_id, report_id):
+        """GET /drs/v1/draftreport/case/{id}/reports/{report id}/pdf"""
+        if self.server.store.get(case_id) is None:
+            return self.send_json(404, {"code": "NOT_FOUND", "message": f"Case {case_id} not found"})
+        header = f"%PDF-1.4\n% mock report {case_id} {report_id}\n".encode("utf-8")
+        size = max(self.server.options["pdf_kb"] * 1024, len(header))
+        return self.send_bytes(200, header + b"0" * (size - len(header)), "application/pdf")
+
+    def get_json_report(self, case_id):
+        """GET /drs/v1/draftreport/case/{id}/json"""
+        case = self.server.store.get(case_id)
+        if case is None:
+            return self.send_json(404, {"code": "NOT_FOUND", "message": f"Case {case_id} not found"})
+        variants = [
+            {"gene": f"GENE{position}", "hgvs": f"c.{position * 17}A>G", "classification": "VUS"}
+            for position in range(self.server.options["report_variants"])
+        ]
+        return self.send_json(
+            200, {"response": {"caseId": case_id, "displayId": case["displayId"], "variants": variants}}
+        )
+
+    # TMS
+    def get_test_definitions(self):
+        """GET /tms/api/v1/testDefinitions"""
+        self.send_json(200, {"items": self.server.store.tests})
+
+
+class MockTssServer(ThreadingHTTPServer):
+    """Threaded mock server; use start()/ stop() or a with block for in-process runs"""
+
+    daemon_threads = True
+
+    def __init__(self, store=None, host="127.0.0.1", port=0, **options):
+        self.options = {
+            "latency_ms": 0.0,
+            "jitter_ms": 0.0,
+            "error_rate": 0.0,
+            "error_status": 503,
+            "rate_limit": 0.0,
+            "pdf_kb": 64,
+            "report_variants": 50,
+            "seed": 1,
+            "verbose": False,
+        }
+        self.options.update(options)
+        self.store = store if store is not None else CaseStore(self.options["seed"])
+        self.rng = random.Random(self.options["seed"])
+        self.rng_lock = threading.Lock()
+        self.buckets = {}
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        self.thread = None
+        super().__init__((host, port), MockHandler)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    @property
+    def base_url(self):
+        """http://host:port"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.shutdown()
+        self.server_close()
+
+    # behaviour knobs
+    def count(self, route):
+        """Server-side request counter per route"""
+        with self.stats_lock:
+            self.stats[route] = self.stats.get(route, 0) + 1
+
+    def allow(self, workgroup):
+        """Per-workgroup rate limit (0 disables it)"""
+        if not self.options["rate_limit"]:
+            return True
+        with self.stats_lock:
+            bucket = self.buckets.setdefault(workgroup, TokenBucket(self.options["rate_limit"]))
+        return bucket.try_acquire()
+
+    def delay(self):
+        """Fixed latency plus uniform jitter"""
+        delay = self.options["latency_ms"]
+        if self.options["jitter_ms"]:
+            with self.rng_lock:
+                delay += self.rng.uniform(0, self.options["jitter_ms"])
+        if delay:
+            time.sleep(delay / 1000)
+
+    def inject_error(self):
+        """True for a random error_rate fraction of requests"""
+        if not self.options["error_rate"]:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < self.options["error_rate"]
+
+    def config(self):
+        """TSS config dict pointing at this server"""
+        return {
+            "domain": MOCK_DOMAIN,
+            "url": MOCK_URL,
+            "workgroup": MOCK_WORKGROUP,
+            "apiKey": MOCK_APIKEY,
+            "baseUrl": self.base_url,
+        }
+
+    def write_config(self, path):
+        """Write a TSS config file for the scripts (-c)"""
+        with open(os.path.expanduser(path), "w", encoding="utf-8") as config_file:
+            json.dump(self.config(), config_file, indent=2)
+        return os.path.abspath(os.path.expanduser(path))
+
+
+# run the server in another process
+def start_subprocess(cases=1000, config_out=None, **options):
+    """Start this script as a subprocess; returns (process, base URL) once it is listening"""
+
+    command = [sys.executable, os.path.abspath(__file__), "-n", str(cases)]
+    if config_out:
+        command += ["--config_out", config_out]
+    for name, value in options.items():
+        if isinstance(value, bool):
+            command += [f"--{name}"] if value else []
+        else:
+            command += [f"--{name}", str(value)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith(READY_MESSAGE):
+            return process, line.split()[-1]
+    process.wait()
+    raise RuntimeError(f"The mock TSS server exited with {process.returncode}")
+
+
+# get args
+def get_args():
+    """Get command line arguments"""
+    parser = argparse.ArgumentParser(description="Run a local mock TSS server")
+    parser.add_argument("-p", "--port", help="Port (default: any free port)", type=int, default=0)
+    parser.add_argument("-n", "--cases", help="Synthetic cases to seed (default: 1000)", type=int, default=1000)
+    parser.add_argument("--seed", help="Random seed (default: 1)", type=int, default=1)
+    parser.add_argument("--latency_ms", help="Added latency per request", type=float, default=0.0)
+    parser.add_argument("--jitter_ms", help="Uniform random latency on top", type=float, default=0.0)
+    parser.add_argument("--error_rate", help="Fraction of requests failing (0-1)", type=float, default=0.0)
+    parser.add_argument("--error_status", help="Injected error status (default: 503)", type=int, default=503)
+    parser.add_argument(
+        "--rate_limit", help="Requests per second per workgroup before 429s (0: off)", type=float, default=0.0
+    )
+    parser.add_argument(
+        "--processing_seconds",
+        help="Seconds a processed case stays PROCESSING (default: 2)",
+        type=float,
+        default=2.0,
+    )
+    parser.add_argument("--pdf_kb", help="PDF report size in KB (default: 64)", type=int, default=64)
+    parser.add_argument(
+        "--report_variants", help="Variants per JSON report (default: 50)", type=int, default=50
+    )
+    parser.add_argument("--config_out", help="Write a TSS config file pointing at the server", type=str)
+    parser.add_argument("--verbose", help="Log every request", action="store_true")
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    case_store = CaseStore(arguments.seed, arguments.processing_seconds).seed(arguments.cases)
+    server = MockTssServer(
+        case_store,
+        port=arguments.port,
+        latency_ms=arguments.latency_ms,
+        jitter_ms=arguments.jitter_ms,
+        error_rate=arguments.error_rate,
+        error_status=arguments.error_status,
+        rate_limit=arguments.rate_limit,
+        pdf_kb=arguments.pdf_kb,
+        report_variants=arguments.report_variants,
+        seed=arguments.seed,
+        verbose=arguments.verbose,
+    )
+    if arguments.config_out:
+        print(f"Config File:\t{server.write_config(arguments.config_out)}", flush=True)
+    print(f"Cases:\t{len(case_store.cases)}", flush=True)
+    print(f"{READY_MESSAGE} {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
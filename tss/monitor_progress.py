@@ -7,81 +7,156 @@
 # Monitor the progress of a case or sample
 # 1. Inputs: caseDisplayID or sampleID and an outputDir
 # 2. Outputs: case status update, sample status update
-# Notes:
+# Notes: runs standalone (-g case IDs or -i a file of case IDs, with a profile column when
+#        -c lists several profiles); start_case_pipeline polls with the same EXIT_STATUS
 ##################################################################
 
 import os
+import sys
+import csv
 import time
+import argparse
 from datetime import datetime
 import method_tools
 import case_mgt_v2
+import case_model
+import profile_tools
 
 
-def main(case_id, wait_time_min, interval_min, output_dir, config_file):
-    """Monitor a processing case"""
+EXIT_STATUS = [
+    "IN PROGRESS - READY FOR INTERPRETATION",
+    "IN PROGRESS - HAS ISSUE",
+    "IN PROGRESS - QC WARNING",
+    "IN PROGRESS - READY FOR REVIEW",
+    "IN PROGRESS - MISSING SAMPLE INFORMATION",
+]
 
-    config_dict = method_tools.parse_config(config_file)
 
-    # check and format the output dir
+def monitor_cases(cases, wait_time_min, interval_min, output_dir):
+    """Monitor many processing cases, possibly across workgroups, with one polling loop
+
+    cases is a list of (config_dict, case_id); configs from method_tools.load_profiles carry
+    a "profile" name. Returns {(profile, case_id): final case status or None}.
+    """
+
     directory = method_tools.format_path(output_dir)
+    pending = {(config.get("profile", config["wg"]), case_id): (config, case_id)
+               for config, case_id in cases}
+    statuses = {key: None for key in pending}
+    max_attempts = wait_time_min / interval_min
+    start = time.perf_counter()
+    attempts = 0
 
-    # create logging file
-    with open(directory + "monitor_progress.log", "w", encoding="UTF-8") as log_file:
-
-        # logging
-        print(f"{datetime.now()}\tStarting case monitoring.")
-        log_file.write(f"{datetime.now()}\tStarting case monitoring.\n")
-        log_file.write(f"{datetime.now()}\tCurrent Working Directory:\t{os.getcwd()}\n")
-        log_file.write(f"{datetime.now()}\tOutput Directory:\t{os.path.abspath(directory)}\n")
-        log_file.write(f"{datetime.now()}\tLog File:\t{os.path.abspath(log_file.name)}\n")
-
-        # get case info
-        log_file.write(f"{datetime.now()}\tCase ID:\t{case_id}\n")
-        exit_status = ["IN PROGRESS - READY FOR INTERPRETATION",
-                       "IN PROGRESS - HAS ISSUE",
-                       "IN PROGRESS - QC WARNING",
-                       "IN PROGRESS - READY FOR REVIEW",
-                       "IN PROGRESS - MISSING SAMPLE INFORMATION"]
-        attempts = 0
-        max_attempts = wait_time_min / interval_min
-        start = time.perf_counter()
-        runtime = None
-        case_status = None
-
-        while case_status is None:
-            # counter
+    with method_tools.JsonLog(directory + "monitor_progress.log") as log_file:
+        log_file.info("Monitoring cases", cases=len(pending))
+
+        while pending:
             attempts += 1
-            log_file.write("{datetime.now()}\tAttempt Number:\t{attempts}\n")
+            # failed checks (e.g. 429/ 5xx) keep the case pending instead of exiting
+            errors = {}
+            by_profile = {}
+            for (profile, case_id), (config, _) in pending.items():
+                by_profile.setdefault(profile, (config, []))[1].append(case_id)
+            fetched = dict(zip(by_profile, method_tools.run_concurrently(
+                lambda item: case_mgt_v2.get_cases(item[1], item[0], errors=errors),
+                by_profile.values(),
+            )))
+            for key in list(pending):
+                response = fetched[key[0]][key[1]]
+                if response is None:
+                    log_file.warning(
+                        "Case status check failed",
+                        profile=key[0],
+                        case_id=key[1],
+                        error=errors.get(key[1], "no case returned"),
+                    )
+                    continue
+                record = case_model.CaseRecord.from_json(response)
+                case_status = record.status_label
+                statuses[key] = case_status
+                if case_status in EXIT_STATUS or record.status in ["New", "Complete"]:
+                    del pending[key]
+                    print(f"{datetime.now()}\t{key[0]}\t{key[1]}\tCase Status:\t{case_status}")
+                    log_file.info("Case status", profile=key[0], case_id=key[1], status=case_status)
+
+            runtime = (time.perf_counter() - start) / 60
+            if not pending:
+                break
             if attempts >= max_attempts:
-                log_file.write(f"{datetime.now()}\tThe maximum attempts, {max_attempts}, were reached.\n")
-                log_file.write(f"{datetime.now()}\tRuntime:\t{round(runtime, 3)} (min.)\n")
+                log_file.warning(
+                    f"The maximum attempts, {max_attempts}, were reached.", pending=len(pending)
+                )
                 break
+            print(f"{datetime.now()}\tCases Still Processing:\t{len(pending)}")
+            print(f"{datetime.now()}\tScript Runtime:\t{round(runtime, 3)} (min.)")
+            with method_tools.TRACER.span("sleep", "wait", pending=len(pending), attempt=attempts):
+                time.sleep(interval_min * 60)
 
-            result = case_mgt_v2.get_case(case_id, config_dict)
-            case_status = f"{result['status'].upper()} - {result['subState'].upper().replace('_', ' ')}"
-            log_file.write(f"{datetime.now()}\tCase Status:\t{result}\n")
-
-            # exit if RFI or Has Issues or QC Warning
-            # Keeps monitoring when edge cases are found
-            if case_status in exit_status or result["status"] in ["New", "Complete"]:
-                runtime = (time.perf_counter() - start) / 60
-                print(f"{datetime.now()}\tCase monitoring complete.".format())
-                print(f"{datetime.now()}\tCase Status:\t{case_status}")
-                print(f"{datetime.now()}\tScript Runtime:\t{round(runtime, 3)} (min.)")
-                break
+    return statuses
 
-            # keep waiting but check for case status changes
-            # print the status update
-            runtime = (time.perf_counter() - start) / 60
-            print(f"{datetime.now()}\tCase Status:\t{case_status}")
-            print(f"{datetime.now()}\tScript Runtime:\t{round(runtime, 3)} (min.)")
-            print(f"{datetime.now()}\tSleeping for {interval_min} minutes. Please check back then.")
 
-            # wait for RFI result
-            log_file.write(f"{datetime.now()}\tCase Status:\t{result}\n")
-            log_file.write(f"{datetime.now(datetime.now())}\tScript Runtime:\t{round(runtime, 3)} (min.)\n")
-            log_file.write(f"{datetime.now()}\tSleeping for {interval_min} minutes. Please check back then.\n")
-            time.sleep(interval_min * 60)
-            case_status = None
+# get args
+def get_args():
+    """Get command line arguments"""
+    parser = argparse.ArgumentParser(description="Monitor processing TSS cases")
+    parser.add_argument(
+        "-g", "--case_guid", help="Comma separated case GUIDs", type=str, default=None
+    )
+    parser.add_argument(
+        "-i",
+        "--input_file",
+        help="CSV with a header and case GUIDs in the first column (e.g. filter_case_list output)",
+        type=str,
+        default=None,
+    )
+    parser.add_argument("-o", "--output_dir", help="Path for the log file", type=str, required=True)
+    parser.add_argument(
+        "-c",
+        "--config_file",
+        help="TSS CLI config file or profile name, or a comma separated list of them. With "
+        "several profiles the input file needs a second column naming each case's profile "
+        "(e.g. filter_case_list output). Default ~/.illumina/uploader-config.json",
+        type=str,
+        default=os.path.expanduser("~/.illumina/uploader-config.json"),
+    )
+    parser.add_argument(
+        "-w", "--wait_time", help="Minutes to wait in total (default: 330)", type=float, default=330
+    )
+    parser.add_argument(
+        "-n", "--interval", help="Minutes between status checks (default: 5)", type=float, default=5
+    )
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
+
+    if bool(arguments.case_guid) == bool(arguments.input_file):
+        print("Exiting...")
+        print("Expected Options (1) or (2):")
+        print("(1) -g/ --case_guid")
+        print("(2) -i/ --input_file")
+        sys.exit()
+
+    # with several profiles the input file names each case's profile in its second column
+    profiles = method_tools.load_profiles(arguments.config_file)
+    single_profile = len(profiles) == 1
+    if arguments.case_guid:
+        if not single_profile:
+            print("[ERROR] With several profiles use -i/ --input_file with a profile column")
+            sys.exit()
+        rows = [[case_id] for case_id in arguments.case_guid.split(",")]
+    else:
+        method_tools.check_path(arguments.input_file)
+        with open(arguments.input_file, "r", encoding="utf-8", newline="") as file:
+            rows = list(csv.reader(file))[1:]
 
-        return case_status
+    cases = method_tools.assign_profiles(rows, profiles)
+    statuses = monitor_cases(cases, arguments.wait_time, arguments.interval, arguments.output_dir)
+    for (profile_name, case_id), status in statuses.items():
+        print(f"{case_id}\t{status}" if single_profile else f"{profile_name}\t{case_id}\t{status}")
@@ -11,10 +11,68 @@
 ##################################################################
 
 import os
-import json
 import method_tools
 
 
+# read the EHR: case JSON with the sample IDs filled in, and the requested test
+def read_ehr(input_file):
+    """Return (case JSON, test name, test version) from an EHR JSON file"""
+
+    # open input
+    with open(input_file, "r", encoding="UTF-8") as ehr:
+        ehr_json = method_tools.json_load(ehr)
+        case_json = ehr_json["caseInfo"]
+
+    # the test
+    test_name = ehr_json["quickStart"]["testName"]
+    test_version = ehr_json["quickStart"]["test_version"]
+
+    # get sample
+    proband = ehr_json["quickStart"]["externalSampleId"]["proband"]
+    try:
+        mother = ehr_json["quickStart"]["externalSampleId"]["mother"]
+    except KeyError:
+        pass
+    try:
+        father = ehr_json["quickStart"]["externalSampleId"]["father"]
+    except KeyError:
+        pass
+    try:
+        sibling = ehr_json["quickStart"]["externalSampleId"]["sibling"]
+    except KeyError:
+        pass
+
+    for i in range(len(case_json["subjects"])):
+        if case_json["subjects"][i]["relationshipToProband"] == "PROBAND":
+            case_json["subjects"][i]["samples"][0]["externalSampleId"] = proband
+        elif case_json["subjects"][i]["relationshipToProband"] == "MOTHER":
+            case_json["subjects"][i]["samples"][0]["externalSampleId"] = mother
+        elif case_json["subjects"][i]["relationshipToProband"] == "FATHER":
+            case_json["subjects"][i]["samples"][0]["externalSampleId"] = father
+        elif case_json["subjects"][i]["relationshipToProband"] == "SIBLING":
+            case_json["subjects"][i]["samples"][0]["externalSampleId"] = sibling
+
+    return case_json, test_name, test_version
+
+
+# add the test definition to the case JSON
+def apply_test(case_json, test_id, report_types):
+    """Set the test definition ID and the proband's report types"""
+
+    case_json["testDefinitionId"] = test_id
+    case_json["subjects"][0]["reportTypes"] = report_types
+    return case_json
+
+
+# write the case JSON for post_case
+def write_case_json(case_json, directory):
+    """Write case.json to the output dir; returns its path"""
+
+    with open(directory + "case.json", "w", encoding="UTF-8") as case_json_file:
+        method_tools.json_dump(case_json, case_json_file)
+    return os.path.abspath(case_json_file.name)
+
+
 def main(input_file, output_dir, config):
     """Extract info from the input EHR/ JSON file"""
 
@@ -22,57 +80,31 @@ def main(input_file, output_dir, config):
     directory = method_tools.format_path(os.path.abspath(output_dir))
 
     # create logging file
-    with open(directory + "parse_ehr.log", "w", encoding="UTF-8") as logfile:
+    with method_tools.JsonLog(directory + "parse_ehr.log") as logfile:
 
         # logging
-        logfile.write(f"Current Working Directory:\t{os.getcwd()}\n")
-        logfile.write(f"Output Directory:\t{directory}\n")
-        logfile.write(f"Log File:\t{logfile.name}\n")
+        logfile.info(
+            "Parsing EHR",
+            working_directory=os.getcwd(),
+            output_directory=directory,
+            input_file=input_file,
+        )
 
-        # open input
-        with open(input_file, "r", encoding="UTF-8") as ehr:
-            ehr_json = json.load(ehr)
-            case_json = ehr_json["caseInfo"]
+        # read the EHR
+        case_json, test_name, test_version = read_ehr(input_file)
 
         # get the test
-        test_name = ehr_json["quickStart"]["testName"]
-        test_version = ehr_json["quickStart"]["test_version"]
-        test_id, report_types = method_tools.get_test(test_name=test_name, test_version=test_version, config=config)
-
-        case_json["testDefinitionId"] = test_id
-        case_json["subjects"][0]["reportTypes"] = report_types
-
-        # get sample
-        proband = ehr_json["quickStart"]["externalSampleId"]["proband"]
-        try:
-            mother = ehr_json["quickStart"]["externalSampleId"]["mother"]
-        except KeyError:
-            pass
-        try:
-            father = ehr_json["quickStart"]["externalSampleId"]["father"]
-        except KeyError:
-            pass
-        try:
-            sibling = ehr_json["quickStart"]["externalSampleId"]["sibling"]
-        except KeyError:
-            pass
-
-        for i in range(len(case_json["subjects"])):
-            if case_json["subjects"][i]["relationshipToProband"] == "PROBAND":
-                case_json["subjects"][i]["samples"][0]["externalSampleId"] = proband
-            elif case_json["subjects"][i]["relationshipToProband"] == "MOTHER":
-                case_json["subjects"][i]["samples"][0]["externalSampleId"] = mother
-            elif case_json["subjects"][i]["relationshipToProband"] == "FATHER":
-                case_json["subjects"][i]["samples"][0]["externalSampleId"] = father
-            elif case_json["subjects"][i]["relationshipToProband"] == "SIBLING":
-                case_json["subjects"][i]["samples"][0]["externalSampleId"] = sibling
+        with method_tools.TRACER.span("get_test", test_name=test_name, test_version=test_version):
+            test_id, report_types = method_tools.get_test(
+                test_name=test_name, test_version=test_version, config=config
+            )
+        apply_test(case_json, test_id, report_types)
 
         # write case json to file
-        with open(directory + "case.json", "w", encoding="UTF-8") as case_json_file:
-            case_json_file.write(json.dumps(case_json))
+        case_json_path = write_case_json(case_json, directory)
 
         # logging
-        logfile.write(f"Case JSON Path:\t{os.path.abspath(case_json_file.name)}\n")
-        logfile.write(f"Case JSON:\t{json.dumps(case_json)}")
+        logfile.info("Case JSON", path=case_json_path)
+        logfile.payload("Case JSON", case_json)
 
-    return case_json, os.path.abspath(case_json_file.name)
+    return case_json, case_json_path
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Profiling options shared by the tss/ and dragen_tools/ entry points"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# --profile and --trace-malloc for every script
+# 1. Inputs: --profile <path prefix>, --trace-malloc
+# 2. Outputs: <prefix>.pstats (cProfile), <prefix>.collapsed (sampled stacks for
+#    flamegraph.pl/ speedscope), <prefix>.malloc.txt and a stderr summary
+# Notes: argparse tools call add_profile_args/ set_profiling like the metrics options;
+#        positional-argument tools call start_from_argv before reading sys.argv.
+#        cProfile covers the main thread; the stack sampler covers every thread.
+#        Standard library only, so it can be imported before requests/ pandas.
+##################################################################
+
+import os
+import sys
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+SAMPLE_INTERVAL = 0.005
+MALLOC_FRAMES = 25
+MALLOC_TOP = 20
+PSTATS_TOP = 25
+MALLOC_IGNORED = [
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+]
+
+
+class StackSampler(threading.Thread):
+    """Sample every thread's stack at a fixed interval into collapsed-stack counts"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.counts = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    name = getattr(code, "co_qualname", code.co_name)
+                    stack.append(f"{os.path.basename(code.co_filename)}:{name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(" ", "_"))
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self):
+        """Stop sampling"""
+        self.stopped.set()
+        self.join(timeout=1)
+
+    def write(self, path):
+        """One 'frame;frame;frame count' line per stack"""
+        with open(path, "w", encoding="utf-8") as collapsed:
+            for stack, count in sorted(self.counts.items()):
+                collapsed.write(f"{stack} {count}\n")
+
+
+# start profilers
+def start(prefix=None, trace_malloc=False):
+    """Start cProfile and the stack sampler (prefix) and/ or tracemalloc; reports at exit"""
+
+    # atexit runs last-registered first: the allocation report comes before pstats output
+    if prefix:
+        prefix = os.path.abspath(os.path.expanduser(prefix))
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+        sampler = StackSampler()
+        profiler = cProfile.Profile()
+        atexit.register(report_profile, profiler, sampler, prefix, time.perf_counter())
+        sampler.start()
+        profiler.enable()
+    if trace_malloc:
+        tracemalloc.start(MALLOC_FRAMES)
+        atexit.register(report_malloc, prefix)
+
+
+def report_profile(profiler, sampler, prefix, started):
+    """Write pstats and collapsed stacks; print the top functions by cumulative time"""
+
+    profiler.disable()
+    sampler.stop()
+    profiler.dump_stats(prefix + ".pstats")
+    sampler.write(prefix + ".collapsed")
+    print(f"\nProfile ({time.perf_counter() - started:.2f} s):", file=sys.stderr)
+    pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PSTATS_TOP)
+    print(f"Profile Stats:\t{prefix}.pstats", file=sys.stderr)
+    print(f"Collapsed Stacks:\t{prefix}.collapsed", file=sys.stderr)
+
+
+def report_malloc(prefix=None):
+    """Print (and write) the top allocation sites and the peak traced memory"""
+
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+        + [tracemalloc.Filter(False, pattern) for pattern in MALLOC_IGNORED]
+    )
+    tracemalloc.stop()
+    lines = [f"Traced Memory:\tcurrent {current / 2**20:.1f} MB, peak {peak / 2**20:.1f} MB"]
+    lines.append(f"Top {MALLOC_TOP} allocation sites (still allocated at exit):")
+    for stat in snapshot.statistics("lineno")[:MALLOC_TOP]:
+        frame = stat.traceback[0]
+        lines.append(
+            f"  {stat.size / 1024:10.1f} KB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}"
+        )
+    print("\n" + "\n".join(lines), file=sys.stderr)
+    if prefix:
+        path = prefix + ".malloc.txt"
+        with open(path, "w", encoding="utf-8") as report:
+            report.write("\n".join(lines) + "\n")
+        print(f"Allocation Report:\t{path}", file=sys.stderr)
+
+
+# argparse tools
+def add_profile_args(parser):
+    """Add --profile and --trace-malloc to an argparse parser"""
+
+    parser.add_argument(
+        "--profile",
+        help="Profile the run: writes <PROFILE>.pstats (cProfile) and <PROFILE>.collapsed "
+        "(stacks for flamegraphs)",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--trace-malloc",
+        "--trace_malloc",
+        dest="trace_malloc",
+        help="Report the peak traced memory and the top allocation sites at exit",
+        action="store_true",
+    )
+
+
+def set_profiling(args):
+    """Start the profilers requested on the command line"""
+
+    start(getattr(args, "profile", None), getattr(args, "trace_malloc", False))
+
+
+# tools that read sys.argv directly
+def start_from_argv(argv=None):
+    """Remove --profile <prefix>/ --trace-malloc from argv (default sys.argv) and start them"""
+
+    argv = sys.argv if argv is None else argv
+    prefix = None
+    trace_malloc = False
+    remaining = [argv[0]] if argv else []
+    position = 1
+    while position < len(argv):
+        argument = argv[position]
+        if argument in ("--trace-malloc", "--trace_malloc"):
+            trace_malloc = True
+        elif argument.startswith("--profile="):
+            prefix = argument.partition("=")[2]
+        elif argument == "--profile" and position + 1 < len(argv):
+            prefix = argv[position + 1]
+            position += 1
+        else:
+            remaining.append(argument)
+        position += 1
+    argv[:] = remaining
+    start(prefix, trace_malloc)
+    return prefix, trace_malloc
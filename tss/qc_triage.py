@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""QC override or QC modify many QC_WARNING cases"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Bulk QC triage
+# 1. Inputs: config, output dir, QC action, case selection (display IDs, tags or a display ID rule)
+# 2. Outputs: qc_triage.csv with the result per case (NOT_FOUND for requested display IDs
+#    that are not QC_WARNING cases, e.g. typos or cases already triaged)
+# Notes: QC_WARNING cases are listed with one paged search; no per-case display ID lookups
+##################################################################
+
+import os
+import re
+import csv
+import sys
+import argparse
+import method_tools
+import profile_tools
+import search
+import case_mgt_v2
+
+HOME = os.environ["HOME"]
+
+
+# get args
+def get_args():
+    """Get input arguments"""
+    parser = argparse.ArgumentParser(
+        description="QC override or QC modify QC_WARNING cases in bulk"
+    )
+    parser.add_argument(
+        "-c",
+        "--config_file",
+        help="Provide a TSS CLI config file. Default ~/.illumina/uploader-config.json",
+        type=str,
+        default=f"{HOME}/.illumina/uploader-config.json",
+    )
+    parser.add_argument(
+        "-o", "--output_dir", help="Path to write the results CSV", type=str, required=True
+    )
+    parser.add_argument(
+        "-a",
+        "--action",
+        choices=["override", "modify"],
+        help="QC action applied to the selected cases",
+        type=str,
+        required=True,
+    )
+    parser.add_argument(
+        "-d",
+        "--display_ids",
+        help="Comma separated list of case display IDs, or a file with one display ID per line",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "-t",
+        "--tags",
+        help="Select cases with any of the tag(s). Provide a case-sensitive comma separated list",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "-r",
+        "--rule",
+        help="Select cases whose display ID matches a regular expression (e.g. '^BATCH12-')",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--all",
+        help="Select every QC_WARNING case",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-w",
+        "--max_workers",
+        help=f"Number of concurrent requests (default: {method_tools.MAX_WORKERS})",
+        type=int,
+        default=method_tools.MAX_WORKERS,
+    )
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+# read the display ID selection
+def read_display_ids(value):
+    """Comma separated list or file with one display ID per line"""
+
+    if os.path.isfile(value):
+        with open(value, "r", encoding="utf-8") as file:
+            entries = [line.strip() for line in file if not line.startswith("#")]
+    else:
+        entries = value.split(",")
+    return {entry.strip().upper() for entry in entries if entry.strip()}
+
+
+# build the selection rule
+def build_selector(display_ids=None, tags=None, rule=None, select_all=False):
+    """Return a function deciding whether a QC_WARNING case is triaged"""
+
+    if select_all:
+        return lambda case: True
+
+    wanted_ids = read_display_ids(display_ids) if display_ids else None
+    wanted_tags = {tag.strip() for tag in tags.split(",")} if tags else None
+    pattern = re.compile(rule) if rule else None
+
+    def selector(case):
+        if wanted_ids is not None and case["displayId"].upper() in wanted_ids:
+            return True
+        if wanted_tags is not None and wanted_tags.intersection(case.get("tags") or []):
+            return True
+        if pattern is not None and pattern.search(case["displayId"]):
+            return True
+        return False
+
+    return selector
+
+
+# list QC_WARNING cases once
+def get_qc_warning_cases(config_dict, selector):
+    """Page through subState=QC_WARNING cases and keep the selected ones"""
+
+    print("Searching for QC_WARNING cases")
+    cases = [
+        case
+        for case in search.search_pages({"subState": "QC_WARNING"}, config_dict)
+        if selector(case)
+    ]
+    print(f"Selected QC_WARNING Cases:\t{len(cases)}")
+    return cases
+
+
+# requested display IDs that matched no QC_WARNING case
+def not_found_results(display_ids, cases, action):
+    """One NOT_FOUND row per requested display ID missing from the QC_WARNING cases"""
+
+    found = {case["displayId"].upper() for case in cases}
+    return [
+        {
+            "display_id": display_id,
+            "case_id": None,
+            "action": action,
+            "status_code": None,
+            "result": "NOT_FOUND",
+            "message": "No QC_WARNING case with this display ID",
+        }
+        for display_id in sorted(read_display_ids(display_ids) - found)
+    ]
+
+
+# apply the QC action to every case
+def triage_cases(cases, action, config_dict, max_workers=method_tools.MAX_WORKERS):
+    """QC override or modify cases concurrently under the shared rate limiter"""
+
+    def apply(case):
+        # one failed request must not lose the other cases' results
+        try:
+            response = case_mgt_v2.post_qc_action(case["id"], action, config_dict)
+        except method_tools.RequestException as err:
+            return {
+                "display_id": case["displayId"],
+                "case_id": case["id"],
+                "action": action,
+                "status_code": None,
+                "result": "FAILED",
+                "message": f"{type(err).__name__}: {err}",
+            }
+        try:
+            message = method_tools.response_json(response).get("message", "")
+        except ValueError:
+            message = response.text
+        return {
+            "display_id": case["displayId"],
+            "case_id": case["id"],
+            "action": action,
+            "status_code": response.status_code,
+            "result": "SUCCESS" if response.status_code == 200 else "FAILED",
+            "message": message,
+        }
+
+    return method_tools.run_concurrently(apply, cases, max_workers)
+
+
+# write the results CSV
+def write_results(results, output_file):
+    """Write one row per case"""
+
+    fields = ["display_id", "case_id", "action", "status_code", "result", "message"]
+    with open(output_file, "w", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+# main runs automatically
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
+
+    # check for a selection
+    if not (
+        arguments.display_ids or arguments.tags or arguments.rule or arguments.all
+    ):
+        print(
+            "[ERROR] Select cases with -d/--display_ids, -t/--tags, -r/--rule, or --all"
+        )
+        sys.exit()
+
+    # check and format the output dir
+    directory = method_tools.format_path(os.path.abspath(arguments.output_dir))
+    config = method_tools.parse_config(arguments.config_file)
+
+    # logging
+    print(f"Current Working Directory:\t{os.getcwd()}")
+    print(f"Output Directory:\t{directory}")
+    print(f"QC Action:\t{arguments.action}")
+
+    case_selector = build_selector(
+        arguments.display_ids, arguments.tags, arguments.rule, arguments.all
+    )
+    try:
+        qc_cases = get_qc_warning_cases(config, case_selector)
+    except method_tools.HTTPError as http_err:
+        print(f"HTTP error occurred: {http_err}")
+        print("Exiting.")
+        sys.exit()
+    qc_results = triage_cases(qc_cases, arguments.action, config, arguments.max_workers)
+    if arguments.display_ids:
+        qc_results += not_found_results(arguments.display_ids, qc_cases, arguments.action)
+
+    results_file = directory + "qc_triage.csv"
+    write_results(qc_results, results_file)
+
+    # summary
+    failed = sum(1 for entry in qc_results if entry["result"] == "FAILED")
+    not_found = sum(1 for entry in qc_results if entry["result"] == "NOT_FOUND")
+    print(f"Cases QC {arguments.action}:\t{len(qc_results) - failed - not_found}")
+    print(f"Cases Failed:\t{failed}")
+    print(f"Cases Not Found:\t{not_found}")
+    print(f"Results CSV:\t{results_file}")
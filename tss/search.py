@@ -16,12 +16,30 @@ import os
 import sys
 import argparse
 import textwrap
-import requests
-from requests.exceptions import HTTPError
 import method_tools
+import profile_tools
 
 HOME = os.environ["HOME"]
 SEARCH_URL = "/crs/api/v2/cases/search"
+SEARCH_PAGE_SIZE = 100
+STATUSES = ["Draft", "New", "In Progress", "Complete", "Canceled", "Deletion"]
+SUB_STATES = [
+    "MISSING_SAMPLE_INFORMATION",
+    "PROCESSING",
+    "HAS_ISSUE",
+    "AWAITING_MOLECULAR_DATA",
+    "READY_FOR_INTERPRETATION",
+    "READY_FOR_REVIEW",
+    "REPORTS_AVAILABLE",
+    "READY_FOR_PROCESSING",
+    "QC_WARNING",
+    "FAILED_TO_ADD_VIRTUAL_VARIANT",
+    "FAILED_TO_PROCESS_PATHOGENICITY_UPDATE",
+    "FAILED_TO_PROCESS_PHENOTYPE_OVERLAP",
+    "DELETION_IN_PROGRESS",
+    "DELETION_HAS_ISSUE",
+    "CLOSED",
+]
 
 """"
 Name	Type 	Description
@@ -47,23 +65,27 @@ fa7ae01bbebc will include dc25cd92-78e0-11e8-adc0-fa7ae01bbebc in result
 
 
 # Search
-def search(option, search_term, config_dict):
-    """search for cases"""
+def search(option=None, search_term=None, config_dict=None, criteria=None):
+    """search for cases
+
+    option/ search_term is a single pre-formatted query; criteria is a dict of
+    {searchName: value or [values]} combined into one request (lists repeat the parameter)
+    """
     # print("Attempting to search for cases")
 
-    # Get headers
-    headers = method_tools.get_headers_apikey(
-        config_dict["apikey"], config_dict["domain"], config_dict["wg"]
-    )
-    url = f"https://{config_dict['domain']}.{config_dict['url']}{SEARCH_URL}?{option}={search_term}"
+    url = f"{method_tools.get_base_url(config_dict)}{SEARCH_URL}"
+    if option:
+        url += f"?{option}={search_term}"
+    criteria = criteria or {}
 
     # print(f"Request URL:\t{url}")
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        # pooled, rate limited session shared with concurrent searches
+        response = method_tools.api_request("GET", url, config_dict, params=criteria)
         response.raise_for_status()
 
     # If the response was successful, no Exception will be raised
-    except HTTPError as http_err:
+    except method_tools.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")  # Python 3.6
         print("Exiting.")
         sys.exit()
@@ -71,16 +93,100 @@ def search(option, search_term, config_dict):
         print(f"Other error occurred: {err}")  # Python 3.6
         sys.exit()
     else:
-        if response.json()["content"]:
-            return response.json()
-        print(f"Cases matching {option} {search_term} cannot be found!!")
+        results = method_tools.response_json(response)
+        if results["content"]:
+            return results
+        terms = [f"{option} {search_term}"] if option else []
+        terms += [f"{name} {value}" for name, value in criteria.items()]
+        print(f"Cases matching {', '.join(terms)} cannot be found!!")
         return response.text
 
 
-def parse_search_response(search_response):
+# Check a search term
+def check_search_term(name, term):
+    """Exit when a status or subState is invalid"""
+
+    # check that status is valid
+    if name == "status":
+        if term not in STATUSES:
+            print(
+                "Invalid status; must be one of 'Draft', 'New', 'In Progress', 'Complete', 'Canceled', 'Deletion'"
+            )
+            sys.exit()
+
+    # check that subState is valid
+    if name == "subState":
+        if term not in SUB_STATES:
+            print(
+                "Invalid subState: must be one of 'MISSING_SAMPLE_INFORMATION', 'PROCESSING', 'HAS_ISSUE', '"
+                "AWAITING_MOLECULAR_DATA', 'READY_FOR_INTERPRETATION', 'READY_FOR_REVIEW','REPORTS_AVAILABLE', "
+                "'READY_FOR_PROCESSING', 'QC_WARNING', 'FAILED_TO_ADD_VIRTUAL_VARIANT', "
+                "'FAILED_TO_PROCESS_PATHOGENICITY_UPDATE', 'FAILED_TO_PROCESS_PHENOTYPE_OVERLAP', "
+                "'DELETION_IN_PROGRESS', 'DELETION_HAS_ISSUE', 'CLOSED'"
+            )
+            sys.exit()
+
+
+# Combine search names and terms
+def build_criteria(names, terms):
+    """Pair -n/-s arguments into one criteria dict"""
+
+    if len(names) != len(terms):
+        print("[ERROR] Provide one -s/--searchTerm for every -n/--searchName")
+        sys.exit()
+
+    criteria = {}
+    for name, term in zip(names, terms):
+        if name in criteria:
+            print(f"[ERROR] {name} was given more than once")
+            sys.exit()
+
+        # searching by tags array; strip any whitespace around items
+        if name == "tags":
+            criteria[name] = [entry.strip() for entry in term.split(",")]
+        else:
+            check_search_term(name, term)
+            criteria[name] = term
+    return criteria
+
+
+# Page through search results
+def iter_search_pages(params, config_dict, page_size=SEARCH_PAGE_SIZE, start_page=0):
+    """Yield (page number, cases) for every page matching the search parameters
+
+    A failed page raises HTTPError; the command line tools print it and exit.
+    """
+
+    url = f"{method_tools.get_base_url(config_dict)}{SEARCH_URL}"
+    page = start_page
+    while True:
+        response = method_tools.api_request(
+            "GET", url, config_dict, params={**params, "page": page, "size": page_size}
+        )
+        response.raise_for_status()
+        results = method_tools.response_json(response)
+        content = results.get("content") or []
+        if content:
+            yield page, content
+
+        page += 1
+        if not content or results.get("last") or page >= results.get("totalPages", page):
+            break
+
+
+def search_pages(params, config_dict, page_size=SEARCH_PAGE_SIZE):
+    """Yield every case matching the search parameters, one page at a time"""
+
+    for _, content in iter_search_pages(params, config_dict, page_size):
+        yield from content
+
+
+def parse_search_response(search_response, profile=None):
     """Parse the search response"""
-    if search_response:
+    if isinstance(search_response, dict):
         for case in search_response["content"]:
+            if profile:
+                print("Profile:", profile)
             print("Case ID:", case["id"])
             print("Display ID:", case["displayId"])
             print("Status:", case["status"])
@@ -93,13 +199,19 @@ if __name__ == "__main__":
 
     # Add an argument
     parser.add_argument(
-        "-c", "--configFile", help="Path to a TSS config file", type=str, required=False
+        "-c",
+        "--configFile",
+        help="Path to a TSS config file, or a comma separated list of config files/ profile "
+        "names (~/.illumina/<name>.json) searched concurrently",
+        type=str,
+        required=False,
     )
     parser.add_argument(
         "-s",
         "--searchTerm",
-        help="search term for specific name",
+        help="search term for specific name; repeat -n/-s pairs to combine criteria in one request",
         type=str,
+        action="append",
         required=True,
     )
     parser.add_argument(
@@ -116,6 +228,7 @@ if __name__ == "__main__":
             "tags",
             "testDefinitionId",
         ],
+        action="append",
         help=textwrap.dedent(
             """
         displayId [string]\tAllows partial search e.g. ILM-ABC-234, ABC, 234 will include ILM-ABC-234 in result
@@ -139,72 +252,26 @@ if __name__ == "__main__":
     )
 
     # Parse the argument
+    method_tools.add_metrics_args(parser)
+    profile_tools.add_profile_args(parser)
     args = parser.parse_args()
+    profile_tools.set_profiling(args)
+    method_tools.set_metrics(args)
 
     # Get config_file
     # default config file path
     configFile = args.configFile or HOME + "/.illumina/uploader-config.json"
-    config = method_tools.parse_config(configFile)
-
-    # Search by search term #
-    term = args.searchTerm
-    name = args.searchName
+    profiles = method_tools.load_profiles(configFile)
 
-    # searching by tags array
-    if name == "tags":
-        # strip any whitespace around items in the tags array
-        tags = [entry.strip() for entry in term.split(",")]
-        TAGS_TERMS = "&tags=".join(tags)
-
-        # perform search
-        search_results = search(name, TAGS_TERMS, config)
+    # Search by all search terms in one request (per profile) #
+    search_criteria = build_criteria(args.searchName, args.searchTerm)
+    if len(profiles) == 1:
+        config = next(iter(profiles.values()))
+        search_results = search(criteria=search_criteria, config_dict=config)
         parse_search_response(search_results)
-
-    # searching by any other type of search term
     else:
-        # check that status is valid
-        if name == "status":
-            if term not in [
-                "Draft",
-                "New",
-                "In Progress",
-                "Complete",
-                "Canceled",
-                "Deletion",
-            ]:
-                print(
-                    "Invalid status; must be one of 'Draft', 'New', 'In Progress', 'Complete', 'Canceled', 'Deletion'"
-                )
-                sys.exit()
-
-        # check that subState is valid
-        if name == "subState":
-            if term not in [
-                "MISSING_SAMPLE_INFORMATION",
-                "PROCESSING",
-                "HAS_ISSUE",
-                "AWAITING_MOLECULAR_DATA",
-                "READY_FOR_INTERPRETATION",
-                "READY_FOR_REVIEW",
-                "REPORTS_AVAILABLE",
-                "READY_FOR_PROCESSING",
-                "QC_WARNING",
-                "FAILED_TO_ADD_VIRTUAL_VARIANT",
-                "FAILED_TO_PROCESS_PATHOGENICITY_UPDATE",
-                "FAILED_TO_PROCESS_PHENOTYPE_OVERLAP",
-                "DELETION_IN_PROGRESS",
-                "DELETION_HAS_ISSUE",
-                "CLOSED",
-            ]:
-                print(
-                    "Invalid subState: must be one of 'MISSING_SAMPLE_INFORMATION', 'PROCESSING', 'HAS_ISSUE', '"
-                    "AWAITING_MOLECULAR_DATA', 'READY_FOR_INTERPRETATION', 'READY_FOR_REVIEW','REPORTS_AVAILABLE', "
-                    "'READY_FOR_PROCESSING', 'QC_WARNING', 'FAILED_TO_ADD_VIRTUAL_VARIANT', "
-                    "'FAILED_TO_PROCESS_PATHOGENICITY_UPDATE', 'FAILED_TO_PROCESS_PHENOTYPE_OVERLAP', "
-                    "'DELETION_IN_PROGRESS', 'DELETION_HAS_ISSUE', 'CLOSED'"
-                )
-                sys.exit()
-
-        # perform search
-        search_results = search(name, term, config)
-        parse_search_response(search_results)
+        profile_results = method_tools.run_per_profile(
+            lambda config: search(criteria=search_criteria, config_dict=config), profiles
+        )
+        for profile_name, search_results in profile_results.items():
+            parse_search_response(search_results, profile=profile_name)
@@ -4,15 +4,21 @@
 # Author: LeAnne Lovato
 # Email: llovato@illumina.com
 # Start TSS case pipeline
-# 1. Inputs: EHR JSON, output dir, [optional] config
-# 2. Outputs: None
-# Pipeline Steps:
-# Pipeline Step - Debug_Mode (skip case & sample creation)
-# Pipeline Step - Get TSS Credentials
-# Pipeline Step - Create Config
-# Pipeline Step - Parse Input
-# Pipeline Step - Create Case
-# Pipeline Step - Monitor for Case Status
+# 1. Inputs: EHR JSON(s), output dir, [optional] config
+# 2. Outputs: case JSON, post/ process/ monitor logs, reports and pipeline_checkpoint.json
+#    (step outputs and timings) in the output dir (one sub-dir per EHR with several EHRs)
+# Pipeline Steps (workflow.py runs each step once its inputs exist):
+# Pipeline Step - Parse Input (parse_ehr)
+# Pipeline Step - Get Test Definition (get_test)
+# Pipeline Step - Create Case (post_case)
+# Pipeline Step - Process Case (process_case)
+# Pipeline Step - Print Case Details (case_details, a failure is only a warning)
+# Pipeline Step - Monitor for Case Status (monitor, polled every interval minutes)
+# Pipeline Step - Download Reports (download_reports)
+# Notes: the EHRs run in parallel; a failure stops only that EHR's later steps. Completed
+#        steps are checkpointed, so a rerun with the same output dir starts where the last
+#        run stopped (-r/ --restart runs every step again); only an edited EHR invalidates
+#        the checkpoint, a config edit does not re-post the case.
 ##################################################################
 
 import argparse
@@ -20,13 +26,17 @@ import os
 import sys
 import time
 from datetime import datetime
-import pathlib
 import method_tools
+import profile_tools
 import parse_ehr
 import monitor_progress
 import case_mgt_v2
+import case_model
+import download_reports
+import workflow
 
 TSS_CLI = "tss-cli-2.2.0.jar"
+READY_STATUS = "IN PROGRESS - READY FOR INTERPRETATION"
 
 
 # get args
@@ -43,8 +53,32 @@ def get_args():
         "-c", "--configFile", help="Path to JSON config file", type=str, required=True
     )
     parser.add_argument(
-        "-i", "--input", help="Input EHR JSON", type=pathlib.PosixPath, required=True
+        "-i", "--input", help="Input EHR JSON(s)", type=str, nargs="+", required=True
+    )
+    parser.add_argument(
+        "-r",
+        "--restart",
+        help="Ignore the checkpoints and run every step again",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-n",
+        "--interval",
+        help="Minutes between case status checks (default: 5)",
+        type=float,
+        default=5,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help=f"Steps running at once across the EHRs (default: {method_tools.MAX_WORKERS})",
+        type=int,
+        default=method_tools.MAX_WORKERS,
     )
+    method_tools.add_logging_args(parser)
+    method_tools.add_metrics_args(parser)
+    method_tools.add_tracing_args(parser)
+    profile_tools.add_profile_args(parser)
     args = parser.parse_args()
     return args
 
@@ -61,6 +95,181 @@ def runtime_summary(start, time_stamp):
         print("{}\tTotal Runtime:\t{} hours".format(time_stamp, round(hours, 3)))
 
 
+# Pipeline Step - Parse Input
+def step_parse_ehr(input_file, output_dir):
+    """Read the EHR: case JSON without the test, and the requested test"""
+    method_tools.check_path(input_file)
+    with method_tools.JsonLog(method_tools.format_path(output_dir) + "parse_ehr.log") as logfile:
+        logfile.info("Parsing EHR", output_directory=output_dir, input_file=input_file)
+        case_json, test_name, test_version = parse_ehr.read_ehr(input_file)
+        logfile.info("Requested test", test_name=test_name, test_version=test_version)
+    return {"case_json": case_json, "test_name": test_name, "test_version": test_version}
+
+
+# Pipeline Step - Get Test Definition
+def step_get_test(test_name, test_version, config):
+    """Look up the test definition ID and report types"""
+    test_id, report_types = method_tools.get_test(test_name, test_version, config)
+    if not test_id:
+        raise workflow.StepFailed(f"Test {test_name} {test_version} was not found")
+    return {"test_id": test_id, "report_types": report_types}
+
+
+# Pipeline Step - Create Case
+def step_post_case(case_json, test_id, report_types, config, output_dir):
+    """Write case.json and post it"""
+    # post_case edits the payload; keep the parse_ehr output as it was checkpointed
+    case_json = method_tools.json_loads(method_tools.json_dumps(case_json))
+    parse_ehr.apply_test(case_json, test_id, report_types)
+    case_json_file = parse_ehr.write_case_json(case_json, method_tools.format_path(output_dir))
+    print(f"{datetime.now()}\tCase JSON File Path:\t{case_json_file}")
+    case_results = case_mgt_v2.post_case(case_json, config, output_dir)
+    if not case_results:
+        raise workflow.StepFailed(
+            "There was an error posting the case. Please review the error(s) and correct the issue(s)."
+        )
+    return {
+        "case_guid": case_results["id"],
+        "display_id": case_results["displayId"],
+        "family_size": len(case_results["caseSubjects"]),
+    }
+
+
+# Pipeline Step - Process Case
+def step_process_case(case_guid, config, output_dir):
+    """Start secondary analysis"""
+    case_mgt_v2.process_case(case_guid, config, output_dir)
+    return {"processing_started": datetime.now().isoformat(timespec="seconds")}
+
+
+# Pipeline Step - Print Case Details
+def step_case_details(case_guid, processing_started, config):
+    """Print the case details and input file links (informational)"""
+    print(f"{datetime.now()}\tCase details of {case_guid} (processing since {processing_started})")
+    case_mgt_v2.get_case_details(case_guid, config)
+    return {}
+
+
+# Pipeline Step - Monitor Case Status
+def step_monitor(case_guid, family_size, processing_started, interval, config, output_dir):
+    """Check the case status once; Pending until it is ready or the wait time runs out"""
+    # Decide how long to wait based on pedigree
+    if family_size == 1:
+        wait_time = 330  # 5 hrs for singleton cases
+    else:
+        wait_time = 540  # 9 hrs for extended pedigree
+    runtime = (datetime.now() - datetime.fromisoformat(processing_started)).total_seconds() / 60
+
+    # transient errors (connection, 429, 5xx) only delay the next check
+    try:
+        response = case_mgt_v2.fetch_case(case_guid, config)
+    except method_tools.RequestException as err:
+        print(f"{datetime.now()}\t{case_guid}\tStatus check failed, retrying: {err}")
+        raise workflow.Pending(interval * 60) from err
+    if response.status_code == 429 or response.status_code >= 500:
+        print(f"{datetime.now()}\t{case_guid}\tStatus check failed ({response.status_code}), retrying")
+        raise workflow.Pending(interval * 60)
+    if response.status_code != 200:
+        raise workflow.StepFailed(f"Failed to get the case ({response.status_code}): {response.text}")
+    record = case_model.CaseRecord.from_json(method_tools.response_json(response))
+    status = record.status_label
+    with method_tools.JsonLog(method_tools.format_path(output_dir) + "monitor_progress.log") as log:
+        log.info("Case status", case_id=case_guid, status=status, runtime_min=round(runtime, 3))
+
+    # exit if RFI or Has Issues or QC Warning; keep monitoring the edge cases
+    if status in monitor_progress.EXIT_STATUS or record.status in ["New", "Complete"]:
+        print(f"{datetime.now()}\t{case_guid}\tCase Status:\t{status}")
+        if status != READY_STATUS:
+            raise workflow.StepFailed(f"Unexpected case status, {status}. Please review the output for errors.")
+        return {"status": status}
+    if runtime >= wait_time:
+        raise workflow.StepFailed(f"The case was not ready after {wait_time} minutes ({status})")
+    print(f"{datetime.now()}\t{case_guid}\tCase Status:\t{status}; checking again in {interval} minutes")
+    raise workflow.Pending(interval * 60)
+
+
+# Pipeline Step - Download Reports
+def step_download_reports(case_guid, status, config_file, output_dir):
+    """Download the proband's draft PDF and JSON reports"""
+    print(f"{datetime.now()}\tDownloading the reports of {case_guid} ({status})")
+    directory = method_tools.format_path(output_dir)
+    with method_tools.JsonLog(directory + "download_reports.log") as log:
+        report_files = download_reports.download_case_reports(config_file, case_guid, directory, log)
+    return {"report_files": report_files}
+
+
+PIPELINE_STEPS = [
+    workflow.Step(
+        "parse_ehr",
+        step_parse_ehr,
+        ("input_file", "output_dir"),
+        ("case_json", "test_name", "test_version"),
+    ),
+    workflow.Step(
+        "get_test",
+        step_get_test,
+        ("test_name", "test_version", "config"),
+        ("test_id", "report_types"),
+    ),
+    workflow.Step(
+        "post_case",
+        step_post_case,
+        ("case_json", "test_id", "report_types", "config", "output_dir"),
+        ("case_guid", "display_id", "family_size"),
+    ),
+    workflow.Step(
+        "process_case",
+        step_process_case,
+        ("case_guid", "config", "output_dir"),
+        ("processing_started",),
+    ),
+    workflow.Step(
+        "case_details",
+        step_case_details,
+        ("case_guid", "processing_started", "config"),
+        (),
+        required=False,
+    ),
+    workflow.Step(
+        "monitor",
+        step_monitor,
+        ("case_guid", "family_size", "processing_started", "interval", "config", "output_dir"),
+        ("status",),
+    ),
+    workflow.Step(
+        "download_reports",
+        step_download_reports,
+        ("case_guid", "status", "config_file", "output_dir"),
+        ("report_files",),
+    ),
+]
+PIPELINE_PARAMETERS = ("input_file", "output_dir", "config", "config_file", "interval")
+# only the EHR is fingerprinted: a config edit must not re-post or re-process a case
+PIPELINE_INPUTS = ("input_file",)
+
+
+# one workflow run per EHR
+def pipeline_runs(input_files, directory, config, config_file, interval):
+    """Runs for the EHRs; several EHRs get a sub-dir each (named after the file)"""
+
+    runs = []
+    for input_file in input_files:
+        name = os.path.splitext(os.path.basename(input_file))[0]
+        if len(input_files) > 1:
+            names = [run.name for run in runs]
+            name = name if name not in names else f"{name}_{len(runs) + 1}"
+        run_dir = method_tools.format_path(directory + name if len(input_files) > 1 else directory)
+        parameters = {
+            "input_file": os.path.abspath(input_file),
+            "output_dir": run_dir,
+            "config": config,
+            "config_file": config_file,
+            "interval": interval,
+        }
+        runs.append(workflow.Run(name, parameters, run_dir))
+    return runs
+
+
 # main function
 if __name__ == "__main__":
     # start timer
@@ -68,8 +277,11 @@ if __name__ == "__main__":
 
     # get args
     arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_metrics(arguments)
+    method_tools.set_logging(arguments)
+    method_tools.set_tracing(arguments, "start_case_pipeline")
     cwd = os.getcwd()
-    input_file = arguments.input
     output_dir = arguments.outputDir
     config_file = arguments.configFile
 
@@ -82,106 +294,29 @@ if __name__ == "__main__":
     print(
         "{}\tOutput Directory:\t{}".format(datetime.now(), os.path.abspath(directory))
     )
-
-    # setup
-    case_json = None
-    case_display_id = None
-    case_guid = None
-    step_number = 0
+    for input_file in arguments.input:
+        method_tools.check_path(input_file)
+        print("{}\tInput File:\t{}".format(datetime.now(), os.path.abspath(input_file)))
 
     # parse configFile into dictionary
     config = method_tools.parse_config(config_file)
 
-    # Pipeline Step - Parse Input
-    step_number += 1
-    step_name = "parse_ehr.py"
-
-    # invoke parse_ehr.py
-    print("\n{}\tStep {}. Executing {}".format(datetime.now(), step_number, step_name))
-
-    # open input
-    method_tools.check_path(input_file)
-    print("{}\tInput File:\t{}".format(datetime.now(), os.path.abspath(input_file)))
-
-    case_info = parse_ehr.main(input_file, directory, config)
-    if case_info:
-        case_json = case_info[0]
-        case_json_file_name = case_info[1]
-        print(
-            "{}\tCase JSON File Path:\t{}".format(datetime.now(), case_json_file_name)
-        )
-    else:
-        print(
-            "{}\tExiting {}. The pipeline step was unsuccessful".format(
-                datetime.now(), step_name
-            )
-        )
-        runtime_summary(start_time, datetime.now())
-        sys.exit()
-    print("{}\tExiting {}".format(datetime.now(), step_name))
-
-    # Pipeline Step - Create Case
-    step_number += 1
-    step_name = "case_mgt.py"
-
-    # invoke case_mgt_v2.py
-    print("\n{}\tStep {}. Executing {}".format(datetime.now(), step_number, step_name))
-    case_results = case_mgt_v2.post_case(case_json, config, output_dir)
-    if case_results:
-        case_guid = case_results["id"]
-        case_subjects = case_results["caseSubjects"]
-        case_mgt_v2.process_case(case_guid, config, output_dir)
-        case_mgt_v2.get_case_details(case_guid, config)
-    else:
-        print(
-            "{}\tThere was an error posting the case. Please review the error(s) and correct the issue(s).".format(
-                datetime.now()
-            )
-        )
-        print(
-            "{}\tExiting {}. The pipeline step was unsuccessful".format(
-                datetime.now(), step_name
-            )
-        )
-        runtime_summary(start_time, datetime.now())
-        sys.exit()
-    print("{}\tExiting {}".format(datetime.now(), step_name))
-
-    # Pipeline Step - Monitor Case Status
-    step_number += 1
-    step_name = "monitor_progress.py"
-
-    # invoke monitor_progress.py
-    print("\n{}\tStep {}. Executing {}".format(datetime.now(), step_number, step_name))
-
-    # Decide how long to wait based on pedigree
-    if len(case_subjects) == 1:
-        wait_time = 330  # 5 hrs for singleton cases
-    else:
-        wait_time = 540  # 9 hrs for extended pedigree
-
-    status = monitor_progress.main(case_guid, wait_time, 5, output_dir, config_file)
-    if status == "IN PROGRESS - READY FOR INTERPRETATION":
-        print(
-            "{}\tProceeding with the interpretation portion of the pipeline.".format(
-                datetime.now()
-            )
-        )
-    else:
-        print(
-            "{}\tUnexpected case status, {}. Please review the output for errors.".format(
-                datetime.now(), status
-            )
-        )
-        print(
-            "{}\tExiting {}. The pipeline was unsuccessful".format(
-                datetime.now(), step_name
-            )
-        )
-        runtime_summary(start_time, datetime.now())
-        sys.exit()
-    print("{}\tExiting {}".format(datetime.now(), step_name))
+    # run the steps
+    pipeline = workflow.Workflow(PIPELINE_STEPS, PIPELINE_PARAMETERS, PIPELINE_INPUTS)
+    runs = pipeline_runs(arguments.input, directory, config, config_file, arguments.interval)
+    pipeline.run(runs, arguments.workers, arguments.restart)
 
     # End Pipeline
-    print("\n{}\tTSS case has completed".format(datetime.now()))
+    print(f"\n{pipeline.summary(runs)}\n")
+    for run in runs:
+        for step_name, warning in run.warnings.items():
+            print(f"{datetime.now()}\t{run.name}\t[WARNING] {step_name} was unsuccessful: {warning}")
+    failed = [run for run in runs if run.errors]
+    for run in failed:
+        for step_name, error in run.errors.items():
+            print(f"{datetime.now()}\t{run.name}\tExiting {step_name}. The pipeline step was unsuccessful: {error}")
+    if not failed:
+        print("{}\tTSS case has completed".format(datetime.now()))
     runtime_summary(start_time, datetime.now())
+    if failed:
+        sys.exit(1)
@@ -19,6 +19,7 @@ import time
 from datetime import datetime
 import create_biosamples
 import method_tools
+import profile_tools
 
 
 # get args
@@ -101,6 +102,9 @@ def get_args():
         default="store_false",
     )
 
+    method_tools.add_logging_args(parser)
+    method_tools.add_tracing_args(parser)
+    profile_tools.add_profile_args(parser)
     args = parser.parse_args()
     return args
 
@@ -125,6 +129,9 @@ if __name__ == "__main__":
 
     # get args
     arguments = get_args()
+    profile_tools.set_profiling(arguments)
+    method_tools.set_logging(arguments)
+    method_tools.set_tracing(arguments, "start_sample_pipeline")
     cwd = os.getcwd()
 
     # check and format the output dir
@@ -158,7 +165,8 @@ if __name__ == "__main__":
             "tss_config_file": str(arguments.tss_config),
             "bssh_config_name": arguments.bssh_config,
         }
-        create_biosamples.main(bssh_args)
+        with method_tools.TRACER.span("create_biosamples", workflow=arguments.biosample):
+            create_biosamples.main(bssh_args)
 
         # End Pipeline
         print(f"\n{datetime.now()}\TSS sample pipeline has completed")
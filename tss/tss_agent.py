@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""Local TSS agent: warm connections, caches and rate limits shared by every CLI run"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Long-lived local agent for the TSS scripts
+# 1. Inputs: start | stop | status | clear, [optional] socket path, idle timeout
+# 2. Outputs: a Unix socket (~/.illumina/tss_agent.sock, mode 0600) serving api_request
+# Notes: method_tools.api_request sends requests to the agent when the socket exists and
+#        calls TSS directly otherwise, so the CLIs need no changes. The agent keeps one
+#        pooled session and rate limiter per workgroup across runs, and caches test
+#        definitions, workgroup users and display ID -> case GUID lookups (TTLs below). Only
+#        the GUID is cached, and only for requests marked with AGENT_LOOKUP_HEADERS, so case
+#        searches always see the live status; any PUT, POST or DELETE drops the workgroup's
+#        display ID lookups. TSS_AGENT_SOCKET overrides the path
+#        ("" turns the agent off for a run).
+##################################################################
+
+import os
+import re
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import subprocess
+import socketserver
+from datetime import datetime
+from urllib.parse import urlsplit
+import requests
+import method_tools
+import profile_tools
+
+# kind: (method, path pattern, required query parameter, TTL seconds)
+CACHE_RULES = {
+    "test_definitions": ("GET", re.compile(r"/tms/api/v1/testDefinitions$"), None, 600),
+    "users": ("GET", re.compile(r"/crs/api/v1/session/users$"), None, 300),
+    "display_ids": ("GET", re.compile(r"/crs/api/v2/cases/search$"), "displayId", 3600),
+}
+# kinds served only to requests marked with method_tools.AGENT_LOOKUP_HEADERS
+LOOKUP_KINDS = {"display_ids"}
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+START_TIMEOUT = 10
+
+
+class ResponseCache:
+    """TTL cache of successful GET responses, keyed by workgroup and full URL"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def kind(method, url, params, headers=None):
+        """The CACHE_RULES kind for a request, or None when it is not cached"""
+        parts = urlsplit(url)
+        path, query = parts.path, parts.query
+        lookup = all(
+            (headers or {}).get(name) == value
+            for name, value in method_tools.AGENT_LOOKUP_HEADERS.items()
+        )
+        for kind, (rule_method, pattern, parameter, _) in CACHE_RULES.items():
+            if method != rule_method or not pattern.search(path):
+                continue
+            if parameter and parameter not in (params or {}) and f"{parameter}=" not in query:
+                continue
+            if kind in LOOKUP_KINDS and not lookup:
+                continue
+            return kind
+        return None
+
+    def get(self, key):
+        """Cached (reply, body) or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1], entry[2]
+            self.entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key, kind, reply, body):
+        """Store a reply for its kind's TTL"""
+        with self.lock:
+            self.entries[key] = (time.monotonic() + CACHE_RULES[kind][3], reply, body)
+
+    def drop(self, workgroup, kind=None):
+        """Drop a workgroup's entries (of one kind)"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == workgroup]:
+                if kind is None or key[1] == kind:
+                    del self.entries[key]
+
+    def clear(self):
+        """Drop everything"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Entries per kind, hits and misses"""
+        with self.lock:
+            kinds = {}
+            for key in self.entries:
+                kinds[key[1]] = kinds.get(key[1], 0) + 1
+            return {"entries": kinds, "hits": self.hits, "misses": self.misses}
+
+
+# display ID lookups keep only the case GUIDs, and only when they found the case
+def cache_body(kind, body):
+    """The body to cache, or None for an empty display ID search result"""
+
+    if kind != "display_ids":
+        return body
+    try:
+        content = method_tools.json_loads(body).get("content")
+    except (ValueError, AttributeError):
+        return None
+    if not content:
+        return None
+    return method_tools.json_dumps(
+        {"content": [{"id": entry["id"], "displayId": entry["displayId"]} for entry in content]}
+    ).encode("utf-8")
+
+
+class Agent:
+    """Runs the requests for every connected CLI through method_tools.api_request"""
+
+    def __init__(self, idle_minutes=0):
+        self.cache = ResponseCache()
+        self.started = time.time()
+        self.last_request = time.monotonic()
+        self.idle_seconds = idle_minutes * 60
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def request(self, header, body):
+        """Serve one api_request: cache lookup, then the pooled session and rate limiter"""
+        config = header["config"]
+        method, url, params = header["method"].upper(), header["url"], header.get("params")
+        with self.lock:
+            self.requests += 1
+            self.last_request = time.monotonic()
+
+        kind = self.cache.kind(method, url, params, header.get("headers"))
+        key = None
+        if kind:
+            prepared = requests.Request(method, url, params=params).prepare().url
+            key = (config["wg"], kind, config["domain"], prepared)
+            cached = self.cache.get(key)
+            if cached:
+                return {**cached[0], "cached": True}, cached[1]
+
+        try:
+            response = method_tools.api_request(
+                method,
+                url,
+                config,
+                params=params,
+                data=body or None,
+                headers=header.get("headers"),
+                timeout=header.get("timeout", method_tools.REQUEST_TIMEOUT),
+            )
+        except requests.exceptions.RequestException as err:
+            return {"error": type(err).__name__, "message": str(err)}, b""
+
+        reply = {
+            "status": response.status_code,
+            "reason": response.reason,
+            "url": response.url,
+            "headers": {
+                name: value
+                for name, value in response.headers.items()
+                if name.lower() not in DROPPED_HEADERS
+            },
+        }
+        content = response.content
+        if kind and response.status_code == 200:
+            cached = cache_body(kind, content)
+            if cached is not None:
+                self.cache.put(key, kind, reply, cached)
+        # a case write (PUT, POST, qc-actions, DELETE) may change what a lookup finds
+        if method in ("PUT", "POST", "DELETE"):
+            self.cache.drop(config["wg"], "display_ids")
+        return reply, content
+
+    def status(self):
+        """Uptime, request count, cache and HTTP metrics"""
+        return {
+            "pid": os.getpid(),
+            "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "sessions": len(method_tools._SESSIONS),  # pylint: disable=protected-access
+            "cache": self.cache.stats(),
+            "http": method_tools.HTTP_METRICS.to_dict(),
+        }
+
+    def idle(self):
+        """True when the idle timeout passed without requests"""
+        return bool(self.idle_seconds) and time.monotonic() - self.last_request > self.idle_seconds
+
+
+class AgentHandler(socketserver.BaseRequestHandler):
+    """One CLI connection: frames in, frames out, until the client closes"""
+
+    def handle(self):
+        agent = self.server.agent
+        while True:
+            try:
+                frame = method_tools.recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if frame is None:
+                return
+            header, body = frame
+            operation = header.get("op")
+            if operation == "request":
+                reply, content = agent.request(header, body)
+            elif operation == "status":
+                reply, content = agent.status(), b""
+            elif operation == "clear":
+                agent.cache.clear()
+                reply, content = {"cleared": True}, b""
+            elif operation == "stop":
+                reply, content = {"stopping": True}, b""
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                reply, content = {"error": "RequestException", "message": f"Unknown op {operation}"}, b""
+            try:
+                method_tools.send_frame(self.request, reply, content)
+            except OSError:
+                return
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded Unix socket server holding the Agent"""
+
+    daemon_threads = True
+
+    def __init__(self, path, agent):
+        self.agent = agent
+        super().__init__(path, AgentHandler)
+        os.chmod(path, 0o600)
+
+
+# is an agent answering on the socket
+def agent_running(path):
+    """True when something accepts connections on path"""
+
+    if not os.path.exists(path):
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+# send an op to the running agent
+def call_agent(path, operation):
+    """Return the agent's reply to status/ stop/ clear"""
+
+    method_tools.AGENT_SOCKET = path
+    try:
+        reply, _ = method_tools.agent_call({"op": operation})
+    except requests.exceptions.ConnectionError:
+        print(f"[ERROR] No TSS agent is running on {path}")
+        sys.exit(1)
+    return reply
+
+
+# run the agent in this process
+def serve(path, idle_minutes):
+    """Serve until stop, SIGTERM/ SIGINT or the idle timeout"""
+
+    if agent_running(path):
+        print(f"[ERROR] A TSS agent is already running on {path}")
+        sys.exit(1)
+    if os.path.exists(path):
+        os.remove(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    # requests from the agent itself go straight to TSS
+    method_tools.AGENT_SOCKET = ""
+    agent = Agent(idle_minutes)
+    server = AgentServer(path, agent)
+
+    def stop(*_):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if idle_minutes:
+        def watch_idle():
+            while not agent.idle():
+                time.sleep(min(30.0, agent.idle_seconds / 4))
+            print(f"{datetime.now()}\tIdle for {idle_minutes} minutes, stopping", flush=True)
+            stop()
+
+        threading.Thread(target=watch_idle, daemon=True).start()
+
+    print(f"{datetime.now()}\tTSS agent {os.getpid()} listening on {path}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+        print(f"{datetime.now()}\tTSS agent stopped after {agent.requests} requests", flush=True)
+
+
+# start the agent in the background
+def detach(path, idle_minutes, log_file):
+    """Start this script as a background process and wait for its socket"""
+
+    if agent_running(path):
+        print(f"TSS agent already running on {path}")
+        return
+    command = [sys.executable, os.path.abspath(__file__), "start", "-s", path, "-i", str(idle_minutes)]
+    with open(log_file, "a", encoding="utf-8") as log:
+        process = subprocess.Popen(  # pylint: disable=consider-using-with
+            command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, start_new_session=True
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while not agent_running(path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            print(f"[ERROR] The TSS agent did not start. Please check {log_file}")
+            sys.exit(1)
+        time.sleep(0.05)
+    print(f"TSS agent {process.pid} listening on {path}")
+    print(f"Log File:\t{log_file}")
+
+
+# get args
+def get_args():
+    """Get command line arguments"""
+    parser = argparse.ArgumentParser(description="Local TSS agent shared by the tss/ scripts")
+    parser.add_argument(
+        "action",
+        choices=["start", "stop", "status", "clear"],
+        help="start the agent, stop it, print its status or clear its caches",
+    )
+    parser.add_argument(
+        "-s",
+        "--socket",
+        help=f"Unix socket path (default: {method_tools.AGENT_SOCKET or 'unset'})",
+        type=str,
+        default=method_tools.AGENT_SOCKET,
+    )
+    parser.add_argument(
+        "-d", "--detach", help="start: run in the background", action="store_true"
+    )
+    parser.add_argument(
+        "-i",
+        "--idle_minutes",
+        help="start: stop after this many minutes without requests (default: 0 = never)",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "-l",
+        "--log_file",
+        help="start -d: agent log (default: ~/.illumina/tss_agent.log)",
+        type=str,
+        default=os.path.expanduser(f"{method_tools.PROFILE_DIR}/tss_agent.log"),
+    )
+    profile_tools.add_profile_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    arguments = get_args()
+    profile_tools.set_profiling(arguments)
+
+    if not arguments.socket:
+        print("[ERROR] No socket path: set -s/ --socket or TSS_AGENT_SOCKET")
+        sys.exit(1)
+    socket_path = os.path.abspath(os.path.expanduser(arguments.socket))
+
+    if arguments.action == "start" and arguments.detach:
+        detach(socket_path, arguments.idle_minutes, os.path.expanduser(arguments.log_file))
+    elif arguments.action == "start":
+        serve(socket_path, arguments.idle_minutes)
+    elif arguments.action == "status":
+        agent_status = call_agent(socket_path, "status")
+        http = agent_status.pop("http")
+        for name, value in agent_status.items():
+            print(f"{name}:\t{value}")
+        for endpoint, entry in http.items():
+            print(f"{endpoint}:\t{entry['requests']} requests, p50 {entry['seconds_p50'] * 1000:.1f} ms")
+    else:
+        print(call_agent(socket_path, arguments.action))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""One entry point for the TSS, DRAGEN and transfer tools"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Unified command line: tss_cli.py <command> [tool options]
+# 1. Inputs: a command (case, search, filter, reports, monitor, biosample, dragen, transfer, ...)
+#    followed by the options of the tool it runs (<command> -h lists them)
+# 2. Outputs: whatever the tool writes
+# Notes: only the selected tool is imported, so requests and other heavy modules load just
+#        for the commands that use them; the dispatcher itself uses the standard library.
+#        dragen and transfer take a second word naming the script (e.g. dragen qc, transfer
+#        bs_run_uploader); transfer runs the bssh/ ica shell scripts with bash.
+##################################################################
+
+import os
+import sys
+import runpy
+import subprocess
+
+TSS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TSS_DIR)
+
+# command: (script, description)
+COMMANDS = {
+    "case": ("tss/case_mgt_v2.py", "Post, process, update, delete or get cases"),
+    "pipeline": ("tss/start_case_pipeline.py", "EHR -> post -> process -> monitor -> reports"),
+    "search": ("tss/search.py", "Search cases (v2 search)"),
+    "filter": ("tss/filter_case_list.py", "Filter the case list by status, tags, dates, ..."),
+    "reports": ("tss/download_reports.py", "Download PDF/ JSON draft reports"),
+    "monitor": ("tss/monitor_progress.py", "Poll processing cases until they finish"),
+    "biosample": ("tss/start_sample_pipeline.py", "Create BSSH biosamples from a sample sheet"),
+    "delete": ("tss/delete_cases.py", "Delete cases"),
+    "export": ("tss/export_cases.py", "Export a workgroup's cases"),
+    "feed": ("tss/case_feed.py", "Case change feed"),
+    "indications": ("tss/case_indications.py", "Extract indications from a case"),
+    "qc": ("tss/qc_triage.py", "QC override/ modify QC_WARNING cases"),
+    "hpo": ("tss/hpo_index.py", "Build or query the HPO index"),
+    "requirements": ("tss/check_system_requirements.py", "Check the system requirements"),
+    "agent": ("tss/tss_agent.py", "Local agent: warm connections and caches across runs"),
+    "jobs": ("tss/job_queue.py", "Job queue: enqueue, work, status, retry, cancel"),
+    "ingest": ("tss/ingest_daemon.py", "Watch a drop folder for EHR JSON/ case CSV files"),
+    "mock": ("tss/mock_tss_server.py", "Local mock TSS server"),
+    "benchmark": ("tss/benchmark_tss.py", "Benchmark suite"),
+    "generate": ("tss/generate_workload.py", "Seeded synthetic inputs"),
+}
+
+# command: {subcommand: script}
+SCRIPT_GROUPS = {
+    "dragen": {
+        "qc": "dragen_tools/aggregate_dragen_qc_metrics.py",
+        "launch": "dragen_tools/bs_launch_dragen.py",
+        "coverage": "dragen_tools/diff_samtools_bedcov_dragen_coverage.py",
+    },
+    "transfer": {
+        os.path.splitext(name)[0]: f"{folder}/{name}"
+        for folder in ("bssh", "ica")
+        if os.path.isdir(os.path.join(REPO_DIR, folder))
+        for name in sorted(os.listdir(os.path.join(REPO_DIR, folder)))
+        if name.endswith(".sh")
+    },
+}
+GROUP_DESCRIPTIONS = {
+    "dragen": "DRAGEN tools: " + ", ".join(SCRIPT_GROUPS["dragen"]),
+    "transfer": "BSSH/ ICA upload and download scripts (tss_cli.py transfer -h lists them)",
+}
+
+
+# usage text
+def usage(group=None):
+    """Commands (or a group's scripts) and what they run"""
+
+    if group:
+        lines = [f"usage: tss_cli.py {group} <script> [options]", "", "scripts:"]
+        lines += [f"  {name:<22}{path}" for name, path in SCRIPT_GROUPS[group].items()]
+        return "\n".join(lines)
+    lines = ["usage: tss_cli.py <command> [options]   (tss_cli.py <command> -h for its options)"]
+    lines += ["", "commands:"]
+    lines += [f"  {name:<14}{description}" for name, (_, description) in COMMANDS.items()]
+    lines += [f"  {name:<14}{description}" for name, description in GROUP_DESCRIPTIONS.items()]
+    return "\n".join(lines)
+
+
+# run a python tool as if it were called directly
+def run_script(script, args):
+    """Run script's __main__ block with args; only its own imports are loaded"""
+
+    path = os.path.join(REPO_DIR, script)
+    sys.argv = [path] + list(args)
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name="__main__")
+
+
+# run a transfer shell script
+def run_shell_script(script, args):
+    """Run a bash script and exit with its return code"""
+
+    path = os.path.join(REPO_DIR, script)
+    sys.exit(subprocess.call(["bash", path] + list(args)))
+
+
+# resolve the command line to a script
+def dispatch(argv):
+    """tss_cli.py <command> [<script>] [options]"""
+
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        sys.exit(0 if argv else 1)
+    command, args = argv[0], argv[1:]
+
+    if command in COMMANDS:
+        run_script(COMMANDS[command][0], args)
+    elif command in SCRIPT_GROUPS:
+        scripts = SCRIPT_GROUPS[command]
+        if not args or args[0] in ("-h", "--help"):
+            print(usage(command))
+            sys.exit(0 if args else 1)
+        if args[0] not in scripts:
+            print(f"[ERROR] Unknown {command} script: {args[0]}\n{usage(command)}")
+            sys.exit(1)
+        if scripts[args[0]].endswith(".sh"):
+            run_shell_script(scripts[args[0]], args[1:])
+        else:
+            run_script(scripts[args[0]], args[1:])
+    else:
+        print(f"[ERROR] Unknown command: {command}\n{usage()}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    dispatch(sys.argv[1:])
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""Small DAG runner: steps declare inputs and outputs, runs are checkpointed"""
+
+##################################################################
+# Author: LeAnne Lovato
+# Email: llovato@illumina.com
+# Workflow engine used by start_case_pipeline
+# 1. Inputs: steps (function, input names, output names) and one parameter dict per run
+# 2. Outputs: a JSON checkpoint per run (step outputs, timings), a per-step summary
+# Notes: a step starts as soon as the steps producing its inputs are done, so independent
+#        steps and different runs (e.g. one per EHR) share one thread pool. Steps found in
+#        a run's checkpoint are skipped on a rerun and their outputs reused; only the files
+#        named as workflow inputs are fingerprinted, so e.g. a config edit keeps the steps
+#        that already changed server state. A failed step skips its dependents in that run
+#        only (a step with required=False is reported as a warning). A step that raises
+#        Pending is called again after the given delay without holding a pool thread.
+#        Outputs must be JSON serializable.
+##################################################################
+
+import os
+import time
+import hashlib
+import traceback
+from datetime import datetime
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import method_tools
+
+CHECKPOINT_FILE = "pipeline_checkpoint.json"
+
+
+class StepFailed(Exception):
+    """Raised by a step that ran but did not succeed"""
+
+
+class Pending(Exception):
+    """Raised by a polling step that is not done yet; it is called again after seconds"""
+
+    def __init__(self, seconds, message=""):
+        super().__init__(message)
+        self.seconds = seconds
+
+
+@dataclass
+class Step:
+    """function(**inputs) returns a dict with (at least) the declared outputs"""
+
+    name: str
+    function: object
+    inputs: tuple
+    outputs: tuple
+    required: bool = True
+
+
+@dataclass
+class Run:
+    """One pass through the workflow (e.g. one EHR), checkpointed in directory"""
+
+    name: str
+    parameters: dict
+    directory: str
+    values: dict = field(default_factory=dict)
+    outputs: dict = field(default_factory=dict)
+    states: dict = field(default_factory=dict)
+    seconds: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+    warnings: dict = field(default_factory=dict)
+    started: dict = field(default_factory=dict)
+
+    @property
+    def checkpoint_path(self):
+        """<directory>/pipeline_checkpoint.json"""
+        return os.path.join(self.directory, CHECKPOINT_FILE)
+
+
+# fingerprint of the run's input files; a changed input invalidates the checkpoint
+def input_digest(parameters, inputs):
+    """sha256 over the named parameters whose values are existing files"""
+
+    digest = hashlib.sha256()
+    for name in sorted(inputs):
+        value = parameters.get(name)
+        if isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+            digest.update(name.encode())
+            with open(value, "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+class Workflow:
+    """Steps wired by their input and output names"""
+
+    def __init__(self, steps, parameters, inputs=()):
+        """inputs: the parameters (file paths) whose contents the checkpoint depends on"""
+        self.steps = {step.name: step for step in steps}
+        producers = {}
+        for step in steps:
+            for output in step.outputs:
+                if output in producers or output in parameters:
+                    raise ValueError(f"{output} is produced twice ({step.name})")
+                producers[output] = step.name
+        self.parameters = tuple(parameters)
+        self.inputs = tuple(inputs)
+        self.depends = {}
+        for step in steps:
+            missing = [name for name in step.inputs if name not in producers and name not in parameters]
+            if missing:
+                raise ValueError(f"Step {step.name} needs {', '.join(missing)}, which nothing produces")
+            self.depends[step.name] = {producers[name] for name in step.inputs if name in producers}
+        self.order = self.topological_order()
+
+    def topological_order(self):
+        """Step names, dependencies first; raises ValueError on a cycle"""
+        order, done = [], set()
+        while len(order) < len(self.steps):
+            ready = [name for name in self.steps if name not in done and self.depends[name] <= done]
+            if not ready:
+                raise ValueError("The workflow steps form a cycle")
+            order += ready
+            done.update(ready)
+        return order
+
+    def load_checkpoint(self, run, restart=False):
+        """Restore the outputs of the run's completed steps"""
+        digest = input_digest(run.parameters, self.inputs)
+        if restart or not os.path.exists(run.checkpoint_path):
+            return digest
+        with open(run.checkpoint_path, "r", encoding="utf-8") as file:
+            checkpoint = method_tools.json_load(file)
+        if checkpoint.get("input_digest") != digest:
+            print(f"{datetime.now()}\t{run.name}\tInputs changed since the checkpoint; running every step")
+            return digest
+        for name, entry in checkpoint.get("steps", {}).items():
+            if name in self.steps:
+                run.values.update(entry["outputs"])
+                run.outputs[name] = entry["outputs"]
+                run.states[name] = "cached"
+                run.seconds[name] = entry["seconds"]
+        return digest
+
+    @staticmethod
+    def save_checkpoint(run, digest):
+        """Write the completed steps' outputs and timings (atomically)"""
+        steps = {
+            name: {"outputs": outputs, "seconds": run.seconds[name]}
+            for name, outputs in run.outputs.items()
+        }
+        temporary = run.checkpoint_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            method_tools.json_dump({"input_digest": digest, "steps": steps}, file, indent=True)
+        os.replace(temporary, run.checkpoint_path)
+
+    def execute(self, run, name):
+        """Run one step; returns (outputs, seconds since its first call)"""
+        step = self.steps[name]
+        arguments = {key: run.values[key] for key in step.inputs}
+        if name not in run.started:
+            print(f"{datetime.now()}\t{run.name}\tExecuting {name}")
+        start = run.started.setdefault(name, time.perf_counter())
+        with method_tools.TRACER.span(name, "step", run=run.name):
+            outputs = step.function(**arguments) or {}
+        missing = [key for key in step.outputs if key not in outputs]
+        if missing:
+            raise StepFailed(f"{name} did not return {', '.join(missing)}")
+        return {key: outputs[key] for key in step.outputs}, time.perf_counter() - start
+
+    def run(self, runs, max_workers=method_tools.MAX_WORKERS, restart=False):
+        """Run every run's steps in dependency order on one thread pool
+
+        Only this thread schedules and records results; the pool threads run the steps.
+        A Pending step waits here (not in the pool) until its next call is due.
+        """
+        digests = {}
+        for run in runs:
+            os.makedirs(run.directory, exist_ok=True)
+            run.values.update(run.parameters)
+            digests[run.name] = self.load_checkpoint(run, restart)
+            for name in self.order:
+                if run.states.get(name) == "cached":
+                    print(f"{datetime.now()}\t{run.name}\tSkipping {name} (checkpointed)")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures, polls = {}, []
+            while True:
+                now = time.monotonic()
+                for _, run, name in [poll for poll in polls if poll[0] <= now]:
+                    run.states[name] = "running"
+                    futures[executor.submit(self.execute, run, name)] = (run, name)
+                polls = [poll for poll in polls if poll[0] > now]
+                for run in runs:
+                    for name in self.order:
+                        if name in run.states:
+                            continue
+                        parents = [run.states.get(parent) for parent in self.depends[name]]
+                        if any(state in ("failed", "skipped", "warning") for state in parents):
+                            run.states[name] = "skipped"
+                        elif all(state in ("done", "cached") for state in parents):
+                            run.states[name] = "running"
+                            futures[executor.submit(self.execute, run, name)] = (run, name)
+                if not futures and not polls:
+                    break
+                timeout = max(0, min(poll[0] for poll in polls) - time.monotonic()) if polls else None
+                if not futures:
+                    time.sleep(timeout)
+                    continue
+                finished, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    run, name = futures.pop(future)
+                    try:
+                        outputs, seconds = future.result()
+                    except Pending as pending:
+                        run.states[name] = "waiting"
+                        polls.append((time.monotonic() + pending.seconds, run, name))
+                        continue
+                    except (Exception, SystemExit) as err:  # pylint: disable=broad-except
+                        # the case_mgt_v2 helpers print the error and sys.exit()
+                        error = (
+                            str(err) if isinstance(err, StepFailed)
+                            else traceback.format_exception_only(type(err), err)[-1].strip()
+                        )
+                        if self.steps[name].required:
+                            run.states[name] = "failed"
+                            run.errors[name] = error
+                            print(f"{datetime.now()}\t{run.name}\t{name} failed: {error}")
+                        else:
+                            run.states[name] = "warning"
+                            run.warnings[name] = error
+                            print(f"{datetime.now()}\t{run.name}\t{name} failed (not required): {error}")
+                        continue
+                    run.values.update(outputs)
+                    run.outputs[name] = outputs
+                    run.states[name] = "done"
+                    run.seconds[name] = seconds
+                    self.save_checkpoint(run, digests[run.name])
+                    print(f"{datetime.now()}\t{run.name}\t{name} done in {seconds:.1f} s")
+        return runs
+
+    def summary(self, runs):
+        """Per run and step: state and seconds"""
+        lines = [f"{'run':<24}{'step':<20}{'state':<10}{'seconds':>10}"]
+        for run in runs:
+            for name in self.order:
+                seconds = run.seconds.get(name)
+                lines.append(
+                    f"{run.name[:23]:<24}{name:<20}{run.states.get(name, ''):<10}"
+                    f"{'' if seconds is None else f'{seconds:.1f}':>10}"
+                )
+        return "\n".join(lines)